@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+from argparse import ArgumentParser
+from datetime import date, timedelta
+
+lib_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lib')
+sys.path.append(lib_path)
+
+from ActualResultsLib import ActualResults
+from BenchmarkLib import DEFAULT_TOLERANCE, compare_to_baseline, format_report, load_baseline, save_baseline, \
+    time_benchmark, time_reference
+from FeatureLib import FeatureModelRanking, FootballMatchPredictor, ModelTable
+from SeasonMatrixLib import SeasonMatrix
+from StatsLib import Stats, StatsCache, create_league_using_windowed_stats
+from SyntheticLeagueLib import SyntheticLeague
+
+RESULTS_FIXTURE_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'tests', 'fixture',
+                                    'results_2016_2017_season.db')
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# As for the experiments, a season's worth of matches.
+NUM_SAMPLES = 38
+WIN_WEEKS = 4
+
+
+class Benchmarks(object):
+    """The hot paths of StatsLib, FeatureLib and the predictor, plus a full season backtest, all run against a single
+    results DB. Each benchmark_ method returns a BenchmarkResult."""
+
+    def __init__(self, db_cursor: sqlite3.Cursor, iterations: int = 200):
+        self.db_cursor = db_cursor
+        self.iterations = iterations
+        self.teams = ActualResults.get_teams(db_cursor)
+        self.dates = ActualResults.get_dates(db_cursor)
+        # Spread the lookups over the season(s), skipping the first month when there's not much to go on.
+        self.sample_dates = self.dates[len(self.dates) // 10:]
+
+    def team_and_date(self, i: int) -> (str, date):
+        return self.teams[i % len(self.teams)], self.sample_dates[(i * 7) % len(self.sample_dates)]
+
+    def benchmark_n_sample_stats_for_team(self):
+        def run_fn(i):
+            (team, on_date) = self.team_and_date(i)
+            Stats.n_sample_stats_for_team(cursor=self.db_cursor, team=team, n_samples=NUM_SAMPLES,
+                                          last_sample_date=on_date, home_only=True, normalize_by_matches=True)
+
+        return time_benchmark('Stats.n_sample_stats_for_team', run_fn, iterations=self.iterations)
+
+    def benchmark_windowed_stats_for_team(self):
+        def run_fn(i):
+            (team, on_date) = self.team_and_date(i)
+            Stats.windowed_stats_for_team(cursor=self.db_cursor, team=team, win_weeks=WIN_WEEKS, win_end_date=on_date,
+                                          home_only=None)
+
+        return time_benchmark('Stats.windowed_stats_for_team', run_fn, iterations=self.iterations)
+
+    def benchmark_create_league_using_windowed_stats(self):
+        def run_fn(i):
+            (_, on_date) = self.team_and_date(i)
+            create_league_using_windowed_stats(cursor=self.db_cursor, teams=self.teams, win_size=WIN_WEEKS,
+                                               win_end_date=on_date, stats_ranking_function=lambda stats: stats.points,
+                                               normalize_by_matches=True)
+
+        return time_benchmark('create_league_using_windowed_stats', run_fn, iterations=self.iterations // 4,
+                              items_per_iteration=len(self.teams))
+
+    def benchmark_feature_model_ranking(self):
+        stats_lists = [Stats.n_sample_stats_for_teams(cursor=self.db_cursor, teams=self.teams, n_samples=NUM_SAMPLES,
+                                                      last_sample_date=on_date)
+                       for on_date in self.sample_dates[::max(1, len(self.sample_dates) // 10)]]
+
+        def run_fn(i):
+            FeatureModelRanking(input_data=stats_lists[i % len(stats_lists)], id_fn=lambda stats: stats.team_name,
+                                feature_making_fn=lambda stats: stats.goal_diff)
+
+        return time_benchmark('FeatureModelRanking', run_fn, iterations=self.iterations,
+                              items_per_iteration=len(self.teams))
+
+    def models(self) -> ModelTable:
+        season_matrix = SeasonMatrix(self.db_cursor)
+        on_date = self.dates[-1]
+        return ModelTable.create_for_all_teams(
+            model_making_fn=lambda team: [
+                season_matrix.n_sample_stats_for_team(team=team, n_samples=NUM_SAMPLES, last_sample_date=on_date,
+                                                      home_only=home_only, normalize_by_matches=True).goal_diff
+                for home_only in (True, False)],
+            entities=self.teams)
+
+    def fixtures(self) -> [(str, str)]:
+        return [(home_team, away_team) for home_team in self.teams for away_team in self.teams
+                if home_team != away_team]
+
+    def benchmark_predict(self):
+        predictor = FootballMatchPredictor(models=self.models())
+        fixtures = self.fixtures()
+
+        def run_fn(i):
+            predictor.predict(*fixtures[i % len(fixtures)])
+
+        return time_benchmark('FootballMatchPredictor.predict', run_fn, iterations=self.iterations * 10)
+
+    def benchmark_predict_many(self):
+        predictor = FootballMatchPredictor(models=self.models())
+        fixtures = self.fixtures()
+
+        def run_fn(i):
+            predictor.predict_many(fixtures)
+
+        return time_benchmark('FootballMatchPredictor.predict_many', run_fn, iterations=self.iterations,
+                              items_per_iteration=len(fixtures))
+
+    def benchmark_season_backtest(self):
+        """ As test_080, separate normalised home and away Goal Difference models built the day before each match date,
+        then used to predict that day's matches, over the most recent season."""
+        match_dates = [match_date for match_date in self.sample_dates
+                       if match_date > self.dates[-1] - timedelta(days=365)]
+
+        def run_fn(i):
+            stats_cache = StatsCache(self.db_cursor, stats_source=SeasonMatrix(self.db_cursor))
+            num_correct = 0
+            for match_date in match_dates:
+                model_date = match_date - timedelta(days=1)
+                models = ModelTable.create_for_all_teams(
+                    model_making_fn=lambda team: [
+                        stats_cache.n_sample_stats_for_team(team=team, n_samples=NUM_SAMPLES,
+                                                            last_sample_date=model_date, home_only=home_only,
+                                                            normalize_by_matches=True).goal_diff
+                        for home_only in (True, False)],
+                    entities=self.teams)
+
+                matches = [ActualResults.unpack_match_result_data(match) for match in
+                           ActualResults.get_results_data(db_cursor=self.db_cursor, win_size=timedelta(days=0),
+                                                          win_end=match_date)]
+                predictions = FootballMatchPredictor(models=models).predict_many(
+                    fixtures=[(home_team, away_team) for (_, home_team, _, away_team, _, _) in matches])
+                num_correct += sum(prediction['predicted_result'] == match[5]
+                                   for (prediction, match) in zip(predictions, matches))
+            logging.debug('Season backtest, %i correct' % num_correct)
+
+        # Each run takes a while, but a p50 of only a handful of them varies too much from run to run to compare.
+        return time_benchmark('season_backtest (test_080)', run_fn, iterations=max(15, self.iterations // 10),
+                              items_per_iteration=len(match_dates))
+
+    def run(self, names: [str] = None):
+        """ :param names: optional, only run the benchmarks whose names contain one of these."""
+        results = []
+        for method_name in sorted(name for name in dir(self) if name.startswith('benchmark_')):
+            if names and not any(name in method_name for name in names):
+                continue
+            logging.info('Running %s' % method_name)
+            # How fast the machine is running varies, both between runs and part way through them, so the reference is
+            # timed either side of each benchmark, for compare_to_baseline() to allow for it.
+            reference_before = time_reference()
+            result = getattr(self, method_name)()
+            results.append(result._replace(reference_p50=(reference_before + time_reference()) / 2))
+        return results
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=os.environ.get("LOGLEVEL", "INFO"))
+
+    parser: ArgumentParser = ArgumentParser()
+    parser.description = "Times the StatsLib, FeatureLib and predictor hot paths and compares them to a baseline, " \
+                         "exits with 1 if any have regressed"
+    parser.add_argument('-r', '--results-sqlite',
+                        help='Sqlite file containing results to benchmark against, default %s' % RESULTS_FIXTURE_DATA,
+                        default=RESULTS_FIXTURE_DATA,
+                        required=False,
+                        type=str
+                        )
+
+    parser.add_argument('-s', '--synthetic-seasons',
+                        help='Rather than --results-sqlite, benchmark against a generated results DB with this many '
+                             'seasons, see SyntheticLeagueLib',
+                        default=None,
+                        required=False,
+                        type=int
+                        )
+
+    parser.add_argument('--synthetic-divisions',
+                        help='Number of divisions for --synthetic-seasons, default %i' % 1,
+                        default=1,
+                        required=False,
+                        type=int
+                        )
+
+    parser.add_argument('--synthetic-teams',
+                        help='Number of teams in each division for --synthetic-seasons, default %i' % 20,
+                        default=20,
+                        required=False,
+                        type=int
+                        )
+
+    parser.add_argument('-b', '--baseline',
+                        help='Baseline JSON file to compare against, default %s' % BASELINE_FILE,
+                        default=BASELINE_FILE,
+                        required=False,
+                        type=str
+                        )
+
+    parser.add_argument('-u', '--update-baseline',
+                        help='Write the timings to the baseline file rather than comparing against it',
+                        default=False,
+                        action='store_true'
+                        )
+
+    parser.add_argument('-n', '--iterations',
+                        help='Number of iterations for each of the benchmarks, some do more or fewer, default %i' % 200,
+                        default=200,
+                        required=False,
+                        type=int
+                        )
+
+    parser.add_argument('-t', '--tolerance',
+                        help='Proportion that a p50 can grow by before it is a regression, default %s' %
+                             DEFAULT_TOLERANCE,
+                        default=DEFAULT_TOLERANCE,
+                        required=False,
+                        type=float
+                        )
+
+    parser.add_argument('-k', '--only',
+                        help='Only run the benchmarks whose names contain one of these, e.g. -k predict stats',
+                        default=None,
+                        required=False,
+                        nargs='+'
+                        )
+
+    args = parser.parse_args()
+
+    results_sqlite = args.results_sqlite
+    synthetic_dir = None
+    if args.synthetic_seasons is not None:
+        synthetic_dir = tempfile.TemporaryDirectory()
+        results_sqlite = os.path.join(synthetic_dir.name, 'synthetic_%i_teams_%i_divisions_%i_seasons.db' % (
+            args.synthetic_teams, args.synthetic_divisions, args.synthetic_seasons))
+        SyntheticLeague(num_teams=args.synthetic_teams, num_seasons=args.synthetic_seasons,
+                        num_divisions=args.synthetic_divisions).write_file(results_sqlite)
+
+    with sqlite3.connect(results_sqlite) as db_conn:
+        db_conn.row_factory = sqlite3.Row
+        results = Benchmarks(db_conn.cursor(), iterations=args.iterations).run(names=args.only)
+
+    if synthetic_dir is not None:
+        synthetic_dir.cleanup()
+
+    dataset = os.path.basename(results_sqlite)
+    if args.update_baseline:
+        save_baseline(args.baseline, results, dataset=dataset, description='%i iterations' % args.iterations)
+        print(format_report(compare_to_baseline(results, {})))
+        sys.exit(0)
+
+    baseline = load_baseline(args.baseline, dataset=dataset) if os.path.exists(args.baseline) else {}
+    comparisons = compare_to_baseline(results, baseline, tolerance=args.tolerance)
+    print(format_report(comparisons))
+    sys.exit(1 if any(regressed for (_, _, regressed) in comparisons) else 0)
@@ -0,0 +1,162 @@
+import datetime
+import glob
+import logging
+import os
+import re
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from functools import partial
+
+from bs4 import BeautifulSoup, NavigableString, SoupStrainer
+
+from SchemaLib import SQL_CREATE_RESULTS_TABLE
+
+try:
+    import lxml  # noqa: F401, only needed for BeautifulSoup to be able to use it
+    DEFAULT_PARSER = 'lxml'
+except ImportError:
+    DEFAULT_PARSER = 'html.parser'
+
+TABLE_NAME = 'results'
+
+SQL_CREATE_TABLE = SQL_CREATE_RESULTS_TABLE
+
+SQL_DROP_TABLE = '''DROP TABLE IF EXISTS %s;''' % TABLE_NAME
+
+# A match is identified by its date and teams, so re-scraping a match that is already in the DB only updates its score,
+# e.g. if it was scraped part way through, rather than adding it again. Relies on SchemaLib.ensure_natural_key().
+SQL_UPSERT = \
+    """
+    INSERT INTO %s(date, home_team, home_score, away_team, away_score) VALUES (?,?,?,?,?)
+      ON CONFLICT(date, home_team, away_team) DO UPDATE SET
+        home_score = excluded.home_score,
+        away_score = excluded.away_score
+    """ % TABLE_NAME
+
+SQL_LATEST_DATE = '''SELECT MAX(date) FROM %s''' % TABLE_NAME
+
+
+# e.g. "\n\           Monday 17th October 2016    "
+MATCH_DATE_REGEX = re.compile(r'(\d+)\w\w\s+(\w+)\s+(\d\d\d\d)')
+
+# In the form X-Y
+SCORE_REGEX = re.compile(r'(\d+)-(\d+)')
+
+TABLE_STATS_CAPTION_REGEX = re.compile(r'This table charts the fixtures during')
+
+# Only the match day tables are built into the tree, the rest of the page, i.e. most of it, is skipped.
+TABLE_STATS_STRAINER = SoupStrainer('table', class_='table-stats')
+
+
+def get_match_date(match_day_string: NavigableString) -> datetime.date:
+    match_day_string = str(match_day_string)
+    match = MATCH_DATE_REGEX.search(match_day_string)
+    assert match is not None, "Failed to capture date info, regex '%s', string '%s'" % \
+                              (MATCH_DATE_REGEX.pattern, match_day_string)
+
+    (day, month, year) = match.groups()
+    logging.debug('Extracted year %s, month %s, day %s' % (year, month, day))
+    date = datetime.datetime.strptime("%s %s %s" % (year, month, day), '%Y %B %d').date()
+    logging.debug('Created a date object %s' % date)
+    return date
+
+
+def table_stats_soup_filter(tag) -> bool:
+    return tag.name == 'table' and tag.has_attr('class') and 'table-stats' in tag['class'] and \
+        tag.caption is not None and TABLE_STATS_CAPTION_REGEX.search(str(tag.caption.string)) is not None
+
+
+def match_details_soup_filter(tag) -> bool:
+    # Match results are contained in <td class="match-details">, however there are also some tags that
+    # <td class="match-details" scope='col'> that contain who knows what that need to be filtered out.
+    return tag.has_attr('class') and 'match-details' in tag['class'] and not tag.get('scope')
+
+
+def parse_results_page(data: str, stop_before: date = None, parser: str = None) -> [(str, str, int, str, int)]:
+    """ Extracts the results from a BBC results page.
+
+    :param data: the page's HTML.
+    :param stop_before: optional, match days are listed most recent first so stop at the first that is before this,
+     e.g. when only the results since the last scrape are wanted.
+    :param parser: BeautifulSoup tree builder, by default lxml if it is installed, which is much faster, otherwise
+     html.parser. Either gives the same results.
+    :return: list of (date, home_team, home_score, away_team, away_score), in the order on the page, with the dates as
+     ISO strings, i.e. ready to be inserted into the results table.
+    """
+    soup = BeautifulSoup(data, parser or DEFAULT_PARSER, parse_only=TABLE_STATS_STRAINER)
+
+    results = []
+    for match_day_table_html in soup.find_all(table_stats_soup_filter):
+        match_date = get_match_date(match_day_table_html.caption.string)
+        if stop_before is not None and match_date < stop_before:
+            logging.debug('Stopping at %s, before %s' % (match_date, stop_before))
+            break
+
+        for match_details_html in match_day_table_html.find_all(match_details_soup_filter):
+            logging.debug('match_details_html %s' % match_details_html)
+            home_team = match_details_html.find(class_='team-home').a.string
+            logging.debug('Extracted home_team %s' % home_team)
+            away_team = match_details_html.find(class_='team-away').a.string
+            logging.debug('Extracted away_team %s' % away_team)
+
+            score_h_vs_a = match_details_html.find(class_='score').abbr.string
+            match = SCORE_REGEX.search(score_h_vs_a)
+            assert match is not None, "Failed to capture scores info, regex '%s', string '%s'" % \
+                                      (SCORE_REGEX.pattern, score_h_vs_a)
+
+            results.append((match_date.isoformat(), str(home_team), int(match.groups()[0]), str(away_team),
+                            int(match.groups()[1])))
+
+    return results
+
+
+def latest_result_date(db_cursor: sqlite3.Cursor) -> date:
+    """ :return: date of the most recent result in the DB, None if there are none."""
+    latest = db_cursor.execute(SQL_LATEST_DATE).fetchone()[0]
+    return datetime.datetime.strptime(latest, '%Y-%m-%d').date() if latest is not None else None
+
+
+def results_page_files(path: str) -> [str]:
+    """ :return: the archived results pages in a directory, i.e. its *.html and *.htm files, or matching a glob,
+     sorted by name."""
+    if os.path.isdir(path):
+        files = glob.glob(os.path.join(path, '*.html')) + glob.glob(os.path.join(path, '*.htm'))
+    else:
+        files = glob.glob(path)
+    return sorted(files)
+
+
+def parse_results_file(file_name: str, parser: str = None) -> [(str, str, int, str, int)]:
+    with open(file_name) as results_file:
+        results = parse_results_page(results_file.read(), parser=parser)
+    logging.info('Parsed %i results from %s' % (len(results), file_name))
+    return results
+
+
+def parse_results_files(file_names: [str], parser: str = None, max_workers: int = None) -> [(str, str, int, str, int)]:
+    """ Parses many archived results pages, e.g. one per season, in parallel and merges them.
+
+    :param file_names: results pages to parse, where the same match is in more than one the later file wins, so these
+     should be in the order they were saved.
+    :param parser: BeautifulSoup tree builder, see parse_results_page().
+    :param max_workers: number of worker processes, defaults to the number of CPUs. 0 parses everything in this
+     process.
+    :return: list of (date, home_team, home_score, away_team, away_score), one per match, in date order, i.e. ready to
+     be appended to the results table.
+    """
+    parse_fn = partial(parse_results_file, parser=parser)
+    if max_workers == 0 or len(file_names) <= 1:
+        results_by_file = map(parse_fn, file_names)
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results_by_file = list(executor.map(parse_fn, file_names))
+
+    results_by_key = {}
+    for results in results_by_file:
+        for result in results:
+            (match_date, home_team, _, away_team, _) = result
+            results_by_key[(match_date, home_team, away_team)] = result
+
+    # Stable, so matches on the same date stay in the order they were on the page.
+    return sorted(results_by_key.values(), key=lambda result: result[0])
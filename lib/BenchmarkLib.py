@@ -0,0 +1,116 @@
+import json
+import logging
+import time
+import typing
+from collections import namedtuple
+
+import numpy as np
+
+# Timings for one benchmark, all times in seconds per iteration. Throughput is items per second, where an item is
+# whatever the benchmark counts, e.g. queries or fixtures. Optionally reference_p50 is the p50 of the reference workload,
+# see time_reference(), timed alongside the benchmark, for comparing timings taken on different machines, or on the same
+# one when it's busier.
+BenchmarkResult = namedtuple('BenchmarkResult', ['name', 'iterations', 'items_per_iteration', 'mean', 'p50', 'p90',
+                                                 'p99', 'throughput', 'reference_p50'])
+
+# A benchmark's p50 can grow by this proportion over its baseline before it counts as a regression. Timings vary a fair
+# bit from run to run, so it needs to be loose enough not to cry wolf.
+DEFAULT_TOLERANCE = 0.5
+
+
+def summarise(name: str, timings: [float], items_per_iteration: int = 1) -> BenchmarkResult:
+    """ :param timings: seconds taken by each iteration."""
+    timings = np.asarray(timings, dtype=np.float64)
+    (p50, p90, p99) = np.percentile(timings, [50, 90, 99])
+    mean = float(timings.mean())
+    return BenchmarkResult(name=name, iterations=len(timings), items_per_iteration=items_per_iteration, mean=mean,
+                           p50=float(p50), p90=float(p90), p99=float(p99),
+                           throughput=items_per_iteration / mean if mean > 0 else float('inf'), reference_p50=None)
+
+
+def time_benchmark(name: str, run_fn: typing.Callable, iterations: int, items_per_iteration: int = 1,
+                   warmup: int = 1, setup_fn: typing.Callable = None) -> BenchmarkResult:
+    """ Times iterations of run_fn.
+
+    :param run_fn: called with the iteration number, 0 upwards, e.g. to pick which team or date to do.
+    :param warmup: number of untimed iterations to do first, e.g. to fill the sqlite page cache.
+    :param setup_fn: optional, called, untimed, before each iteration, e.g. to clear caches.
+    """
+    for i in range(warmup):
+        if setup_fn is not None:
+            setup_fn()
+        run_fn(i)
+
+    timings = []
+    for i in range(iterations):
+        if setup_fn is not None:
+            setup_fn()
+        start = time.perf_counter()
+        run_fn(i)
+        timings.append(time.perf_counter() - start)
+
+    result = summarise(name, timings, items_per_iteration=items_per_iteration)
+    logging.debug('%s' % (result,))
+    return result
+
+
+def time_reference(iterations: int = 50) -> float:
+    """ :return: p50 of a fixed, pure Python, workload, i.e. a measure of how fast the machine is running right now."""
+    def run_fn(i):
+        sorted(((j * 7919 + i) % 10007, str(j)) for j in range(5000))
+
+    return time_benchmark('reference', run_fn, iterations=iterations, warmup=5).p50
+
+
+def load_baseline(baseline_file: str, dataset: str = None) -> {str: dict}:
+    """
+    :param dataset: optional, name of the results DB being benchmarked, timings from a different one are no use for
+     comparison so none are returned.
+    :return: {benchmark name: result as a dict}.
+    """
+    with open(baseline_file) as infile:
+        baseline = json.load(infile)
+
+    if dataset is not None and baseline.get('dataset') != dataset:
+        logging.warning('Baseline %s is for %s not %s, not comparing' % (baseline_file, baseline.get('dataset'),
+                                                                       dataset))
+        return {}
+    return baseline['benchmarks']
+
+
+def save_baseline(baseline_file: str, results: [BenchmarkResult], dataset: str = None, description: str = None):
+    with open(baseline_file, 'w') as outfile:
+        json.dump({'dataset': dataset, 'description': description,
+                   'benchmarks': {result.name: result._asdict() for result in results}},
+                  outfile, indent=2, sort_keys=True)
+        outfile.write('\n')
+
+
+def compare_to_baseline(results: [BenchmarkResult], baseline: {str: dict},
+                        tolerance: float = DEFAULT_TOLERANCE) -> [(BenchmarkResult, float, bool)]:
+    """
+    :return: (result, p50 relative to the baseline's, True if that's a regression) for each of the results, the
+     ratio is None if the benchmark isn't in the baseline, which is never a regression. Where both the result and the
+     baseline have a reference_p50 the ratio is of the p50s relative to those, so that a slower machine isn't taken for
+     a regression.
+    """
+    comparisons = []
+    for result in results:
+        if result.name not in baseline:
+            comparisons.append((result, None, False))
+            continue
+        ratio = result.p50 / baseline[result.name]['p50']
+        if result.reference_p50 is not None and baseline[result.name].get('reference_p50') is not None:
+            ratio /= result.reference_p50 / baseline[result.name]['reference_p50']
+        comparisons.append((result, ratio, ratio > 1.0 + tolerance))
+    return comparisons
+
+
+def format_report(comparisons: [(BenchmarkResult, float, bool)]) -> str:
+    lines = ['%-45s %8s %12s %12s %12s %14s %10s' % ('benchmark', 'n', 'p50 ms', 'p90 ms', 'p99 ms', 'items/s',
+                                                     'vs base')]
+    for (result, ratio, regressed) in comparisons:
+        lines.append('%-45s %8i %12.4f %12.4f %12.4f %14.1f %10s%s' % (
+            result.name, result.iterations, result.p50 * 1e3, result.p90 * 1e3, result.p99 * 1e3, result.throughput,
+            '-' if ratio is None else '%.2fx' % ratio, '  REGRESSION' if regressed else ''))
+    return '\n'.join(lines)
@@ -0,0 +1,96 @@
+import logging
+import sqlite3
+
+# Settings for databases that can be regenerated if need be, e.g. experiment logging and freshly scraped results. WAL
+# means readers, such as an sqlite console watching a long experiment, do not block the writer and NORMAL sync only
+# syncs at checkpoints rather than every commit. Neither risks corruption, only the most recent commits if the power
+# goes.
+SQL_SCRATCH_DB_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL'
+]
+
+
+def configure_scratch_db(db_connection: sqlite3.Connection):
+    for sql in SQL_SCRATCH_DB_PRAGMAS:
+        logging.debug(sql)
+        db_connection.execute(sql)
+
+
+class BulkWriter(object):
+    """Buffers rows for an INSERT and writes them with executemany, inside an explicit transaction that is committed
+    every commit_every rows rather than after each one.
+
+    Rows can be anything that the statement can be executed with, i.e. tuples or dicts of named bindings.
+
+    e.g.
+
+        with BulkWriter(db_connection, SQL_INSERT_TEST_LOG_ENTRY) as log_writer:
+            for ...
+                log_writer.add(sql_binding)
+
+    Anything that reads back what has been written, through the same connection, needs to flush() first.
+    """
+
+    def __init__(self, db_connection: sqlite3.Connection, sql: str, batch_size: int = 1000,
+                 commit_every: int = 10000):
+        """
+        :param db_connection: connection to write to.
+        :param sql: INSERT, or other, statement that each row is executed with.
+        :param batch_size: number of rows to buffer before handing them to executemany.
+        :param commit_every: number of rows to write in each transaction, should be a multiple of batch_size. None to
+         leave all of the committing to the caller, e.g. to write everything in a single transaction.
+        """
+        self.db_connection = db_connection
+        self.sql = sql
+        self.batch_size = batch_size
+        self.commit_every = commit_every
+        self.rows = []
+        self.rows_since_commit = 0
+        self.rows_written = 0
+
+    def add(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def add_many(self, rows):
+        for row in rows:
+            self.add(row)
+
+    def flush(self):
+        """ Writes any buffered rows, committing if there have been commit_every rows since the last commit."""
+        if len(self.rows) == 0:
+            return
+
+        if not self.db_connection.in_transaction:
+            self.db_connection.execute('BEGIN')
+        self.db_connection.executemany(self.sql, self.rows)
+
+        self.rows_written += len(self.rows)
+        self.rows_since_commit += len(self.rows)
+        self.rows = []
+
+        if self.commit_every is not None and self.rows_since_commit >= self.commit_every:
+            self.commit()
+
+    def commit(self):
+        logging.debug('Committing %i rows' % self.rows_since_commit)
+        self.db_connection.commit()
+        self.rows_since_commit = 0
+
+    def close(self):
+        """ Writes whatever is left, committing it unless the caller is doing the committing."""
+        self.flush()
+        if self.commit_every is not None:
+            self.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.rows = []
+            self.db_connection.rollback()
@@ -0,0 +1,144 @@
+import math
+import os
+import sqlite3
+import typing
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from urllib.request import pathname2url
+
+from ActualResultsLib import ActualResults
+from FeatureLib import FootballMatchPredictor
+from SeasonMatrixLib import SeasonMatrix
+
+# What a single (parameter, match date) job hands back to the process that is doing the logging:
+# - models: {team: str(model)}, i.e. as persisted to the models log, rather than the models themselves which do not
+#  pickle with their ids intact.
+# - matches: the day's matches as ActualResults.unpack_match_result_data tuples.
+# - predictions: FootballMatchPredictor.predict_many output for the matches, in the same order.
+ExperimentResult = namedtuple('ExperimentResult',
+                              ['parameter', 'match_date', 'model_date', 'models', 'matches', 'predictions'])
+
+
+def connect_read_only(db_file: str, check_same_thread: bool = True) -> sqlite3.Connection:
+    """ Read only connection to an sqlite file, stops workers from ever writing to, or locking, the results DB.
+
+    :param check_same_thread: as for sqlite3.connect(), False lets a connection be handed to another thread, so long
+     as only one uses it at a time.
+    """
+    db_connection = sqlite3.connect('file:%s?mode=ro' % pathname2url(os.path.abspath(db_file)), uri=True,
+                                    check_same_thread=check_same_thread)
+    db_connection.row_factory = sqlite3.Row
+    return db_connection
+
+
+class ExperimentWorker(object):
+    """Per process state for running experiment jobs, each worker process gets one of these and with it its own
+    connection to the results DB.
+
+    Model making functions are passed the worker so that they can use its cursor, or the SeasonMatrix, which is only
+    loaded the first time that it is asked for and then reused for every job that the worker runs.
+    """
+
+    def __init__(self, results_db_file: str):
+        self.results_db_file = results_db_file
+        self.db_connection = connect_read_only(results_db_file)
+        self.cursor = self.db_connection.cursor()
+        self._season_matrix = None
+
+    @property
+    def season_matrix(self) -> SeasonMatrix:
+        if self._season_matrix is None:
+            self._season_matrix = SeasonMatrix(self.cursor)
+        return self._season_matrix
+
+    def run_job(self, model_making_fn: typing.Callable, parameter, match_date: date) -> ExperimentResult:
+        """ Builds the models up to the day before the match date and predicts that day's matches with them.
+
+        :param model_making_fn: called as model_making_fn(worker, parameter, model_date) and returns models suitable for
+         FootballMatchPredictor, i.e. a ModelTable or dict of FeatureModels.
+        """
+        model_date = match_date - timedelta(days=1)
+        models = model_making_fn(self, parameter, model_date)
+
+        matches = [ActualResults.unpack_match_result_data(match_data) for match_data in
+                   ActualResults.get_results_data(db_cursor=self.cursor,
+                                                  win_size=timedelta(days=0),  # 0 == Just that day
+                                                  win_end=match_date)]
+
+        predictions = FootballMatchPredictor(models=models).predict_many(
+            fixtures=[(home_team, away_team) for (_, home_team, _, away_team, _, _) in matches])
+
+        return ExperimentResult(parameter=parameter, match_date=match_date, model_date=model_date,
+                                models={team: str(models[team]) for team in models}, matches=matches,
+                                predictions=predictions)
+
+
+# The worker for this process, set up by the pool's initializer.
+_process_worker: ExperimentWorker = None
+
+
+def _run_process_job(results_db_file: str, job: (typing.Callable, object, date)) -> ExperimentResult:
+    # Made by the first job each process runs, rather than with a ProcessPoolExecutor initializer, which needs Python
+    # 3.7.
+    global _process_worker
+    if _process_worker is None or _process_worker.results_db_file != results_db_file:
+        _process_worker = ExperimentWorker(results_db_file)
+    return _process_worker.run_job(*job)
+
+
+class ExperimentRunner(object):
+    """Runs a model making function over a grid of parameters and match dates, fanning the (parameter, match date)
+    jobs out across a pool of processes.
+
+    Every job is independent, they only read the results DB, so the only thing that has to be done serially is writing
+    the results to the logging DB. That is left to the caller, which gets the results back in the same order as
+    they would have been produced by nested loops over parameters then match dates.
+
+    e.g.
+
+        runner = ExperimentRunner(results_db_file='results.db')
+        for result in runner.run(model_making_fn=make_models, parameters=[0.5, 0.72], match_dates=dates):
+            ... log result ...
+
+    The model making function is sent to the workers, so it needs to be picklable, i.e. a module level function rather
+    than a lambda or closure.
+    """
+
+    def __init__(self, results_db_file: str, max_workers: int = None, chunk_size: int = None):
+        """
+        :param results_db_file: sqlite file containing the results, opened read only by each worker.
+        :param max_workers: number of worker processes, defaults to the number of CPUs. 0 runs everything in this
+         process, which is handy for debugging.
+        :param chunk_size: number of jobs sent to a worker at a time, defaults to spreading the jobs across about 4
+         chunks per worker.
+        """
+        self.results_db_file = results_db_file
+        self.max_workers = os.cpu_count() if max_workers is None else max_workers
+        self.chunk_size = chunk_size
+
+    def run(self, model_making_fn: typing.Callable, parameters: [], match_dates: [date]) \
+            -> typing.Iterator[ExperimentResult]:
+        """
+        :param model_making_fn: called as model_making_fn(worker, parameter, model_date), see ExperimentWorker.run_job.
+        :param parameters: the parameter values to try, one job per parameter per match date.
+        :param match_dates: dates to make predictions for, the models for each are built up to the day before.
+        :return: generator of ExperimentResult, ordered by parameter and then match date.
+        """
+        jobs = [(model_making_fn, parameter, match_date) for parameter in parameters for match_date in match_dates]
+
+        if self.max_workers == 0:
+            worker = ExperimentWorker(self.results_db_file)
+            try:
+                for job in jobs:
+                    yield worker.run_job(*job)
+            finally:
+                worker.db_connection.close()
+            return
+
+        chunk_size = self.chunk_size
+        if chunk_size is None:
+            chunk_size = max(1, math.ceil(len(jobs) / (4 * self.max_workers)))
+
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            yield from executor.map(_run_process_job, [self.results_db_file] * len(jobs), jobs, chunksize=chunk_size)
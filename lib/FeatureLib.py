@@ -5,6 +5,8 @@ import typing
 
 import sqlite3
 
+from TeamIdsLib import TeamIds
+
 
 class Feature(np.ndarray):
 
@@ -59,9 +61,10 @@ class FeatureModel(Feature):
     def __array_finalize__(self, obj):
         if obj is None:
             return
+        super().__array_finalize__(obj)
         self.id = getattr(obj, 'id', None)
-        self.id = getattr(obj, 'good_data', None)
-        self.id = getattr(obj, 'bad_data_reason', None)
+        self.good_data = getattr(obj, 'good_data', None)
+        self.bad_data_reason = getattr(obj, 'bad_data_reason', None)
 
     @staticmethod
     def create_models_for_all_teams(model_making_fn: typing.Callable, entities) -> dict:
@@ -69,6 +72,86 @@ class FeatureModel(Feature):
         return {ent: model_making_fn(ent) for ent in entities}
 
 
+class ModelTable(object):
+    """All of the teams' models held in one contiguous (teams x features) float array, with the ids and data quality
+    information held in parallel arrays alongside it.
+
+    It behaves like the {id: FeatureModel} dicts used elsewhere, e.g. by FootballMatchPredictor, but the FeatureModels
+    are only created on demand as thin views onto the table's rows.
+
+    Row r is the model for team id r in team_ids, which can be shared with whatever the features were made from, e.g. a
+    SeasonMatrix, so that fixtures can be given to FootballMatchPredictor.predict_many() as those ids rather than names.
+    """
+
+    def __init__(self, ids: [str], features, good_data: [bool] = None, bad_data_reasons: [str] = None,
+                 team_ids: TeamIds = None):
+        """
+        :param team_ids: optional, interning to share, ids must be its names in id order.
+        """
+        ids = list(ids)
+        if team_ids is None:
+            team_ids = TeamIds(ids)
+            assert len(team_ids) == len(ids), 'Model ids are not unique'
+        assert list(team_ids) == ids, 'Model ids are not in team_ids order'
+        self.team_ids = team_ids
+
+        features = np.asarray(features, dtype=np.float64)
+        if features.ndim == 1:
+            # Single feature models
+            features = features[:, np.newaxis]
+        assert features.ndim == 2 and features.shape[0] == len(ids), \
+            'Cannot make table, models have different dimensions'
+        self.features = np.ascontiguousarray(features)
+
+        self.ids = np.array(ids, dtype=object)
+        self.good_data = np.array(good_data if good_data is not None else [None] * len(ids), dtype=object)
+        self.bad_data_reasons = np.array(bad_data_reasons if bad_data_reasons is not None else [None] * len(ids),
+                                         dtype=object)
+        self.bad_data = np.array([good is False for good in self.good_data], dtype=bool)
+
+    @classmethod
+    def from_models(cls, models: {str: FeatureModel}):
+        ids = list(models.keys())
+        return cls(ids=ids,
+                   features=[np.atleast_1d(np.asarray(models[id], dtype=np.float64)) for id in ids],
+                   good_data=[getattr(models[id], 'good_data', None) for id in ids],
+                   bad_data_reasons=[getattr(models[id], 'bad_data_reason', None) for id in ids])
+
+    @classmethod
+    def create_for_all_teams(cls, model_making_fn: typing.Callable, entities):
+        """ Table equivalent of FeatureModel.create_models_for_all_teams, model_making_fn can return a plain list of
+        features rather than a FeatureModel, which avoids creating an ndarray subclass per team. If entities is a
+        TeamIds the table shares it."""
+        team_ids = entities if isinstance(entities, TeamIds) else None
+        entities = list(entities)
+        features = [model_making_fn(ent) for ent in entities]
+        return cls(ids=entities, team_ids=team_ids,
+                   features=[np.atleast_1d(np.asarray(feature, dtype=np.float64)) for feature in features],
+                   good_data=[getattr(feature, 'good_data', None) for feature in features],
+                   bad_data_reasons=[getattr(feature, 'bad_data_reason', None) for feature in features])
+
+    def __getitem__(self, id: str) -> FeatureModel:
+        row = self.team_ids.name2id[id]
+
+        model = self.features[row].view(FeatureModel)
+        model.id = id
+        model.good_data = self.good_data[row]
+        model.bad_data_reason = self.bad_data_reasons[row]
+        return model
+
+    def __contains__(self, id: str) -> bool:
+        return id in self.team_ids
+
+    def __iter__(self):
+        return iter(self.team_ids)
+
+    def __len__(self) -> int:
+        return len(self.team_ids)
+
+    def keys(self):
+        return list(self.team_ids)
+
+
 class FootballMatchPredictor(object):
     def __init__(self, models: {str: FeatureModel},
                  home_advantage_boost:float = 0.0,
@@ -134,39 +217,161 @@ class FootballMatchPredictor(object):
             return predicted_result, distance, None
 
 
+    # Structure of the array returned by predict_many(), one row per fixture.
+    PREDICTIONS_DTYPE = np.dtype([('home_team', object), ('away_team', object), ('predicted_result', 'U8'),
+                                  ('distance', np.float64), ('bad_data_explanation', object)])
+
+    def model_table(self):
+        """ The models as a ModelTable, one is built if the models are a dict."""
+        return self.models if isinstance(self.models, ModelTable) else ModelTable.from_models(self.models)
+
+    def fixture_metrics(self, fixtures: [(str, str)], model_table=None) -> tuple:
+        """ The home and away metrics that predictions are made from, i.e. distance = home - away.
+
+        :param fixtures: list of (home_team, away_team) tuples, or a (fixtures x 2) integer array of the model table's
+         team ids.
+        :param model_table: if the caller already has model_table() to hand.
+        :return: (home_ids, away_ids, home_metrics, away_metrics), ids are rows in the model table, one entry in each
+         per fixture.
+        """
+        model_table = self.model_table() if model_table is None else model_table
+        team_ids = model_table.team_ids
+
+        if isinstance(fixtures, np.ndarray) and fixtures.dtype.kind in 'iu':
+            fixtures = fixtures.reshape(-1, 2)
+            (home_ids, away_ids) = (fixtures[:, 0].astype(np.intp), fixtures[:, 1].astype(np.intp))
+            unknown = (home_ids < 0) | (home_ids >= len(team_ids)) | (away_ids < 0) | (away_ids >= len(team_ids))
+            if unknown.any():
+                raise KeyError('No model for team ids %s' % sorted(set(fixtures[unknown].ravel().tolist())))
+        else:
+            home_teams = [fixture[0] for fixture in fixtures]
+            away_teams = [fixture[1] for fixture in fixtures]
+            home_ids = team_ids.ids(home_teams)
+            away_ids = team_ids.ids(away_teams)
+            if (home_ids < 0).any() or (away_ids < 0).any():
+                raise KeyError('No model for %s' % [team for team in home_teams + away_teams if team not in team_ids])
+
+        # As with predict(), use the away part of the model for the away team if there is one.
+        away_feature = 1 if model_table.features.shape[1] > 1 else 0
+        home_metric = self.home_advantage + model_table.features[home_ids, 0]
+        away_metric = model_table.features[away_ids, away_feature]
+        return home_ids, away_ids, home_metric, away_metric
+
+    def predict_many(self, fixtures: [(str, str)]) -> np.ndarray:
+        """ Vectorised equivalent of calling predict() for each of the fixtures.
+
+        The models are used as a single (teams x features) ModelTable, one is built if the models are a dict, then the
+        home and away metrics, distances and classifications are worked out for all of the fixtures in one pass.
+
+        :param fixtures: list of (home_team, away_team) tuples, or a (fixtures x 2) integer array of the model table's
+         team ids, which are only turned into names for the home_team and away_team of the predictions.
+        :return: structured array, see PREDICTIONS_DTYPE, one row per fixture in the same order as fixtures.
+        """
+        model_table = self.model_table()
+        (home_ids, away_ids, home_metric, away_metric) = self.fixture_metrics(fixtures, model_table=model_table)
+        distance = home_metric - away_metric
+
+        decisive = np.abs(distance) > self.threshold
+        predicted_result = np.full(len(home_ids), 'draw', dtype='U8')
+        predicted_result[(home_metric > away_metric) & decisive] = 'home_win'
+        predicted_result[(home_metric < away_metric) & decisive] = 'away_win'
+
+        predictions = np.empty(len(home_ids), dtype=FootballMatchPredictor.PREDICTIONS_DTYPE)
+        predictions['home_team'] = model_table.ids[home_ids]
+        predictions['away_team'] = model_table.ids[away_ids]
+        predictions['predicted_result'] = predicted_result
+        predictions['distance'] = distance
+        predictions['bad_data_explanation'] = None
+
+        # Bad data is the exception, so only build explanations for the fixtures that need them.
+        for i in np.flatnonzero(model_table.bad_data[home_ids] | model_table.bad_data[away_ids]):
+            predictions['bad_data_explanation'][i] = ', '.join(
+                'Bad model for %s - %s' % (model_table.ids[row], 'No reason given' if
+                                           model_table.bad_data_reasons[row] is None else
+                                           model_table.bad_data_reasons[row])
+                for row in (home_ids[i], away_ids[i]) if model_table.bad_data[row])
+
+        return predictions
+
+
 class FeatureModelRanking(object):
+    """A league table, the input data ranked, best first, by the features that feature_making_fn makes from it.
+
+    feature_making_fn can return a single score, or a tuple of scores that are compared in turn, e.g.
+    (points, goal_diff). Teams with equal features share a place, standard competition ranking i.e. 1, 2, 2, 4, and are
+    listed in the order they were given. The ranking itself is done on plain arrays by competition_ranks(), the
+    FeatureModels are only created the first time feature_models or id2feature_models is asked for.
+    """
     def __init__(self, input_data: [],
                  feature_making_fn: typing.Callable,
                  id_fn: typing.Callable =None):
 
-        unsorted_feature_models = [FeatureModel(data, id=id_fn(data), feature_model_making_fn=feature_making_fn) for
-                                   data in input_data]
+        input_data = list(input_data)
+        scores = np.asarray([feature_making_fn(data) for data in input_data], dtype=np.float64)
+        # One column per score when the features are tuples, most significant first.
+        keys = scores.T if scores.ndim == 2 else [scores]
+        (ranks, order) = FeatureModelRanking.competition_ranks(*keys)
 
-        self.feature_models = sorted(unsorted_feature_models, reverse=True)
-
-        self.id2feature_models = {feature.id: feature for feature in self.feature_models}
+        self.feature_making_fn = feature_making_fn
+        self.input_data = [input_data[i] for i in order]
+        self.ids = [id_fn(data) for data in self.input_data]
+        self.ranks = ranks[order]
 
         self.id2ranking = {}
         self.gen_id2rankings()
 
-    def gen_id2rankings(self):
-        table_pos = 0
-        team_place = 0
-        last_feature = None
+        # Made the first time they're asked for.
+        self._feature_models = None
+        self._id2feature_models = None
+
+    @staticmethod
+    def competition_ranks(scores, *tie_breakers) -> (np.ndarray, np.ndarray):
+        """ Standard competition ranks, highest score first, ties sharing the best of their places e.g. 1, 2, 2, 4.
+
+        :param scores: shape (teams) or, to rank many dates at once, (dates x teams).
+        :param tie_breakers: optional, arrays of the same shape as scores, each used in turn to split teams that are
+         level on everything before it, e.g. competition_ranks(points, goal_diff).
+        :return: (ranks, order) both the shape of scores, ranks[..., t] is team t's place, 1 upwards, and order is the
+         team indices in table order. Teams level on everything are kept in their given order and NaNs rank last.
+        """
+        keys = np.stack(np.broadcast_arrays(*[np.asarray(key, dtype=np.float64) for key in (scores,) + tie_breakers]))
+
+        # lexsort is stable and ascending with its last key the most significant, so reverse and negate the keys.
+        order = np.lexsort(-keys[::-1], axis=-1)
+        sorted_keys = np.take_along_axis(keys, order[np.newaxis], axis=-1)
 
-        for feature in self.feature_models:
-            table_pos += 1
-            if last_feature is None or feature < last_feature:
-                # Cope with first place then allow for subsequent tied positions by only incrementing the team's place
-                # in the league if their performance was worse than the previous team.
-                team_place = table_pos
+        # Each team's place is its table position, unless it is level with the team above, in which case it takes that
+        # team's place.
+        places = np.broadcast_to(np.arange(1, keys.shape[-1] + 1), order.shape).copy()
+        level = np.all(sorted_keys[..., 1:] == sorted_keys[..., :-1], axis=0)
+        places[..., 1:][level] = 0
+        places = np.maximum.accumulate(places, axis=-1)
 
-            self.id2ranking[feature.id] = team_place
-            last_feature = feature
+        ranks = np.empty_like(places)
+        np.put_along_axis(ranks, order, places, axis=-1)
+        return ranks, order
+
+    def gen_id2rankings(self):
+        for (id, rank) in zip(self.ids, self.ranks):
+            self.id2ranking[id] = int(rank)
+
+    @property
+    def feature_models(self) -> [FeatureModel]:
+        """ The FeatureModels, in table order."""
+        if self._feature_models is None:
+            self._feature_models = [FeatureModel(data, id=id, feature_model_making_fn=self.feature_making_fn)
+                                    for (id, data) in zip(self.ids, self.input_data)]
+        return self._feature_models
+
+    @property
+    def id2feature_models(self) -> {str: FeatureModel}:
+        if self._id2feature_models is None:
+            self._id2feature_models = {feature.id: feature for feature in self.feature_models}
+        return self._id2feature_models
 
     def __iter__(self):
-        for id in self.id2ranking:
-            yield self.id2ranking[id], self.id2feature_models[id].input_data
+        for (rank, data) in zip(self.ranks, self.input_data):
+            yield int(rank), data
 
     def __str__(self) -> str:
         return '%s' % list(self)
@@ -0,0 +1,362 @@
+#!/usr/bin/env python
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+from argparse import ArgumentParser
+from datetime import date
+
+import numpy as np
+
+from SeasonMatrixLib import SeasonMatrix, CumulativeStatsIndex
+from StatsLib import Stats
+from TeamIdsLib import TeamIds
+
+SQL_RESULTS_IN_ID_ORDER = \
+    """
+    SELECT
+      id,
+      date,
+      home_team,
+      home_score,
+      away_team,
+      away_score
+    FROM results
+    WHERE id <= :last_id
+    ORDER BY id
+      ASC
+    """
+
+SQL_LAST_RESULT = '''SELECT MAX(id) AS last_id FROM results'''
+
+SQL_FIRST_DATE_AFTER = '''SELECT MIN(date) AS first_date FROM results WHERE id > :last_id'''
+
+
+class FeatureStore(object):
+    """Precomputed n-sample stats for every team, as at the end of every match date, for a set of window sizes, held
+    as .npy files in a directory so that they can be memory mapped rather than recomputed.
+
+    The store is made up of:
+    - dates.npy: the match dates, datetime64[D].
+    - totals.npy: int32 of shape (dates x splits x windows x teams x fields), where splits are combined, home only and
+     away only, see SPLITS, and fields are those of CumulativeStatsIndex.FIELDS.
+    - cover_from.npy: datetime64[D] of shape (dates x splits x windows x teams), the date of the first match in each
+     window, NaT if there were none.
+    - metadata.json: the teams, windows and enough about the results table to tell if rows have since been appended.
+
+    Use FeatureStore.build() to create or bring a store up to date and FeatureStore() to open an existing one. The
+    arrays are written straight to the memory mapped files a chunk of dates at a time, so building a store only ever
+    needs a chunk's worth of memory however many seasons and divisions there are.
+    """
+
+    FIELDS = CumulativeStatsIndex.FIELDS
+    SPLITS = (None, True, False)
+    FEATURES = ('points', 'goal_diff', 'won_rate', 'drawn_rate', 'lost_rate')
+
+    # Largest of the default windows, a season in the biggest division of English league football, 24 teams playing
+    # each other home and away. Without it the default would grow with every team in the DB, across all divisions.
+    MAX_DEFAULT_WINDOW = 2 * (24 - 1)
+
+    # Number of dates computed, and held in memory, at a time.
+    DATES_PER_CHUNK = 32
+
+    def __init__(self, store_dir: str):
+        self.store_dir = store_dir
+        with open(os.path.join(store_dir, 'metadata.json')) as metadata_file:
+            self.metadata = json.load(metadata_file)
+
+        self.teams: [str] = self.metadata['teams']
+        self.team_ids = TeamIds(self.teams)
+        self.windows: [int] = self.metadata['windows']
+        self.window_indexes = {window: i for i, window in enumerate(self.windows)}
+
+        self.dates = np.load(os.path.join(store_dir, 'dates.npy'))
+        self.totals = np.load(os.path.join(store_dir, 'totals.npy'), mmap_mode='r')
+        self.cover_from = np.load(os.path.join(store_dir, 'cover_from.npy'), mmap_mode='r')
+
+    @staticmethod
+    def default_windows(teams: [str]) -> [int]:
+        """ 1 up to a season's worth of matches, i.e. each team playing each other home and away, for a division of all
+        the teams or MAX_DEFAULT_WINDOW, whichever is smaller."""
+        return list(range(1, min(2 * (len(teams) - 1), FeatureStore.MAX_DEFAULT_WINDOW) + 1))
+
+    @staticmethod
+    def results_fingerprint(cursor: sqlite3.Cursor, last_id: int) -> str:
+        """ Hash of the results rows up to and including last_id, used to check that rows have only been appended."""
+        digest = hashlib.sha1()
+        for row in cursor.execute(SQL_RESULTS_IN_ID_ORDER, {'last_id': last_id}):
+            digest.update(repr(tuple(row)).encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def compute(season_matrix: SeasonMatrix, windows: [int], dates: np.ndarray, totals: np.ndarray,
+                cover_from: np.ndarray, dates_per_chunk: int = None):
+        """ Fills in totals and cover from dates, as stored, for just the given dates, e.g. the rows of memory mapped
+        files for the dates that have changed.
+
+        Rather than going date by date, each team's matches are accumulated in the order that they played them. The
+        totals for the last n matches up to a date are then the difference between the cumulative totals at the
+        number of matches played by that date, k, and at k - n. The dates are done dates_per_chunk at a time, each
+        chunk written out before moving onto the next.
+
+        :param totals: (dates x splits x windows x teams x fields) to write to.
+        :param cover_from: (dates x splits x windows x teams) to write to.
+        """
+        windows = np.array(windows, dtype=np.int64)
+        dates_per_chunk = dates_per_chunk or FeatureStore.DATES_PER_CHUNK
+
+        # Each team's match dates and running totals, for each of the splits, only teams that have played.
+        played_by_split = []
+        for home_only in FeatureStore.SPLITS:
+            split_mask = season_matrix.split_mask(home_only)
+            teams_played = []
+            for team_id in range(len(season_matrix.teams)):
+                played = np.flatnonzero(split_mask[team_id])
+                if len(played) > 0:
+                    per_match = np.stack([season_matrix.played_mask[team_id, played],
+                                          season_matrix.won[team_id, played],
+                                          season_matrix.drawn[team_id, played],
+                                          season_matrix.lost[team_id, played],
+                                          season_matrix.score_for[team_id, played],
+                                          season_matrix.score_against[team_id, played]], axis=-1).astype(np.int64)
+                    teams_played.append((team_id, season_matrix.dates[played],
+                                         np.concatenate([np.zeros((1, len(FeatureStore.FIELDS)), dtype=np.int64),
+                                                         np.cumsum(per_match, axis=0)])))
+            played_by_split.append(teams_played)
+
+        for first in range(0, len(dates), dates_per_chunk):
+            chunk_dates = dates[first:first + dates_per_chunk]
+            chunk_totals = np.zeros((len(chunk_dates),) + totals.shape[1:], dtype=totals.dtype)
+            chunk_cover_from = np.full(chunk_totals.shape[:-1], np.datetime64('NaT'), dtype=cover_from.dtype)
+
+            for (split, teams_played) in enumerate(played_by_split):
+                for (team_id, played_dates, cumulative) in teams_played:
+                    # Matches played up to each date, k, and where the window on them starts, (dates x windows).
+                    num_played = np.searchsorted(played_dates, chunk_dates, side='right')
+                    window_start = np.where(windows < 0, 0, np.maximum(num_played[:, np.newaxis] - windows, 0))
+
+                    chunk_totals[:, split, :, team_id] = \
+                        cumulative[num_played][:, np.newaxis] - cumulative[window_start]
+                    chunk_cover_from[:, split, :, team_id] = np.where(
+                        window_start < num_played[:, np.newaxis],
+                        played_dates[np.minimum(window_start, len(played_dates) - 1)], np.datetime64('NaT'))
+
+            totals[first:first + len(chunk_dates)] = chunk_totals
+            cover_from[first:first + len(chunk_dates)] = chunk_cover_from
+
+    @staticmethod
+    def grow(npy_file: str, shape: tuple) -> np.memmap:
+        """ Opens an existing .npy file for writing, with its first axis grown to shape[0], in place.
+
+        numpy leaves room in .npy headers for the first axis to grow, so only the shape in the header changes and the
+        existing rows stay where they are on disk.
+        """
+        with open(npy_file, 'r+b') as npy:
+            version = np.lib.format.read_magic(npy)
+            read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else \
+                np.lib.format.read_array_header_2_0
+            (old_shape, fortran_order, dtype) = read_header(npy)
+            header_length = npy.tell()
+            if fortran_order or tuple(old_shape[1:]) != tuple(shape[1:]) or old_shape[0] > shape[0]:
+                raise ValueError('Cannot grow %s from %s to %s' % (npy_file, old_shape, shape))
+
+            npy.seek(0)
+            write_header = np.lib.format.write_array_header_1_0 if version == (1, 0) else \
+                np.lib.format.write_array_header_2_0
+            write_header(npy, {'shape': tuple(shape), 'fortran_order': False,
+                               'descr': np.lib.format.dtype_to_descr(dtype)})
+            if npy.tell() != header_length:
+                raise ValueError('No room to grow the header of %s' % npy_file)
+            npy.truncate(header_length + int(np.prod(shape)) * dtype.itemsize)
+
+        return np.lib.format.open_memmap(npy_file, mode='r+')
+
+    @classmethod
+    def build(cls, cursor: sqlite3.Cursor, store_dir: str, windows: [int] = None, incremental: bool = True):
+        """ Creates, or brings up to date, the store in store_dir.
+
+        If the store already exists and rows have only been appended to results since it was built, with no new teams,
+        then the files are grown in place and only the dates from the earliest appended row onwards are computed and
+        written. Rows for the dates before that are left untouched. Otherwise it is built from scratch, alongside the
+        existing files, which are then swapped for the new ones.
+
+        :param windows: n_samples values to precompute, defaults to the existing store's or default_windows().
+        :param incremental: False to always rebuild from scratch.
+        :return: the up to date FeatureStore.
+        """
+        season_matrix = SeasonMatrix(cursor)
+        last_id = cursor.execute(SQL_LAST_RESULT).fetchone()[0] or 0
+
+        existing = None
+        metadata_file = os.path.join(store_dir, 'metadata.json')
+        if incremental and os.path.exists(metadata_file):
+            existing = cls(store_dir)
+            if windows is None:
+                windows = existing.windows
+
+        if windows is None:
+            windows = cls.default_windows(season_matrix.teams)
+
+        rebuild_from = None
+        if existing is not None and existing.windows == list(windows) and \
+                existing.teams == season_matrix.teams and \
+                existing.metadata['last_result_id'] <= last_id and \
+                existing.metadata['results_fingerprint'] == \
+                cls.results_fingerprint(cursor, existing.metadata['last_result_id']):
+            first_new_date = cursor.execute(SQL_FIRST_DATE_AFTER,
+                                            {'last_id': existing.metadata['last_result_id']}).fetchone()[0]
+            if first_new_date is None:
+                logging.info('Feature store in %s is up to date' % store_dir)
+                return existing
+            rebuild_from = np.datetime64(first_new_date, 'D')
+
+        dates = np.unique(season_matrix.dates)
+        shape = (len(dates), len(cls.SPLITS), len(windows), len(season_matrix.teams), len(cls.FIELDS))
+        os.makedirs(store_dir, exist_ok=True)
+        if rebuild_from is not None:
+            # Stats up to a date only depend on matches up to that date, so everything before the first appended row
+            # is as it was.
+            num_kept = int(np.searchsorted(dates, rebuild_from, side='left'))
+            logging.info('Updating feature store in %s from %s' % (store_dir, rebuild_from))
+            totals = cls.grow(os.path.join(store_dir, 'totals.npy'), shape)
+            cover_from = cls.grow(os.path.join(store_dir, 'cover_from.npy'), shape[:-1])
+            cls.compute(season_matrix, windows, dates[num_kept:], totals[num_kept:], cover_from[num_kept:])
+            totals.flush()
+            cover_from.flush()
+            del totals, cover_from
+        else:
+            logging.info('Building feature store in %s' % store_dir)
+            # Write everything alongside and then swap in, so that anyone with the old files mapped keeps a consistent
+            # view.
+            totals = np.lib.format.open_memmap(os.path.join(store_dir, 'totals.tmp.npy'), mode='w+',
+                                               dtype=np.int32, shape=shape)
+            cover_from = np.lib.format.open_memmap(os.path.join(store_dir, 'cover_from.tmp.npy'), mode='w+',
+                                                   dtype='datetime64[D]', shape=shape[:-1])
+            cls.compute(season_matrix, windows, dates, totals, cover_from)
+            totals.flush()
+            cover_from.flush()
+            del totals, cover_from
+            for name in ('totals', 'cover_from'):
+                os.replace(os.path.join(store_dir, '%s.tmp.npy' % name), os.path.join(store_dir, '%s.npy' % name))
+
+        metadata = {
+            'teams': season_matrix.teams,
+            'windows': list(windows),
+            'fields': list(cls.FIELDS),
+            'last_result_id': last_id,
+            'results_fingerprint': cls.results_fingerprint(cursor, last_id),
+            'rebuilt_from': str(rebuild_from if rebuild_from is not None else dates[0] if len(dates) > 0 else None)
+        }
+
+        # The dates and metadata go last, so that a reader never sees dates that do not have their rows yet.
+        tmp_file = os.path.join(store_dir, 'dates.tmp.npy')
+        np.save(tmp_file, dates)
+        os.replace(tmp_file, os.path.join(store_dir, 'dates.npy'))
+        tmp_file = os.path.join(store_dir, 'metadata.tmp.json')
+        with open(tmp_file, 'w') as out_file:
+            json.dump(metadata, out_file, indent=2)
+        os.replace(tmp_file, metadata_file)
+
+        return cls(store_dir)
+
+    def date_index(self, last_sample_date: date) -> int:
+        """ Index of the last match date on or before last_sample_date, -1 if there is none."""
+        return int(np.searchsorted(self.dates, np.datetime64(last_sample_date, 'D'), side='right')) - 1
+
+    def window_index(self, n_samples: int) -> int:
+        window = self.window_indexes.get(n_samples)
+        if window is None:
+            raise KeyError('n_samples %s not in the feature store, it has %s' % (n_samples, self.windows))
+        return window
+
+    def n_sample_stats_for_teams(self, teams: [str], n_samples: int, last_sample_date: date,
+                                 home_only: bool = None, normalize_by_matches: bool = False) -> [Stats]:
+        """ Equivalent of SeasonMatrix.n_sample_stats_for_teams, read straight from the store. n_samples must be one
+        of the store's windows."""
+        window = self.window_index(n_samples)
+        split = self.SPLITS.index(home_only)
+        on_date = self.date_index(last_sample_date)
+
+        stats_list = []
+        for team in teams:
+            team_id = self.team_ids.id(team)
+            if team_id is None or on_date < 0 or self.totals[on_date, split, window, team_id, 0] == 0:
+                stats_list.append(Stats(team, 0, 0, 0, 0, 0, 0, cover_from=None, cover_to=last_sample_date,
+                                        normalize_by_matches=normalize_by_matches))
+                continue
+
+            stats_list.append(Stats(team, *[int(total) for total in self.totals[on_date, split, window, team_id]],
+                                    cover_from=self.cover_from[on_date, split, window, team_id].astype(date),
+                                    cover_to=last_sample_date, normalize_by_matches=normalize_by_matches))
+        return stats_list
+
+    def n_sample_stats_for_team(self, team: str, n_samples: int, last_sample_date: date,
+                                home_only: bool = None, normalize_by_matches: bool = False) -> Stats:
+        """ Drop in replacement for Stats.n_sample_stats_for_team that does not need a cursor."""
+        return self.n_sample_stats_for_teams(teams=[team], n_samples=n_samples, last_sample_date=last_sample_date,
+                                             home_only=home_only, normalize_by_matches=normalize_by_matches)[0]
+
+    def feature(self, name: str, n_samples: int, home_only: bool = None,
+                normalize_by_matches: bool = False) -> np.ndarray:
+        """ A derived feature for every team on every date, e.g. for building ModelTables without going via Stats.
+
+        :param name: one of FEATURES, points and goal_diff are as for Stats, the rates are the proportion of matches
+         played that were won, drawn or lost.
+        :param normalize_by_matches: as for Stats, applies to points and goal_diff, the rates are always normalised.
+        :return: float64 array of (dates x teams), teams are in the order of self.teams.
+        """
+        totals = self.totals[:, self.SPLITS.index(home_only), self.window_index(n_samples)].astype(np.float64)
+        (played, won, drawn, lost, score_for, score_against) = np.moveaxis(totals, -1, 0)
+
+        if name == 'points':
+            values = 3 * won + drawn
+        elif name == 'goal_diff':
+            values = score_for - score_against
+        elif name in ('won_rate', 'drawn_rate', 'lost_rate'):
+            values = {'won_rate': won, 'drawn_rate': drawn, 'lost_rate': lost}[name]
+            normalize_by_matches = True
+        else:
+            raise KeyError('Unknown feature %s, expected one of %s' % (name, self.FEATURES))
+
+        if normalize_by_matches:
+            values = np.divide(values, played, out=np.zeros_like(values), where=played > 0)
+        return values
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=os.environ.get("LOGLEVEL", "INFO"))
+
+    parser: ArgumentParser = ArgumentParser()
+    parser.description = "Builds, or updates, a feature store of precomputed per team, per date, stats for a results DB"
+    parser.add_argument('-r', '--results-sqlite',
+                        help='Sqlite file containing results, as created by get_results_from_bbc.py',
+                        required=True,
+                        type=str
+                        )
+
+    parser.add_argument('-o', '--out-dir',
+                        help='Directory to hold the feature store, created if need be',
+                        required=True,
+                        type=str
+                        )
+
+    parser.add_argument('-w', '--windows',
+                        help='Comma separated n_samples values to precompute, default 1 to a season\'s worth, '
+                             'up to %i' % FeatureStore.MAX_DEFAULT_WINDOW,
+                        default=None,
+                        type=str
+                        )
+
+    parser.add_argument('-f', '--force',
+                        help='Rebuild from scratch rather than incrementally',
+                        default=False,
+                        action='store_true'
+                        )
+
+    args = parser.parse_args()
+    windows = [int(window) for window in args.windows.split(',')] if args.windows else None
+
+    with sqlite3.connect(args.results_sqlite) as db_conn:
+        FeatureStore.build(db_conn.cursor(), args.out_dir, windows=windows, incremental=not args.force)
@@ -0,0 +1,216 @@
+import functools
+import importlib
+import json
+import logging
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+
+# The hot paths of a backtest, as (module, class, attribute, phase name). Times are inclusive, e.g. a Stats query's
+# time includes constructing the Stats from its results.
+DEFAULT_TARGETS = [
+    ('StatsLib', 'Stats', 'n_sample_stats_for_team', 'Stats.n_sample_stats_for_team'),
+    ('StatsLib', 'Stats', 'windowed_stats_for_team', 'Stats.windowed_stats_for_team'),
+    ('StatsLib', 'Stats', 'n_sample_stats_for_teams', 'Stats.n_sample_stats_for_teams'),
+    ('StatsLib', 'Stats', 'get_windowed_stats_for_teams', 'Stats.get_windowed_stats_for_teams'),
+    ('StatsLib', 'Stats', '__init__', 'Stats.__init__'),
+    ('StatsLib', 'StatsCache', 'n_sample_stats_for_team', 'StatsCache.n_sample_stats_for_team'),
+    ('StatsLib', 'StatsCache', 'windowed_stats_for_team', 'StatsCache.windowed_stats_for_team'),
+    ('FeatureLib', 'Feature', '__new__', 'Feature.__new__'),
+    ('FeatureLib', 'ModelTable', 'create_for_all_teams', 'ModelTable.create_for_all_teams'),
+    ('FeatureLib', 'FootballMatchPredictor', 'predict', 'FootballMatchPredictor.predict'),
+    ('FeatureLib', 'FootballMatchPredictor', 'predict_many', 'FootballMatchPredictor.predict_many'),
+    ('BulkWriterLib', 'BulkWriter', 'flush', 'BulkWriter.flush'),
+]
+
+# Literals in traced SQL are replaced so that the same statement with different bindings is counted as one.
+SQL_LITERAL_REGEX = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+def normalise_sql(sql: str) -> str:
+    return ' '.join(SQL_LITERAL_REGEX.sub('?', sql).split())
+
+
+class Instrumentation(object):
+    """Opt-in timers and counters for the hot paths of a backtest, plus per statement SQL timings.
+
+    Nothing is touched until install(), which wraps each of the targets in a timer, and uninstall() puts them back as
+    they were, so when it isn't installed it costs nothing at all.
+
+    e.g.
+
+        instrumentation = Instrumentation()
+        instrumentation.install()
+        instrumentation.trace_connection(db_connection)
+        ...
+        instrumentation.uninstall()
+        logging.info(instrumentation.format_report())
+        instrumentation.write_json('report.json')
+    """
+
+    def __init__(self, progress_instructions: int = 1000):
+        """
+        :param progress_instructions: number of SQLite virtual machine instructions between progress handler calls,
+         which count each statement's instructions to within this many, smaller is more accurate but slows the queries
+         down more.
+        """
+        self.progress_instructions = progress_instructions
+        self.timers = {}
+        self.counters = {}
+        self.sql = {}
+        self.patches = []
+        self.connections = []
+        self.current_sql = None
+        self.sql_started = None
+        self.started = time.perf_counter()
+
+    # Timers and counters
+
+    def add_time(self, name: str, seconds: float):
+        timer = self.timers.get(name)
+        if timer is None:
+            timer = self.timers[name] = [0, 0.0, 0.0]
+        timer[0] += 1
+        timer[1] += seconds
+        timer[2] = max(timer[2], seconds)
+
+    @contextmanager
+    def timed(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def count(self, name: str, n: int = 1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def timed_fn(self, name: str, fn):
+        """ :return: fn wrapped in a timer."""
+        add_time = self.add_time
+        end_sql = self.end_sql
+
+        @functools.wraps(fn)
+        def timed_wrapper(*args, **kwargs):
+            end_sql()
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                end = time.perf_counter()
+                end_sql()
+                add_time(name, end - start)
+
+        return timed_wrapper
+
+    # Patching the hot paths
+
+    def wrap(self, owner, attribute: str, name: str):
+        """ Replaces owner.attribute, a function, staticmethod or classmethod, with a timed version of itself."""
+        original = owner.__dict__[attribute]
+        if isinstance(original, staticmethod):
+            replacement = staticmethod(self.timed_fn(name, original.__func__))
+        elif isinstance(original, classmethod):
+            replacement = classmethod(self.timed_fn(name, original.__func__))
+        else:
+            replacement = self.timed_fn(name, original)
+
+        setattr(owner, attribute, replacement)
+        self.patches.append((owner, attribute, original))
+
+    def install(self, targets: [(str, str, str, str)] = None):
+        """ :param targets: (module, class, attribute, phase name) to time, by default DEFAULT_TARGETS."""
+        for (module_name, class_name, attribute, name) in (DEFAULT_TARGETS if targets is None else targets):
+            owner = getattr(importlib.import_module(module_name), class_name)
+            self.wrap(owner, attribute, name)
+        logging.debug('Instrumented %i functions' % len(self.patches))
+
+    def uninstall(self):
+        for (owner, attribute, original) in reversed(self.patches):
+            setattr(owner, attribute, original)
+        self.patches = []
+
+        for db_connection in self.connections:
+            self.untrace_connection(db_connection)
+        self.connections = []
+
+    # SQL
+
+    def trace_connection(self, db_connection: sqlite3.Connection):
+        """ Times and counts every statement run on the connection.
+
+        The trace callback marks the start of each statement, which is timed until the next statement starts, or an
+        instrumented function is called or returns, e.g. Stats.__init__ with the rows the statement fetched. So the
+        times include fetching the rows into Python, and whatever is done with them before then. The progress handler,
+        which SQLite calls every progress_instructions virtual machine instructions, gives an approximate instruction
+        count, statements shorter than that count as none.
+        """
+        db_connection.set_trace_callback(self.trace_sql)
+        db_connection.set_progress_handler(self.sql_progress, self.progress_instructions)
+        self.connections.append(db_connection)
+
+    def untrace_connection(self, db_connection: sqlite3.Connection):
+        try:
+            db_connection.set_trace_callback(None)
+            db_connection.set_progress_handler(None, self.progress_instructions)
+        except sqlite3.ProgrammingError:
+            pass  # Already closed, so there's nothing to remove them from.
+
+    def trace_sql(self, sql: str):
+        now = time.perf_counter()
+        self.end_sql(now)
+        self.current_sql = self.sql.get(sql)
+        if self.current_sql is None:
+            key = normalise_sql(sql)
+            self.current_sql = self.sql.get(key)
+            if self.current_sql is None:
+                self.current_sql = self.sql[key] = [0, 0, 0.0]
+        self.current_sql[0] += 1
+        self.sql_started = now
+
+    def end_sql(self, now: float = None):
+        """ Adds the time since the current statement started to it, if there is one."""
+        if self.current_sql is not None:
+            self.current_sql[2] += (time.perf_counter() if now is None else now) - self.sql_started
+            self.current_sql = None
+
+    def sql_progress(self) -> int:
+        if self.current_sql is not None:
+            self.current_sql[1] += self.progress_instructions
+        return 0  # Carry on
+
+    # Reporting
+
+    def report(self) -> dict:
+        self.end_sql()
+        return {
+            'wall_seconds': time.perf_counter() - self.started,
+            'timers': {name: {'count': count, 'total_seconds': total, 'mean_seconds': total / count,
+                              'max_seconds': longest}
+                       for (name, (count, total, longest)) in sorted(self.timers.items())},
+            'counters': dict(sorted(self.counters.items())),
+            'sql': {sql: {'count': count, 'approx_vm_instructions': instructions, 'seconds': seconds}
+                    for (sql, (count, instructions, seconds)) in
+                    sorted(self.sql.items(), key=lambda item: item[1][2], reverse=True)},
+        }
+
+    def write_json(self, json_file: str):
+        with open(json_file, 'w') as outfile:
+            json.dump(self.report(), outfile, indent=2)
+            outfile.write('\n')
+
+    def format_report(self, max_sql: int = 10) -> str:
+        report = self.report()
+        lines = ['Instrumentation, %.3fs wall' % report['wall_seconds'],
+                 '%-45s %10s %12s %12s' % ('phase', 'count', 'total s', 'mean ms')]
+        for (name, timer) in sorted(report['timers'].items(), key=lambda item: item[1]['total_seconds'],
+                                    reverse=True):
+            lines.append('%-45s %10i %12.4f %12.4f' % (name, timer['count'], timer['total_seconds'],
+                                                       timer['mean_seconds'] * 1e3))
+        for (name, count) in report['counters'].items():
+            lines.append('%-45s %10i' % (name, count))
+        for (sql, stats) in list(report['sql'].items())[:max_sql]:
+            lines.append('%-45s %10i %12.4f %12s' % ('sql ' + sql[:41], stats['count'], stats['seconds'],
+                                                     '~%i vm ops' % stats['approx_vm_instructions']))
+        return '\n'.join(lines)
@@ -0,0 +1,45 @@
+import logging
+import sqlite3
+from bisect import bisect_right
+from datetime import date
+
+SQL_ALL_MANAGERS = '''SELECT team_name, manager_name, appointed FROM managers ORDER BY team_name, appointed, id'''
+
+
+class ManagerLookup(object):
+    """Finds who was managing a team on a given date, from the managers table loaded in one go rather than a query
+    per lookup.
+
+    This is a bit more complicated than might at first be thought because we have to deal with incidences where there
+    is no manager in place, e.g. Watford from 2016-05-30 when Quique departed, to 2016-07-01 when Walter arrived. To do
+    this we bear in mind that we're only really interested in the impact of the manager on the team, so we'll assume
+    that a team will remain largely the same, post manager departure, until the next person arrives. This in turn
+    translates into taking the most recent manager appointed upto, or prior to, the date being checked, which is a
+    binary search of the team's appointment dates.
+    """
+
+    def __init__(self, managers_db_cursor: sqlite3.Cursor):
+        self.appointed_by_team = {}
+        self.managers_by_team = {}
+        for (team_name, manager_name, appointed) in managers_db_cursor.execute(SQL_ALL_MANAGERS).fetchall():
+            self.appointed_by_team.setdefault(team_name, []).append(appointed)
+            self.managers_by_team.setdefault(team_name, []).append(manager_name)
+        logging.debug('Loaded managers for %i teams' % len(self.managers_by_team))
+
+    def get_manager(self, team_name: str, on_date) -> str:
+        """
+        :param team_name: team, as named in the results.
+        :param on_date: date, or ISO date string.
+        :return: name of the team's most recently appointed manager on the date.
+        """
+        on_date = on_date.isoformat() if isinstance(on_date, date) else on_date
+        appointed = self.appointed_by_team.get(team_name, [])
+        i = bisect_right(appointed, on_date)
+        if i == 0:
+            raise KeyError('No manager for %s on %s' % (team_name, on_date))
+        return self.managers_by_team[team_name][i - 1]
+
+    def team_str(self, team_name: str, on_date) -> str:
+        """ :return: team name prefixed by its manager's, as stored in the results when merging managers, e.g.
+         "Arsene Wenger's Arsenal"."""
+        return '%s\'s %s' % (self.get_manager(team_name, on_date), team_name)
@@ -0,0 +1,315 @@
+import csv
+import datetime
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from itertools import islice
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from ActualResultsLib import ActualResults
+from ExperimentLib import connect_read_only
+from FeatureLib import FootballMatchPredictor, ModelTable
+from StatsLib import Stats
+
+# Maximum number of samples to use when calculating models, lets go for two years worth
+# 19 *
+MAX_SAMPLES = 19 * 2 * 2
+
+
+def parse_matches(matches_str: str) -> [(str, str)]:
+    """ :param matches_str: matches in the form 'home team 1-away team 1, home team 2-away team 2, ...'
+    :return: list of (home_team, away_team) tuples.
+    :raises ValueError: for any match that isn't exactly two team names separated by a '-'."""
+    # Remove preceeding white space around match and team separators and create a list of match tuples
+    # to iterate over later.
+    matches_cleaned_up_str = re.sub(r'\s*-\s*', '-', re.sub(r'\s*,\s*', ',', matches_str.strip()))
+    matches = []
+    for match_pair in matches_cleaned_up_str.split(','):
+        teams = tuple(match_pair.split('-'))
+        if len(teams) != 2 or '' in teams:
+            raise ValueError("Bad match '%s', expected home team-away team" % match_pair)
+        matches.append(teams)
+    return matches
+
+
+def read_fixtures(lines, fixtures_format: str = 'csv'):
+    """ Streams fixtures from a file, or stdin, one per line.
+
+    :param lines: e.g. an open file.
+    :param fixtures_format: 'csv', home_team,away_team with an optional header of exactly that, or 'jsonl', either
+     {"home_team": ..., "away_team": ...} or [home_team, away_team].
+    :return: generator of (home_team, away_team) tuples.
+    :raises ValueError: for an unknown format, or any line that isn't exactly two team names, naming the line.
+    """
+    if fixtures_format == 'csv':
+        csv_reader = csv.reader(lines)
+        for row in csv_reader:
+            if len(row) == 0 or [column.strip() for column in row] == ['home_team', 'away_team']:
+                continue
+            fixture = tuple(column.strip() for column in row)
+            if len(fixture) != 2 or '' in fixture:
+                raise ValueError("Bad fixture on line %i '%s', expected home_team,away_team" %
+                                 (csv_reader.line_num, ','.join(row)))
+            yield fixture
+    elif fixtures_format == 'jsonl':
+        for (line_number, line) in enumerate(lines, start=1):
+            if len(line.strip()) == 0:
+                continue
+            try:
+                fixture = json.loads(line)
+            except ValueError as e:
+                raise ValueError('Bad fixture on line %i, %s' % (line_number, e))
+            if isinstance(fixture, dict):
+                fixture = (fixture.get('home_team'), fixture.get('away_team'))
+            if not isinstance(fixture, (list, tuple)) or len(fixture) != 2 or \
+                    not all(isinstance(team, str) and len(team) > 0 for team in fixture):
+                raise ValueError('Bad fixture on line %i %s, expected {"home_team": ..., "away_team": ...} or '
+                                 '[home_team, away_team]' % (line_number, line.strip()))
+            yield fixture[0], fixture[1]
+    else:
+        raise ValueError('Unknown fixtures format %s' % fixtures_format)
+
+
+def batches(iterable, batch_size: int):
+    """ :return: generator of lists of up to batch_size items from iterable."""
+    iterator = iter(iterable)
+    batch = list(islice(iterator, batch_size))
+    while len(batch) > 0:
+        yield batch
+        batch = list(islice(iterator, batch_size))
+
+
+class PredictionWriter(object):
+    """Writes predictions, as returned by predictions_to_dicts(), to a file as they are made.
+
+    Formats are 'text', the same as predictOmatic.py prints, 'csv', with a header, and 'jsonl'.
+    """
+
+    FIELDS = ['home_team', 'away_team', 'predicted_result', 'distance', 'bad_data_explanation']
+
+    def __init__(self, out_file, output_format: str = 'text'):
+        if output_format not in ('text', 'csv', 'jsonl'):
+            raise ValueError('Unknown output format %s' % output_format)
+        self.out_file = out_file
+        self.output_format = output_format
+        self.csv_writer = None
+        if output_format == 'csv':
+            self.csv_writer = csv.DictWriter(out_file, fieldnames=PredictionWriter.FIELDS)
+            self.csv_writer.writeheader()
+
+    def write(self, predictions: [dict]):
+        for prediction in predictions:
+            if self.output_format == 'csv':
+                self.csv_writer.writerow(prediction)
+            elif self.output_format == 'jsonl':
+                self.out_file.write(json.dumps(prediction) + '\n')
+            else:
+                self.out_file.write('Predicted results for %s vs %s is a %s with distance  %f\n' %
+                                    (prediction['home_team'], prediction['away_team'],
+                                     prediction['predicted_result'], prediction['distance']))
+        self.out_file.flush()
+
+
+def create_goal_diff_models(db_cursor: sqlite3.Cursor, teams: [str], use_data_upto_date: datetime.date,
+                            n_samples: int = MAX_SAMPLES) -> ModelTable:
+    """ Separate Home and Away Goal Difference models for each of the teams, i.e. [home goal diff, away goal diff].
+
+    :raises KeyError: if any of the teams are not in the results, the same as predicting for them with models of every
+     team in the results does, rather than giving them empty models.
+    """
+    known_teams = set(ActualResults.get_teams(db_cursor))
+    unknown_teams = [team for team in teams if team not in known_teams]
+    if len(unknown_teams) > 0:
+        raise KeyError('No model for %s' % unknown_teams)
+
+    # Fetch the stats for all of the teams in one go, one query for the home matches and one for the away.
+    teams_stats_home = Stats.n_sample_stats_for_teams(cursor=db_cursor,
+                                                      teams=list(teams),
+                                                      last_sample_date=use_data_upto_date,
+                                                      n_samples=n_samples,
+                                                      home_only=True,
+                                                      normalize_by_matches=True)
+
+    teams_stats_away = Stats.n_sample_stats_for_teams(cursor=db_cursor,
+                                                      teams=list(teams),
+                                                      last_sample_date=use_data_upto_date,
+                                                      n_samples=n_samples,
+                                                      home_only=False,
+                                                      normalize_by_matches=True)
+
+    return ModelTable(ids=[team_stat_home.team_name for team_stat_home in teams_stats_home],
+                      features=[[team_stat_home.goal_diff, team_stat_away.goal_diff]
+                                for (team_stat_home, team_stat_away) in zip(teams_stats_home, teams_stats_away)])
+
+
+def predictions_to_dicts(predictions) -> [dict]:
+    """ Predictions, as returned by FootballMatchPredictor.predict_many(), as plain dicts, e.g. for JSON."""
+    return [{'home_team': prediction['home_team'],
+             'away_team': prediction['away_team'],
+             'predicted_result': str(prediction['predicted_result']),
+             'distance': float(prediction['distance']),
+             'bad_data_explanation': prediction['bad_data_explanation']} for prediction in predictions]
+
+
+class WarmModels(object):
+    """Models for every team in a results DB, built once and kept in memory, then only rebuilt when the results change
+    or the day rolls over.
+
+    Changes are spotted by PRAGMA data_version, which changes whenever another connection commits to the DB, and by the
+    file's inode and modification time, in case the DB is replaced outright, e.g. by a fresh scrape.
+
+    Safe to share between threads, e.g. created in one and used by a server in another, requests are answered one at a
+    time.
+    """
+
+    def __init__(self, results_db_file: str, n_samples: int = MAX_SAMPLES):
+        self.results_db_file = results_db_file
+        self.n_samples = n_samples
+        self.db_connection = None
+        self.file_version = None
+        self.data_version = None
+        self.use_data_upto_date = None
+        self.models = None
+        self.predictor = None
+        self.lock = threading.RLock()
+        self.refresh()
+
+    def get_file_version(self) -> (int, int):
+        stat = os.stat(self.results_db_file)
+        return stat.st_ino, stat.st_mtime_ns
+
+    def get_data_version(self) -> int:
+        return self.db_connection.execute('PRAGMA data_version').fetchone()[0]
+
+    def refresh(self):
+        with self.lock:
+            self.build()
+
+    def build(self):
+        file_version = self.get_file_version()
+        if self.db_connection is None or file_version[0] != self.file_version[0]:
+            if self.db_connection is not None:
+                self.db_connection.close()
+            self.db_connection = connect_read_only(self.results_db_file, check_same_thread=False)
+
+        # Only noted once the models are built, so that if that fails it's tried again.
+        data_version = self.get_data_version()
+        use_data_upto_date = datetime.datetime.today().date()
+
+        db_cursor = self.db_connection.cursor()
+        self.models = create_goal_diff_models(db_cursor=db_cursor, teams=ActualResults.get_teams(db_cursor),
+                                              use_data_upto_date=use_data_upto_date, n_samples=self.n_samples)
+        self.predictor = FootballMatchPredictor(models=self.models)
+        (self.file_version, self.data_version, self.use_data_upto_date) = (file_version, data_version,
+                                                                           use_data_upto_date)
+        logging.info('Built models for %i teams from %s' % (len(self.models), self.results_db_file))
+
+    def refresh_if_changed(self) -> bool:
+        """ :return: True if the models had to be rebuilt. If the DB can't be read, e.g. for the moment that a fresh
+        scrape is replacing it, the current models are kept and it's tried again next time."""
+        with self.lock:
+            try:
+                if self.get_file_version() == self.file_version and self.get_data_version() == self.data_version and \
+                        datetime.datetime.today().date() == self.use_data_upto_date:
+                    return False
+
+                self.build()
+                return True
+            except (OSError, sqlite3.Error) as e:
+                logging.warning('Keeping the current models, unable to read %s, %s' % (self.results_db_file, e))
+                return False
+
+    def predict(self, fixtures: [(str, str)]) -> [dict]:
+        """ :raises KeyError: if any of the teams are not in the results."""
+        with self.lock:
+            self.refresh_if_changed()
+            return predictions_to_dicts(self.predictor.predict_many(fixtures=fixtures))
+
+    def predict_stream(self, fixtures, batch_size: int = 1000):
+        """ Predictions for any number of fixtures, e.g. from read_fixtures(), a batch at a time so that only one batch
+        is ever held in memory.
+
+        :return: generator of lists of predictions, one list per batch, in the same order as the fixtures.
+        """
+        for batch in batches(fixtures, batch_size):
+            yield self.predict(batch)
+
+    def close(self):
+        with self.lock:
+            self.db_connection.close()
+
+
+class PredictionRequestHandler(BaseHTTPRequestHandler):
+    """Answers:
+
+        GET /predict?matches=home team 1-away team 1, home team 2-away team 2
+        POST /predict with a JSON body of {"fixtures": [["home team 1", "away team 1"], ...]}
+        GET /health
+
+    with JSON, predictions are {"predictions": [{"home_team": ..., "away_team": ..., "predicted_result": ...,
+    "distance": ..., "bad_data_explanation": ...}, ...]}, in the same order as the fixtures.
+    """
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/health':
+            warm_models = self.server.warm_models
+            self.send_json(200, {'teams': len(warm_models.models),
+                                 'use_data_upto_date': warm_models.use_data_upto_date.isoformat()})
+        elif url.path == '/predict':
+            matches = parse_qs(url.query).get('matches')
+            if matches is None:
+                self.send_json(400, {'error': 'No matches given'})
+                return
+            try:
+                fixtures = [fixture for matches_str in matches for fixture in parse_matches(matches_str)]
+            except ValueError as e:
+                self.send_json(400, {'error': str(e)})
+                return
+            self.send_predictions(fixtures)
+        else:
+            self.send_json(404, {'error': 'Unknown path %s' % url.path})
+
+    def do_POST(self):
+        if urlparse(self.path).path != '/predict':
+            self.send_json(404, {'error': 'Unknown path %s' % self.path})
+            return
+
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            fixtures = [(fixture[0], fixture[1]) for fixture in body['fixtures']]
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            self.send_json(400, {'error': 'Bad request, %s' % e})
+            return
+        self.send_predictions(fixtures)
+
+    def send_predictions(self, fixtures: [(str, str)]):
+        try:
+            predictions = self.server.warm_models.predict(fixtures)
+        except KeyError as e:
+            self.send_json(400, {'error': str(e.args[0])})
+            return
+        self.send_json(200, {'predictions': predictions})
+
+    def send_json(self, status: int, body: dict):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logging.debug('%s %s' % (self.address_string(), format % args))
+
+
+def make_server(warm_models: WarmModels, host: str = '127.0.0.1', port: int = 8017) -> HTTPServer:
+    """ HTTP server answering predictions from the warm models, see PredictionRequestHandler, call serve_forever() to
+    run it. Port 0 picks a free port, see server_address."""
+    server = HTTPServer((host, port), PredictionRequestHandler)
+    server.warm_models = warm_models
+    return server
@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+
+import logging
+import os
+import re
+import sqlite3
+import sys
+from argparse import ArgumentParser
+from datetime import date, timedelta
+
+SQL_CREATE_RESULTS_TABLE = \
+    """
+    CREATE TABLE IF NOT EXISTS results (
+      id INTEGER PRIMARY KEY,
+      date TEXT NOT NULL,
+      home_team  TEXT NOT NULL,
+      home_score INTEGER NOT NULL,
+      away_team TEXT NOT NULL,
+      away_score INTEGER NOT NULL
+    )
+    """
+
+# Covering indexes for the results table. Every StatsLib query filters by date and home_team or away_team, so each
+# side gets its own (team, date) index, and ActualResultsLib's reads in date order get one of their own. The remaining
+# columns are tacked on the end so that the queries can be answered from the index alone.
+SQL_CREATE_INDEXES = [
+    """
+    CREATE INDEX IF NOT EXISTS results_home_team_date
+      ON results (home_team, date, home_score, away_team, away_score)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS results_away_team_date
+      ON results (away_team, date, home_score, home_team, away_score)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS results_date
+      ON results (date, home_team, home_score, away_team, away_score)
+    """
+]
+
+# A match is identified by its date and teams, which the scraper upserts on, see BbcResultsLib.SQL_UPSERT. Any duplicates
+# from before there was a key have to be dealt with first, see ensure_natural_key().
+SQL_COUNT_DUPLICATE_RESULTS = \
+    """
+    SELECT COALESCE(SUM(num_results - 1), 0) FROM (
+      SELECT COUNT(*) AS num_results FROM results GROUP BY date, home_team, away_team HAVING COUNT(*) > 1
+    )
+    """
+
+# Keeps the most recently added of each set of duplicates.
+SQL_DELETE_DUPLICATE_RESULTS = \
+    """
+    DELETE FROM results WHERE id NOT IN (
+      SELECT MAX(id) FROM results GROUP BY date, home_team, away_team
+    )
+    """
+
+SQL_CREATE_NATURAL_KEY = \
+    """
+    CREATE UNIQUE INDEX IF NOT EXISTS results_natural_key
+      ON results (date, home_team, away_team)
+    """
+
+SQL_NATURAL_KEY_EXISTS = "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'results_natural_key'"
+
+# EXPLAIN QUERY PLAN detail for a full scan of the results table, older versions of SQLite include 'TABLE'.
+FULL_TABLE_SCAN_REGEX = re.compile(r'^SCAN (TABLE )?results( AS \w+)?$')
+
+
+def ensure_indexes(db_cursor: sqlite3.Cursor):
+    for sql in SQL_CREATE_INDEXES:
+        logging.debug(sql)
+        db_cursor.execute(sql)
+
+
+def ensure_natural_key(db_cursor: sqlite3.Cursor, dedupe: bool = False):
+    """ Adds the unique (date, home_team, away_team) index to results if it isn't already there.
+
+    :param dedupe: delete any duplicate results, all but the most recently added of each, so that the index can be
+     added. Otherwise duplicates raise a ValueError and nothing is changed.
+    """
+    if db_cursor.execute(SQL_NATURAL_KEY_EXISTS).fetchone() is not None:
+        return
+
+    num_duplicates = db_cursor.execute(SQL_COUNT_DUPLICATE_RESULTS).fetchone()[0]
+    if num_duplicates > 0:
+        if not dedupe:
+            raise ValueError('%i duplicate results, with the same date and teams as an earlier one, cannot add the '
+                             'natural key without deleting them, e.g. with --dedupe' % num_duplicates)
+        db_cursor.execute(SQL_DELETE_DUPLICATE_RESULTS)
+        logging.warning('Deleted %i duplicate results' % db_cursor.rowcount)
+    logging.debug(SQL_CREATE_NATURAL_KEY)
+    db_cursor.execute(SQL_CREATE_NATURAL_KEY)
+
+
+class QueryRecordingCursor(object):
+    """Wraps a cursor and records the SQL and bindings of everything executed through it, which is then used to find
+    out exactly what the libraries ask of the database."""
+
+    def __init__(self, db_cursor: sqlite3.Cursor):
+        self.cursor = db_cursor
+        self.queries = []
+
+    def execute(self, sql: str, parameters=()):
+        self.queries.append((sql, parameters))
+        return self.cursor.execute(sql, parameters)
+
+
+def record_library_queries(db_cursor: sqlite3.Cursor) -> [(str, dict)]:
+    """ Exercises each of the query paths in StatsLib and ActualResultsLib against the database and returns the
+    queries that were made, de-duplicated."""
+
+    # Only needed for checking, so don't make ensure_indexes() users pay for importing these.
+    from ActualResultsLib import ActualResults
+    from SeasonMatrixLib import SeasonMatrix
+    from StatsLib import Stats, RollingTeamStats
+
+    recording_cursor = QueryRecordingCursor(db_cursor)
+
+    teams = ActualResults.get_teams(recording_cursor)
+    dates = ActualResults.get_dates(recording_cursor)
+    team = teams[0] if len(teams) > 0 else 'Nobody'
+    on_date = dates[len(dates) // 2] if len(dates) > 0 else date.today()
+
+    ActualResults.get_results_data(recording_cursor)
+    ActualResults.get_results_data(recording_cursor, win_end=on_date)
+    ActualResults.get_results_data(recording_cursor, win_end=on_date, win_size=timedelta(days=7))
+
+    for home_only in (None, True, False):
+        Stats.windowed_stats_for_team(cursor=recording_cursor, team=team, win_weeks=2, win_end_date=on_date,
+                                      home_only=home_only)
+        Stats.n_sample_stats_for_team(cursor=recording_cursor, team=team, n_samples=2, last_sample_date=on_date,
+                                      home_only=home_only)
+        Stats.get_windowed_stats_for_teams(cursor=recording_cursor, teams=teams, win_size=2, win_end_date=on_date,
+                                           home_only=home_only)
+        Stats.n_sample_stats_for_teams(cursor=recording_cursor, teams=teams, n_samples=2, last_sample_date=on_date,
+                                       home_only=home_only)
+
+    SeasonMatrix(recording_cursor)
+    RollingTeamStats(cursor=recording_cursor, n_samples=2)
+
+    unique_queries = {}
+    for (sql, parameters) in recording_cursor.queries:
+        unique_queries.setdefault(sql, parameters)
+    return list(unique_queries.items())
+
+
+def check_query_plans(db_cursor: sqlite3.Cursor) -> [(str, str)]:
+    """ Runs EXPLAIN QUERY PLAN over every query the libraries make.
+
+    :return: list of (sql, plan detail) for each query whose plan includes a full scan of the results table, an empty
+    list means all is well.
+    """
+    full_scans = []
+    for (sql, parameters) in record_library_queries(db_cursor):
+        for plan_row in db_cursor.execute('EXPLAIN QUERY PLAN %s' % sql, parameters).fetchall():
+            detail = plan_row[3]
+            logging.debug('%s: %s' % (' '.join(sql.split()), detail))
+            if FULL_TABLE_SCAN_REGEX.match(detail):
+                full_scans.append((sql, detail))
+    return full_scans
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=os.environ.get("LOGLEVEL", "INFO"))
+
+    parser: ArgumentParser = ArgumentParser()
+    parser.description = "Creates the indexes for a results DB and optionally checks that the " \
+                         "libraries' queries use the indexes"
+    parser.add_argument('-r', '--results-sqlite',
+                        help='Sqlite file containing results, as created by get_results_from_bbc.py',
+                        required=True,
+                        type=str
+                        )
+
+    parser.add_argument('-c', '--check',
+                        help='Fail if any query in StatsLib or ActualResultsLib does a full scan of the results table',
+                        default=False,
+                        action='store_true'
+                        )
+
+    parser.add_argument('-n', '--no-create',
+                        help='Do not create any missing indexes, e.g. to check an existing DB as is',
+                        default=False,
+                        action='store_true'
+                        )
+
+    parser.add_argument('--dedupe',
+                        help='Delete duplicate results, keeping the most recently added, so that the natural key can '
+                             'be added, default is to fail if there are any',
+                        default=False,
+                        action='store_true'
+                        )
+
+    args = parser.parse_args()
+
+    with sqlite3.connect(args.results_sqlite) as db_conn:
+        db_conn.row_factory = sqlite3.Row
+        db_cursor = db_conn.cursor()
+
+        if not args.no_create:
+            ensure_indexes(db_cursor)
+            try:
+                ensure_natural_key(db_cursor, dedupe=args.dedupe)
+            except ValueError as error:
+                logging.error(error)
+                sys.exit(1)
+
+        if args.check:
+            full_scans = check_query_plans(db_cursor)
+            for (sql, detail) in full_scans:
+                logging.error('Full table scan, %s, in query %s' % (detail, ' '.join(sql.split())))
+
+            sys.exit(1 if len(full_scans) > 0 else 0)
@@ -0,0 +1,220 @@
+import sqlite3
+from datetime import date, timedelta
+
+import numpy as np
+
+from FeatureLib import FeatureModelRanking
+from StatsLib import Stats
+from TeamIdsLib import TeamIds
+
+SQL_LOAD_RESULTS = \
+    """
+    SELECT
+      date,
+      home_team,
+      home_score,
+      away_team,
+      away_score
+    FROM results
+    ORDER BY date
+      ASC
+    """
+
+
+class SeasonMatrix(object):
+    """In memory, array backed, alternative to the per team SQL queries in Stats.
+
+    The results table is read once and held as NumPy arrays of (teams x matches), with matches in ascending date order.
+    Questions such as 'last N samples before date D for team T' are then answered for all of the teams at once with
+    vectorised operations and without going back to the database.
+    """
+
+    def __init__(self, cursor: sqlite3.Cursor):
+        rows = cursor.execute(SQL_LOAD_RESULTS).fetchall()
+
+        home_teams = [row[1] for row in rows]
+        away_teams = [row[3] for row in rows]
+
+        # Everything from here on works on team ids, names are only used again when the Stats are created.
+        self.teams: [str] = sorted(set(home_teams) | set(away_teams))
+        self.team_ids = TeamIds(self.teams)
+
+        self.dates = np.array([row[0] for row in rows], dtype='datetime64[D]')
+        self.home_ids = self.team_ids.ids(home_teams)
+        self.away_ids = self.team_ids.ids(away_teams)
+        self.home_scores = np.array([row[2] for row in rows], dtype=np.int64)
+        self.away_scores = np.array([row[4] for row in rows], dtype=np.int64)
+
+        # Participation masks, one row per team, one column per match.
+        team_axis = np.arange(len(self.teams))[:, np.newaxis]
+        self.home_mask = self.home_ids[np.newaxis, :] == team_axis
+        self.away_mask = self.away_ids[np.newaxis, :] == team_axis
+        self.played_mask = self.home_mask | self.away_mask
+
+        # Match outcomes from the point of view of the team in each row. Only meaningful where the team played.
+        home_won = self.home_scores > self.away_scores
+        home_lost = self.home_scores < self.away_scores
+        self.won = (self.home_mask & home_won) | (self.away_mask & home_lost)
+        self.drawn = self.played_mask & (self.home_scores == self.away_scores)
+        self.lost = (self.home_mask & home_lost) | (self.away_mask & home_won)
+        self.score_for = np.where(self.home_mask, self.home_scores, self.away_scores)
+        self.score_against = np.where(self.home_mask, self.away_scores, self.home_scores)
+
+    def split_mask(self, home_only: bool = None) -> np.ndarray:
+        if home_only is True:
+            return self.home_mask
+        elif home_only is False:
+            return self.away_mask
+        return self.played_mask
+
+    def n_sample_stats_for_teams(self, teams: [str], n_samples: int, last_sample_date: date,
+                                 home_only: bool = None, normalize_by_matches: bool = False) -> [Stats]:
+        """ Vectorised equivalent of calling Stats.n_sample_stats_for_team for each of the teams.
+
+        :param teams: names of the teams to return stats for, teams that are not in the results get empty stats.
+        :param n_samples: maximum number of the most recent matches to use, as with SQL's LIMIT negative means all.
+        :param last_sample_date: include matches up to and including this date.
+        :param home_only: True home matches only, False away matches only, None for both.
+        :param normalize_by_matches: passed through to the Stats objects.
+        :return: list of Stats, in the same order as teams.
+        """
+        known = [team in self.team_ids for team in teams]
+        team_ids = self.team_ids.ids([team for team, is_known in zip(teams, known) if is_known])
+
+        # Matches are in date order, so everything up to the last sample date is just a leading slice.
+        num_upto = int(np.searchsorted(self.dates, np.datetime64(last_sample_date, 'D'), side='right'))
+        mask = self.split_mask(home_only)[team_ids, :num_upto]
+
+        # Count each team's matches backwards from the last sample date and keep the most recent n_samples of them.
+        samples_from_end = np.cumsum(mask[:, ::-1], axis=1)[:, ::-1]
+        selected = mask & (samples_from_end <= n_samples) if n_samples >= 0 else mask
+
+        played = selected.sum(axis=1)
+        won = (selected & self.won[team_ids, :num_upto]).sum(axis=1)
+        drawn = (selected & self.drawn[team_ids, :num_upto]).sum(axis=1)
+        lost = (selected & self.lost[team_ids, :num_upto]).sum(axis=1)
+        score_for = np.where(selected, self.score_for[team_ids, :num_upto], 0).sum(axis=1)
+        score_against = np.where(selected, self.score_against[team_ids, :num_upto], 0).sum(axis=1)
+        # argmax of an empty row raises, so if the last sample date is before the first match there is nothing to look
+        # for. Teams with no selected matches are given empty stats below and their first_match is never used.
+        first_match = selected.argmax(axis=1) if selected.shape[1] > 0 else np.zeros(len(team_ids), dtype=np.intp)
+
+        stats_list = []
+        rows = iter(range(len(team_ids)))
+        for team, is_known in zip(teams, known):
+            row = next(rows) if is_known else None
+            if row is None or played[row] == 0:
+                # Same as the SQL version, no data means no stats and nothing to cover from.
+                stats_list.append(Stats(team, 0, 0, 0, 0, 0, 0, cover_from=None, cover_to=last_sample_date,
+                                        normalize_by_matches=normalize_by_matches))
+                continue
+
+            stats_list.append(Stats(team, int(played[row]), int(won[row]), int(drawn[row]), int(lost[row]),
+                                    int(score_for[row]), int(score_against[row]),
+                                    cover_from=self.dates[first_match[row]].astype(date),
+                                    cover_to=last_sample_date, normalize_by_matches=normalize_by_matches))
+
+        return stats_list
+
+    def n_sample_stats_for_team(self, team: str, n_samples: int, last_sample_date: date,
+                                home_only: bool = None, normalize_by_matches: bool = False) -> Stats:
+        """ Drop in replacement for Stats.n_sample_stats_for_team that does not need a cursor."""
+        return self.n_sample_stats_for_teams(teams=[team], n_samples=n_samples, last_sample_date=last_sample_date,
+                                             home_only=home_only, normalize_by_matches=normalize_by_matches)[0]
+
+
+class CumulativeStatsIndex(object):
+    """Running totals of each team's played, won, drawn, lost, for and against, indexed by match date.
+
+    One table is held for each of the combined, home only and away only splits. Each is of shape
+    (teams x match dates + 1 x fields), where entry [t, k] is the team's totals over the first k match dates. Stats
+    for any window of dates then only take two lookups and a subtraction.
+    """
+    FIELDS = ('played', 'won', 'drawn', 'lost', 'score_for', 'score_against')
+
+    def __init__(self, season_matrix: SeasonMatrix):
+        self.teams = season_matrix.teams
+        self.team_ids = season_matrix.team_ids
+
+        self.dates, date_ids = np.unique(season_matrix.dates, return_inverse=True)
+
+        # Each match as a row of fields for the home team and one for the away team, rather than going via the (teams x
+        # matches) masks, so that nothing bigger than the tables themselves is ever made.
+        home_won = season_matrix.home_scores > season_matrix.away_scores
+        home_lost = season_matrix.home_scores < season_matrix.away_scores
+        drawn = season_matrix.home_scores == season_matrix.away_scores
+        played = np.ones(len(date_ids), dtype=np.int64)
+        home_fields = np.stack([played, home_won, drawn, home_lost, season_matrix.home_scores,
+                                season_matrix.away_scores], axis=-1).astype(np.int64)
+        away_fields = np.stack([played, home_lost, drawn, home_won, season_matrix.away_scores,
+                                season_matrix.home_scores], axis=-1).astype(np.int64)
+
+        per_date = {}
+        for (home_only, team_ids, fields) in ((True, season_matrix.home_ids, home_fields),
+                                              (False, season_matrix.away_ids, away_fields)):
+            per_date[home_only] = np.zeros((len(self.teams), len(self.dates) + 1, len(self.FIELDS)), dtype=np.int64)
+            # Fold each match into the column for its date, shifted by one to leave a row of zeros for 'before the
+            # first match date'.
+            np.add.at(per_date[home_only], (team_ids, date_ids + 1), fields)
+
+        self.cumulative = {True: np.cumsum(per_date[True], axis=1), False: np.cumsum(per_date[False], axis=1)}
+        self.cumulative[None] = self.cumulative[True] + self.cumulative[False]
+
+    @classmethod
+    def from_cursor(cls, cursor: sqlite3.Cursor):
+        return cls(SeasonMatrix(cursor))
+
+    def totals_between(self, team_ids: np.ndarray, first_date: date, last_date: date,
+                       home_only: bool = None) -> np.ndarray:
+        """ Totals for each of the teams over matches where first_date <= match date <= last_date, shape (teams x
+        fields)."""
+        start = np.searchsorted(self.dates, np.datetime64(first_date, 'D'), side='left')
+        stop = np.searchsorted(self.dates, np.datetime64(last_date, 'D'), side='right')
+        cumulative = self.cumulative[home_only]
+        return cumulative[team_ids, stop] - cumulative[team_ids, start]
+
+    def windowed_stats_for_teams(self, teams: [str], win_weeks: int, win_end_date: date,
+                                 home_only: bool = None, normalize_by_matches: bool = False) -> [Stats]:
+        """ Equivalent of calling Stats.windowed_stats_for_team for each of the teams, same window semantics."""
+        win_start_date = win_end_date - timedelta(weeks=win_weeks, days=-1)
+
+        team_ids = self.team_ids.ids(teams, default=-1)
+        totals = self.totals_between(team_ids, first_date=win_start_date, last_date=win_end_date,
+                                     home_only=home_only)
+        # Teams that are not in the results have no data at all.
+        totals[team_ids < 0] = 0
+
+        return [Stats(team, *[int(total) for total in team_totals], cover_from=win_start_date, cover_to=win_end_date,
+                      normalize_by_matches=normalize_by_matches) for team, team_totals in zip(teams, totals)]
+
+    def windowed_stats_for_team(self, team: str, win_weeks: int, win_end_date: date,
+                                home_only: bool = None, normalize_by_matches: bool = False) -> Stats:
+        """ Drop in replacement for Stats.windowed_stats_for_team that does not need a cursor."""
+        return self.windowed_stats_for_teams(teams=[team], win_weeks=win_weeks, win_end_date=win_end_date,
+                                             home_only=home_only, normalize_by_matches=normalize_by_matches)[0]
+
+    def league_positions(self, teams: [str], win_weeks: int, win_end_dates: [date],
+                         home_only: bool = None) -> np.ndarray:
+        """ League table places of the teams over the win_weeks up to each of the dates, all in one go, e.g. a season's
+        history of league positions. Ranked on points then goal difference, as Stats.premier_league_ranking_fn, with
+        the same window semantics as windowed_stats_for_teams.
+
+        :return: (dates x teams) places, 1 upwards, teams level on points and goal difference sharing a place.
+        """
+        win_end_dates = np.array(win_end_dates, dtype='datetime64[D]')
+        win_start_dates = win_end_dates - np.timedelta64(7 * win_weeks - 1, 'D')
+        start = np.searchsorted(self.dates, win_start_dates, side='left')
+        stop = np.searchsorted(self.dates, win_end_dates, side='right')
+
+        team_ids = self.team_ids.ids(teams, default=-1)
+        cumulative = self.cumulative[home_only]
+        # (dates x teams x fields)
+        totals = cumulative[team_ids[np.newaxis, :], stop[:, np.newaxis]] - \
+            cumulative[team_ids[np.newaxis, :], start[:, np.newaxis]]
+        totals[:, team_ids < 0] = 0
+
+        (won, drawn, score_for, score_against) = (totals[..., self.FIELDS.index(field)]
+                                                  for field in ('won', 'drawn', 'score_for', 'score_against'))
+        (ranks, _) = FeatureModelRanking.competition_ranks(Stats.calc_premier_league_points(won, drawn),
+                                                           Stats.calc_score_diff(score_for, score_against))
+        return ranks
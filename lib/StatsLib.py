@@ -1,21 +1,25 @@
+import copy
+import hashlib
+import pickle
 import sqlite3
+from collections import deque, namedtuple, OrderedDict
 from datetime import date, timedelta, datetime
 import typing
 
 import logging
 
+from BulkWriterLib import BulkWriter
 from FeatureLib import FeatureModelRanking
-
-# logging.basicConfig(level=logging.DEBUG)
-logging.basicConfig(level=logging.INFO)
+from TeamIdsLib import TeamIds
 
 
 def create_league_using_windowed_stats(cursor: sqlite3.Cursor, teams: [str], win_size: int, win_end_date: date,
                                        stats_ranking_function: typing.Callable, home_only: bool = None,
-                                       normalize_by_matches: bool = False) -> FeatureModelRanking:
+                                       normalize_by_matches: bool = False, stats_index=None) -> FeatureModelRanking:
     stats_list: [Stats] = Stats.get_windowed_stats_for_teams(cursor=cursor, teams=teams, win_size=win_size,
                                                              win_end_date=win_end_date, home_only=home_only,
-                                                             normalize_by_matches=normalize_by_matches)
+                                                             normalize_by_matches=normalize_by_matches,
+                                                             stats_index=stats_index)
 
     return FeatureModelRanking(input_data=stats_list, id_fn=lambda x: x.team_name, feature_making_fn=stats_ranking_function)
 
@@ -23,6 +27,72 @@ def create_league_using_windowed_stats(cursor: sqlite3.Cursor, teams: [str], win
 
 
 class Stats(object):
+    # Unpivots results so that there is one row per team per match, from that team's point of view. Home or away rows
+    # are dropped depending on the include_home and include_away bindings.
+    SQL_TEAM_RESULTS_PARTIAL = \
+        """
+        team_results AS (
+          SELECT
+            date,
+            home_team  AS team,
+            home_score AS scored_for,
+            away_score AS scored_against
+          FROM results
+          WHERE :include_home
+
+          UNION ALL
+
+          SELECT
+            date,
+            away_team  AS team,
+            away_score AS scored_for,
+            home_score AS scored_against
+          FROM results
+          WHERE :include_away
+        )
+        """
+
+    SQL_BATCHED_WINDOWED_STATS = \
+        """
+        WITH %(team_results)s
+        SELECT
+          team,
+          COUNT(date)                       AS played,
+          SUM(scored_for > scored_against)  AS wins,
+          SUM(scored_for = scored_against)  AS draws,
+          SUM(scored_for < scored_against)  AS losses,
+          SUM(scored_for)                   AS for,
+          SUM(scored_against)               AS against
+        FROM team_results
+        WHERE date BETWEEN :start_str AND :stop_str AND team IN (%(team_names)s)
+        GROUP BY team
+        """
+
+    SQL_BATCHED_N_SAMPLE_STATS = \
+        """
+        WITH %(team_results)s,
+        numbered_results AS (
+          SELECT
+            *,
+            ROW_NUMBER() OVER (PARTITION BY team ORDER BY date DESC) AS sample_num
+          FROM team_results
+          WHERE date <= :last_sample_date AND team IN (%(team_names)s)
+        )
+        SELECT
+          team,
+          MIN(date)                         AS first_date,
+          COUNT(date)                       AS played,
+          SUM(scored_for > scored_against)  AS wins,
+          SUM(scored_for = scored_against)  AS draws,
+          SUM(scored_for < scored_against)  AS losses,
+          SUM(scored_for)                   AS for,
+          SUM(scored_against)               AS against
+        FROM numbered_results
+        -- As with LIMIT, a negative number of samples means all of them
+        WHERE sample_num <= :n_samples OR :n_samples < 0
+        GROUP BY team
+        """
+
     def __init__(self, team_name: str, played: int, won: int, drawn: int, lost: int, score_for: int, score_against: int,
                  cover_from: date, cover_to: date, normalize_by_matches: bool = False ):
         self.normalize_points_by_num_matches = normalize_by_matches
@@ -94,16 +164,76 @@ class Stats(object):
 
     @staticmethod
     def get_windowed_stats_for_teams(cursor: sqlite3.Cursor, teams: [str], win_size: int, win_end_date: date,
-                                     home_only: bool = None, normalize_by_matches: bool = False) -> []:
-        stats_list = [Stats.windowed_stats_for_team(cursor=cursor,
-                                                    team=team,
-                                                    win_weeks=win_size,
-                                                    win_end_date=win_end_date,
-                                                    home_only=home_only,
-                                                    normalize_by_matches=normalize_by_matches
-                                                    ) for team in teams]
+                                     home_only: bool = None, normalize_by_matches: bool = False,
+                                     stats_index=None) -> []:
+        # If we've been given a precomputed index, e.g. SeasonMatrixLib's CumulativeStatsIndex, then use that rather
+        # than querying the database at all.
+        if stats_index is not None:
+            return stats_index.windowed_stats_for_teams(teams=teams, win_weeks=win_size, win_end_date=win_end_date,
+                                                        home_only=home_only,
+                                                        normalize_by_matches=normalize_by_matches)
+
+        # Same window semantics as windowed_stats_for_team, but all of the teams are done in a single query.
+        win_start_date = win_end_date - timedelta(weeks=win_size, days=-1)
+
+        sql_bindings = Stats.batched_sql_bindings(teams=teams, home_only=home_only)
+        sql_bindings['start_str'] = win_start_date.isoformat()
+        sql_bindings['stop_str'] = win_end_date.isoformat()
+
+        sql = Stats.SQL_BATCHED_WINDOWED_STATS % {
+            'team_results': Stats.SQL_TEAM_RESULTS_PARTIAL,
+            'team_names': Stats.batched_sql_placeholders(teams)
+        }
+        logging.debug(sql)
+
+        team2sql_out = {row[0]: row[1:] for row in cursor.execute(sql, sql_bindings).fetchall()}
+
+        stats_list = [Stats(team, *team2sql_out.get(team, (0, 0, 0, 0, 0, 0)), cover_from=win_start_date,
+                            cover_to=win_end_date, normalize_by_matches=normalize_by_matches) for team in teams]
+        return stats_list
+
+    @staticmethod
+    def n_sample_stats_for_teams(cursor: sqlite3.Cursor, teams: [str], n_samples: int, last_sample_date: date,
+                                 home_only: bool = None, normalize_by_matches: bool = False) -> []:
+        """ Batched version of n_sample_stats_for_team, rather than two queries per team this makes a single query for
+        all of the teams by numbering each team's matches, most recent first, and keeping the first n_samples.
+        """
+        sql_bindings = Stats.batched_sql_bindings(teams=teams, home_only=home_only)
+        sql_bindings['n_samples'] = n_samples
+        sql_bindings['last_sample_date'] = last_sample_date.isoformat()
+
+        sql = Stats.SQL_BATCHED_N_SAMPLE_STATS % {
+            'team_results': Stats.SQL_TEAM_RESULTS_PARTIAL,
+            'team_names': Stats.batched_sql_placeholders(teams)
+        }
+        logging.debug(sql)
+
+        team2sql_out = {row[0]: row[1:] for row in cursor.execute(sql, sql_bindings).fetchall()}
+
+        stats_list = []
+        for team in teams:
+            if team not in team2sql_out:
+                stats_list.append(Stats(team, 0, 0, 0, 0, 0, 0, cover_from=None, cover_to=last_sample_date,
+                                        normalize_by_matches=normalize_by_matches))
+                continue
+
+            (first_date_str, *sql_out) = team2sql_out[team]
+            first_date = datetime.strptime(first_date_str, '%Y-%m-%d').date()
+            stats_list.append(Stats(team, *sql_out, cover_from=first_date, cover_to=last_sample_date,
+                                    normalize_by_matches=normalize_by_matches))
         return stats_list
 
+    @staticmethod
+    def batched_sql_placeholders(teams: [str]) -> str:
+        return ', '.join(':team_%i' % i for i in range(len(teams)))
+
+    @staticmethod
+    def batched_sql_bindings(teams: [str], home_only: bool = None) -> dict:
+        sql_bindings = {'team_%i' % i: team for i, team in enumerate(teams)}
+        sql_bindings['include_home'] = home_only is not False
+        sql_bindings['include_away'] = home_only is not True
+        return sql_bindings
+
     # noinspection PyDictCreation
     @staticmethod
     def windowed_stats_for_team(cursor: sqlite3.Cursor, team: str, win_weeks: int, win_end_date: date,
@@ -298,3 +428,303 @@ class Stats(object):
         if value == look_for:
             return replace_with
         return value
+
+
+class RollingTeamStats(object):
+    """ Incrementally maintained equivalent of Stats.n_sample_stats_for_team for every team.
+
+    Rather than rebuilding each team's stats from scratch for every date, it is stepped forwards through the match
+    dates with advance_to(). Each newly played match is added to the teams involved, and the match that falls out of
+    their last n_samples is evicted, using a per team ring buffer and running totals.
+
+    n_sample_stats_for_team() advances as need be, so it can be a StatsCache stats_source for experiments that work
+    through the dates in order.
+    """
+
+    SQL_RESULTS_IN_DATE_ORDER = \
+        """
+        SELECT
+          date,
+          home_team,
+          home_score,
+          away_team,
+          away_score
+        FROM results
+        ORDER BY date
+          ASC
+        """
+
+    def __init__(self, cursor: sqlite3.Cursor, n_samples: int, home_only: bool = None,
+                 normalize_by_matches: bool = False):
+        self.n_samples = n_samples
+        self.home_only = home_only
+        self.normalize_by_matches = normalize_by_matches
+        self.last_sample_date = None
+
+        self.results = cursor.execute(RollingTeamStats.SQL_RESULTS_IN_DATE_ORDER).fetchall()
+        self.next_result = 0
+
+        # As with SQL's LIMIT, negative n_samples means use everything
+        max_len = n_samples if n_samples >= 0 else None
+        self.team_ids = TeamIds(sorted({row[1] for row in self.results} | {row[3] for row in self.results}))
+        self.samples = [deque(maxlen=max_len) for _ in self.team_ids]
+        # played, won, drawn, lost, score_for, score_against
+        self.totals = [[0, 0, 0, 0, 0, 0] for _ in self.team_ids]
+
+    def advance_to(self, last_sample_date: date):
+        """ Add all matches played up to and including last_sample_date, dates must not go backwards."""
+        assert self.last_sample_date is None or last_sample_date >= self.last_sample_date, \
+            'Cannot go back in time from %s to %s' % (self.last_sample_date, last_sample_date)
+        self.last_sample_date = last_sample_date
+
+        stop_str = last_sample_date.isoformat()
+        while self.next_result < len(self.results) and self.results[self.next_result][0] <= stop_str:
+            (match_date, home_team, home_score, away_team, away_score) = tuple(self.results[self.next_result])
+            self.next_result += 1
+
+            if self.home_only is not False:
+                self.add_sample(self.team_ids.id(home_team), match_date, home_score, away_score)
+            if self.home_only is not True:
+                self.add_sample(self.team_ids.id(away_team), match_date, away_score, home_score)
+
+        return self
+
+    def add_sample(self, team_id: int, match_date: str, score_for: int, score_against: int):
+        samples = self.samples[team_id]
+        if samples.maxlen == 0:
+            return
+
+        sample = (1, int(score_for > score_against), int(score_for == score_against), int(score_for < score_against),
+                  score_for, score_against)
+
+        totals = self.totals[team_id]
+        if len(samples) == samples.maxlen:
+            # The ring buffer is about to drop its oldest sample, so take it out of the running totals as well.
+            (_, evicted) = samples[0]
+            for i, value in enumerate(evicted):
+                totals[i] -= value
+
+        samples.append((match_date, sample))
+        for i, value in enumerate(sample):
+            totals[i] += value
+
+    def stats_for_team(self, team: str, normalize_by_matches: bool = None) -> Stats:
+        """
+        :param team: name of the team.
+        :param normalize_by_matches: None to use the setting given to the constructor.
+        """
+        if normalize_by_matches is None:
+            normalize_by_matches = self.normalize_by_matches
+
+        team_id = self.team_ids.id(team)
+        samples = self.samples[team_id] if team_id is not None else None
+        if not samples:
+            return Stats(team, 0, 0, 0, 0, 0, 0, cover_from=None, cover_to=self.last_sample_date,
+                         normalize_by_matches=normalize_by_matches)
+
+        first_date = datetime.strptime(samples[0][0], '%Y-%m-%d').date()
+        return Stats(team, *self.totals[team_id], cover_from=first_date, cover_to=self.last_sample_date,
+                     normalize_by_matches=normalize_by_matches)
+
+    def n_sample_stats_for_team(self, team: str, n_samples: int, last_sample_date: date,
+                                home_only: bool = None, normalize_by_matches: bool = False) -> Stats:
+        """ Drop in replacement for Stats.n_sample_stats_for_team, e.g. as a StatsCache stats_source, for experiments
+        that step forwards through the dates. Raises a KeyError for anything it can't answer, i.e. different
+        n_samples or home_only to those it was created with, or an earlier date than it has already advanced to."""
+        if n_samples != self.n_samples or home_only != self.home_only:
+            raise KeyError('Rolling stats are for n_samples %s, home_only %s' % (self.n_samples, self.home_only))
+        if self.last_sample_date is not None and last_sample_date < self.last_sample_date:
+            raise KeyError('Rolling stats have already advanced to %s' % self.last_sample_date)
+
+        self.advance_to(last_sample_date)
+        return self.stats_for_team(team, normalize_by_matches=normalize_by_matches)
+
+
+class StatsCache(object):
+    """ Memoizes Stats, e.g. for experiments that ask for exactly the same stats over and over again with only the way
+    that they are used changing.
+
+    Stats are keyed by the full set of arguments along with a fingerprint of the contents of the results table, so that
+    a changed results DB doesn't give stale answers. PRAGMA data_version, and the connection's own total_changes, are
+    checked on every miss, and whenever refingerprint_if_changed() is called, and the fingerprint is retaken if either
+    has moved. Hits are not checked, that would cost a query each, so anything that changes the results part way
+    through should call refingerprint_if_changed(), e.g. once per match date. Recently used Stats are kept in memory, in
+    a bounded LRU. Optionally they are also kept in an sqlite file, which persists between runs and can be shared
+    between results DBs, close() must be called for the last of them to be written to it.
+
+    Misses are looked up with the Stats static methods using the cursor, unless a stats_source is given in which case
+    its methods of the same name are used, e.g. a SeasonMatrix, CumulativeStatsIndex, FeatureStore or
+    RollingTeamStats. Anything the source can't answer, i.e. raises a KeyError for, is looked up with the Stats static
+    methods instead. A source is a snapshot of the results, so it is dropped if the results change, until rebind() is
+    given a fresh one.
+    """
+
+    CacheInfo = namedtuple('CacheInfo', ['hits', 'persistent_hits', 'misses', 'maxsize', 'currsize'])
+
+    SQL_RESULTS_FOR_FINGERPRINT = \
+        """
+        SELECT
+          date,
+          home_team,
+          home_score,
+          away_team,
+          away_score
+        FROM results
+        ORDER BY date
+          ASC, home_team
+            ASC
+        """
+
+    SQL_CREATE_PERSISTENT_CACHE = \
+        """
+        CREATE TABLE IF NOT EXISTS stats_cache (
+          key TEXT PRIMARY KEY,
+          stats BLOB NOT NULL
+        )
+        """
+
+    SQL_SELECT_PERSISTENT_STATS = '''SELECT stats FROM stats_cache WHERE key = ?'''
+
+    SQL_INSERT_PERSISTENT_STATS = '''INSERT OR REPLACE INTO stats_cache(key, stats) VALUES (?, ?)'''
+
+    def __init__(self, cursor: sqlite3.Cursor, stats_source=None, maxsize: int = 65536, persistent_file: str = None):
+        """
+        :param cursor: for the results DB.
+        :param stats_source: optional alternative to the Stats static methods for looking up misses.
+        :param maxsize: maximum number of Stats to hold in memory.
+        :param persistent_file: optional sqlite file for the on-disk tier, created if need be.
+        """
+        self.maxsize = maxsize
+        self.memory = OrderedDict()
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+
+        self.persistent_connection = None
+        self.persistent_writer = None
+        if persistent_file is not None:
+            self.persistent_connection = sqlite3.connect(persistent_file)
+            self.persistent_connection.execute(StatsCache.SQL_CREATE_PERSISTENT_CACHE)
+            # Committed with every batch, so at most a batch is lost if close() isn't called.
+            self.persistent_writer = BulkWriter(self.persistent_connection, StatsCache.SQL_INSERT_PERSISTENT_STATS,
+                                                batch_size=1000, commit_every=1000)
+        # Stats still in the writer's buffer, {key: Stats}, so that they can be found before they're written.
+        self.persistent_pending = {}
+
+        self.rebind(cursor, stats_source=stats_source)
+
+    def rebind(self, cursor: sqlite3.Cursor, stats_source=None):
+        """ Switch to a different cursor, or source, e.g. after reconnecting to the results DB. Cached Stats are kept
+        but are only used again if the results fingerprint is unchanged."""
+        self.cursor = cursor
+        self.stats_source = stats_source
+        self.results_version = StatsCache.get_results_version(cursor)
+        self.fingerprint = StatsCache.results_fingerprint(cursor)
+
+    @staticmethod
+    def get_results_version(cursor: sqlite3.Cursor) -> (int, int):
+        """ Changes whenever the results DB is committed to by another connection, or changed through this one."""
+        return cursor.connection.execute('PRAGMA data_version').fetchone()[0], cursor.connection.total_changes
+
+    def refingerprint_if_changed(self):
+        """ Retakes the fingerprint if the results might have changed since it was last taken, e.g. call once per
+        match date if the results are being added to part way through."""
+        results_version = StatsCache.get_results_version(self.cursor)
+        if results_version == self.results_version:
+            return
+
+        self.results_version = results_version
+        fingerprint = StatsCache.results_fingerprint(self.cursor)
+        if fingerprint != self.fingerprint and self.stats_source is not None:
+            logging.info('Results have changed, dropping the stats source %s' % type(self.stats_source).__name__)
+            self.stats_source = None
+        self.fingerprint = fingerprint
+
+    @staticmethod
+    def results_fingerprint(cursor: sqlite3.Cursor) -> str:
+        """ Hash of the contents of the results table, independent of the order that rows were added."""
+        digest = hashlib.sha1()
+        for row in cursor.execute(StatsCache.SQL_RESULTS_FOR_FINGERPRINT):
+            digest.update(repr(tuple(row)).encode())
+        return digest.hexdigest()
+
+    def cache_info(self) -> CacheInfo:
+        return StatsCache.CacheInfo(hits=self.hits, persistent_hits=self.persistent_hits, misses=self.misses,
+                                    maxsize=self.maxsize, currsize=len(self.memory))
+
+    def clear(self):
+        """ Empties the in memory tier and resets the counters, the persistent tier is left alone."""
+        self.memory.clear()
+        self.hits = self.persistent_hits = self.misses = 0
+
+    def close(self):
+        """ Writes whatever is left to the persistent tier, required if there is one."""
+        if self.persistent_connection is not None:
+            self.persistent_writer.close()
+            self.persistent_connection.close()
+            self.persistent_connection = None
+
+    def n_sample_stats_for_team(self, team: str, n_samples: int, last_sample_date: date,
+                                home_only: bool = None, normalize_by_matches: bool = False) -> Stats:
+        """ Cached equivalent of Stats.n_sample_stats_for_team."""
+        return self.cached('n_sample_stats_for_team', team=team, n_samples=n_samples,
+                           last_sample_date=last_sample_date, home_only=home_only,
+                           normalize_by_matches=normalize_by_matches)
+
+    def windowed_stats_for_team(self, team: str, win_weeks: int, win_end_date: date,
+                                home_only: bool = None, normalize_by_matches: bool = False) -> Stats:
+        """ Cached equivalent of Stats.windowed_stats_for_team."""
+        return self.cached('windowed_stats_for_team', team=team, win_weeks=win_weeks, win_end_date=win_end_date,
+                           home_only=home_only, normalize_by_matches=normalize_by_matches)
+
+    def cached(self, method_name: str, **kwargs) -> Stats:
+        key = repr((self.fingerprint, method_name, *sorted(kwargs.items())))
+        stats = self.memory.get(key)
+        if stats is None:
+            # Only worth checking when it's going to cost a lookup anyway.
+            fingerprint = self.fingerprint
+            self.refingerprint_if_changed()
+            if self.fingerprint != fingerprint:
+                key = repr((self.fingerprint, method_name, *sorted(kwargs.items())))
+                stats = self.memory.get(key)
+
+        if stats is not None:
+            self.hits += 1
+            self.memory.move_to_end(key)
+            return copy.copy(stats)
+
+        stats = self.persistent_lookup(key)
+        if stats is not None:
+            self.persistent_hits += 1
+        else:
+            self.misses += 1
+            stats = self.compute(method_name, **kwargs)
+            if self.persistent_writer is not None:
+                self.persistent_pending[key] = stats
+                self.persistent_writer.add((key, pickle.dumps(stats)))
+                if len(self.persistent_writer.rows) == 0:
+                    # Just flushed, so they can all be found in the file now.
+                    self.persistent_pending.clear()
+
+        self.memory[key] = stats
+        if len(self.memory) > self.maxsize:
+            self.memory.popitem(last=False)
+        return copy.copy(stats)
+
+    def persistent_lookup(self, key: str) -> Stats:
+        if self.persistent_connection is None:
+            return None
+        stats = self.persistent_pending.get(key)
+        if stats is not None:
+            return stats
+        row = self.persistent_connection.execute(StatsCache.SQL_SELECT_PERSISTENT_STATS, (key,)).fetchone()
+        return pickle.loads(row[0]) if row is not None else None
+
+    def compute(self, method_name: str, **kwargs) -> Stats:
+        source_method = getattr(self.stats_source, method_name, None)
+        if source_method is not None:
+            try:
+                return source_method(**kwargs)
+            except KeyError as e:
+                logging.debug('Stats source cannot answer %s%s, %s' % (method_name, kwargs, e))
+        return getattr(Stats, method_name)(cursor=self.cursor, **kwargs)
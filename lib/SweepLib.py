@@ -0,0 +1,161 @@
+import numpy as np
+
+from FeatureLib import FootballMatchPredictor
+
+RESULTS = ('home_win', 'draw', 'away_win')
+
+
+def results_from_distances(distances: np.ndarray, threshold: float = 0.0) -> np.ndarray:
+    """ Same classification as FootballMatchPredictor, i.e. a draw unless the distance is more than threshold either
+    side of 0, for any threshold, including negative ones."""
+    distances = np.asarray(distances, dtype=np.float64)
+    decisive = np.abs(distances) > threshold
+    results = np.full(distances.shape, 'draw', dtype='U8')
+    results[(distances > 0) & decisive] = 'home_win'
+    results[(distances < 0) & decisive] = 'away_win'
+    return results
+
+
+class ThresholdSweep(object):
+    """Evaluates the accuracy of every (lower, upper) draw_range for a set of fixtures from a single set of predicted
+    distances, rather than re-predicting the fixtures for each pair.
+
+    Predictions are as for the experiments, i.e. a prediction is overridden to be a draw if its distance is in
+    lower <= distance <= upper. So a fixture only changes from its base prediction to a draw as it comes into range.
+    With the fixtures sorted by distance, and a cumulative count of the change in number correct from doing so, the
+    number correct for any range is then:
+
+        base number correct + change[upto upper] - change[before lower]
+
+    which is worked out for every pair of lowers and uppers at once.
+    """
+
+    def __init__(self, distances, actual_results, base_predicted_results=None):
+        """
+        :param distances: predicted distance for each fixture, e.g. predict_many()['distance'].
+        :param actual_results: 'home_win', 'draw' or 'away_win' for each fixture.
+        :param base_predicted_results: prediction for each fixture before any draw_range is applied, by default as for
+         FootballMatchPredictor with no threshold.
+        """
+        self.distances = np.asarray(distances, dtype=np.float64)
+        self.actual_results = np.asarray(actual_results)
+        self.base_predicted_results = results_from_distances(self.distances) if base_predicted_results is None else \
+            np.asarray(base_predicted_results)
+
+        base_correct = self.base_predicted_results == self.actual_results
+        self.base_num_correct = int(base_correct.sum())
+
+        order = np.argsort(self.distances, kind='stable')
+        self.sorted_distances = self.distances[order]
+        # +1 where drawing the fixture makes it correct, -1 where that makes it wrong, 0 otherwise.
+        change = (self.actual_results == 'draw').astype(np.int64) - base_correct
+        self.cumulative_change = np.concatenate([[0], np.cumsum(change[order])])
+
+    @classmethod
+    def from_predictions(cls, predictions: [np.ndarray], actual_results: [[str]]):
+        """ Sweep over several days of fixtures, as returned by predict_many(), and their actual results."""
+        predictions = np.concatenate(predictions) if len(predictions) > 0 else \
+            np.empty(0, dtype=[('distance', np.float64), ('predicted_result', 'U8')])
+        return cls(distances=predictions['distance'],
+                   actual_results=[result for day_results in actual_results for result in day_results],
+                   base_predicted_results=predictions['predicted_result'])
+
+    def __len__(self) -> int:
+        return len(self.distances)
+
+    def predicted_results(self, lower: float, upper: float) -> np.ndarray:
+        """ Predictions for each fixture with the draw_range (lower, upper) applied."""
+        in_range = (lower <= self.distances) & (self.distances <= upper)
+        return np.where(in_range, 'draw', self.base_predicted_results)
+
+    def correct_counts(self, lowers, uppers) -> np.ndarray:
+        """ Number of fixtures predicted correctly for every draw_range, (lowers x uppers). Where lower > upper nothing
+        is in range, so it's just the base number correct."""
+        lowers = np.asarray(lowers, dtype=np.float64)
+        uppers = np.asarray(uppers, dtype=np.float64)
+
+        change_before_lower = self.cumulative_change[np.searchsorted(self.sorted_distances, lowers, side='left')]
+        change_upto_upper = self.cumulative_change[np.searchsorted(self.sorted_distances, uppers, side='right')]
+
+        counts = self.base_num_correct + change_upto_upper[np.newaxis, :] - change_before_lower[:, np.newaxis]
+        return np.where(lowers[:, np.newaxis] <= uppers[np.newaxis, :], counts, self.base_num_correct)
+
+    def accuracy_surface(self, lowers, uppers) -> np.ndarray:
+        """ Proportion of fixtures predicted correctly for every draw_range, (lowers x uppers)."""
+        counts = self.correct_counts(lowers, uppers)
+        return counts / len(self) if len(self) > 0 else np.zeros(counts.shape)
+
+    def best(self, lowers, uppers) -> (float, float, float):
+        """ :return: (lower, upper, accuracy) of the most accurate draw_range, the first if there's a tie."""
+        surface = self.accuracy_surface(lowers, uppers)
+        (i, j) = np.unravel_index(np.argmax(surface), surface.shape)
+        return float(np.asarray(lowers)[i]), float(np.asarray(uppers)[j]), float(surface[i, j])
+
+
+class BoostSweep(object):
+    """Evaluates predictions for a set of fixtures across any number of home advantage boosts at once.
+
+    A boost only shifts each fixture's home metric by a constant, so rather than rebuilding models and re-predicting
+    for each boost the distances for every (boost, fixture) are broadcast from the unboosted home and away metrics.
+    Distances are worked out as (boost + home) - away, the same as adding the boost to the home model, so they are
+    identical to those from re-predicting, not just close.
+    """
+
+    # Structure of the arrays returned by predictions(), the subset of FootballMatchPredictor.PREDICTIONS_DTYPE that
+    # changes with the boost.
+    PREDICTIONS_DTYPE = np.dtype([('predicted_result', 'U8'), ('distance', np.float64)])
+
+    def __init__(self, home_metrics, away_metrics, actual_results, threshold: float = 0.0):
+        """
+        :param home_metrics: unboosted home metric for each fixture, see FootballMatchPredictor.fixture_metrics().
+        :param away_metrics: away metric for each fixture.
+        :param actual_results: 'home_win', 'draw' or 'away_win' for each fixture.
+        :param threshold: decision threshold, as for FootballMatchPredictor.
+        """
+        self.home_metrics = np.asarray(home_metrics, dtype=np.float64)
+        self.away_metrics = np.asarray(away_metrics, dtype=np.float64)
+        self.actual_results = np.asarray(actual_results)
+        self.threshold = threshold
+
+    @classmethod
+    def from_models(cls, models_by_day: [], fixtures_by_day: [[(str, str)]], actual_results_by_day: [[str]],
+                    threshold: float = 0.0):
+        """ Sweep over several days of fixtures, each day with its own models, e.g. ModelTables built up to the day
+        before."""
+        home_metrics = [np.empty(0)]
+        away_metrics = [np.empty(0)]
+        for (models, fixtures) in zip(models_by_day, fixtures_by_day):
+            (_, _, home_metric, away_metric) = FootballMatchPredictor(models=models).fixture_metrics(fixtures)
+            home_metrics.append(home_metric)
+            away_metrics.append(away_metric)
+
+        return cls(home_metrics=np.concatenate(home_metrics), away_metrics=np.concatenate(away_metrics),
+                   actual_results=[result for day_results in actual_results_by_day for result in day_results],
+                   threshold=threshold)
+
+    def __len__(self) -> int:
+        return len(self.home_metrics)
+
+    def distances(self, boosts) -> np.ndarray:
+        """ Distance for every fixture at every boost, (boosts x fixtures)."""
+        boosts = np.asarray(boosts, dtype=np.float64)
+        return (boosts[:, np.newaxis] + self.home_metrics[np.newaxis, :]) - self.away_metrics[np.newaxis, :]
+
+    def predictions(self, boosts) -> np.ndarray:
+        """ Predicted result and distance for every fixture at every boost, (boosts x fixtures), see
+        PREDICTIONS_DTYPE."""
+        distances = self.distances(boosts)
+        predictions = np.empty(distances.shape, dtype=BoostSweep.PREDICTIONS_DTYPE)
+        predictions['distance'] = distances
+        predictions['predicted_result'] = results_from_distances(distances, threshold=self.threshold)
+        return predictions
+
+    def correct_counts(self, boosts) -> np.ndarray:
+        """ Number of fixtures predicted correctly at each boost."""
+        predicted_results = results_from_distances(self.distances(boosts), threshold=self.threshold)
+        return (predicted_results == self.actual_results[np.newaxis, :]).sum(axis=1)
+
+    def accuracy(self, boosts) -> np.ndarray:
+        """ Proportion of fixtures predicted correctly at each boost."""
+        counts = self.correct_counts(boosts)
+        return counts / len(self) if len(self) > 0 else np.zeros(counts.shape)
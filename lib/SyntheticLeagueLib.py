@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+
+import logging
+import os
+import sqlite3
+import sys
+from argparse import ArgumentParser
+from datetime import date, timedelta
+
+import numpy as np
+
+from BulkWriterLib import BulkWriter
+from SchemaLib import SQL_CREATE_RESULTS_TABLE, ensure_indexes, ensure_natural_key
+
+SQL_INSERT_RESULT = '''INSERT INTO results(date, home_team, home_score, away_team, away_score) VALUES (?,?,?,?,?)'''
+
+
+def double_round_robin(teams: [str]) -> [[(str, str)]]:
+    """ Season's fixtures, by the circle method, where every team plays every other team once at home and once away.
+
+    :return: list of rounds, each a list of (home_team, away_team), 2 x (teams - 1) rounds in all. With an odd number
+     of teams one team sits out each round.
+    """
+    teams = list(teams)
+    if len(teams) % 2 == 1:
+        teams.append(None)
+    num_teams = len(teams)
+
+    first_half = []
+    rotation = teams[1:]
+    for round_num in range(num_teams - 1):
+        circle = [teams[0]] + rotation
+        fixtures = []
+        for i in range(num_teams // 2):
+            (home_team, away_team) = (circle[i], circle[num_teams - 1 - i])
+            # Alternate who is at home, otherwise the fixed team would be at home all season.
+            if (i == 0 and round_num % 2 == 1) or (i > 0 and i % 2 == 1):
+                (home_team, away_team) = (away_team, home_team)
+            if home_team is not None and away_team is not None:
+                fixtures.append((home_team, away_team))
+        first_half.append(fixtures)
+        rotation = rotation[-1:] + rotation[:-1]
+
+    second_half = [[(away_team, home_team) for (home_team, away_team) in fixtures] for fixtures in first_half]
+    return first_half + second_half
+
+
+def season_start(year: int) -> date:
+    """ :return: the first Saturday in August."""
+    start = date(year, 8, 1)
+    return start + timedelta(days=(5 - start.weekday()) % 7)
+
+
+class SyntheticLeague(object):
+    """Reproducible, made up, results in the same form as the scraped ones, for testing at scales that the real data
+    can't reach, e.g. 30 seasons of 5 divisions.
+
+    Each division is a double round robin a season, one round a week from the first Saturday in August. Scores are
+    Poisson, with each team's expected goals set by the difference between its strength and its opponent's, plus a
+    home advantage. Strengths drift from season to season so that form changes over time.
+    """
+
+    def __init__(self, num_teams: int = 20, num_seasons: int = 1, num_divisions: int = 1, first_season: int = 2000,
+                 seed: int = 0, mean_goals: float = 1.15, home_advantage: float = 0.25, strength_sd: float = 0.35,
+                 strength_drift_sd: float = 0.1):
+        """
+        :param num_teams: teams in each division.
+        :param num_seasons: number of seasons, each starting in August of consecutive years.
+        :param num_divisions: number of divisions, each with its own teams, all playing on the same dates.
+        :param first_season: year of the first season's start.
+        :param seed: everything random comes from this, the same seed and parameters give the same results.
+        :param mean_goals: goals scored by each side in a match between equally strong teams on neutral ground.
+        :param home_advantage: log of how many times more goals the home team can expect to score.
+        :param strength_sd: spread of the team strengths, on the same log scale.
+        :param strength_drift_sd: how much each team's strength changes from one season to the next.
+        """
+        self.num_teams = num_teams
+        self.num_seasons = num_seasons
+        self.num_divisions = num_divisions
+        self.first_season = first_season
+        self.seed = seed
+        self.mean_goals = mean_goals
+        self.home_advantage = home_advantage
+        self.strength_sd = strength_sd
+        self.strength_drift_sd = strength_drift_sd
+
+        self.teams = [['Division %i Team %02i' % (division + 1, team + 1) for team in range(num_teams)]
+                      for division in range(num_divisions)]
+
+    def __len__(self) -> int:
+        """ Number of matches."""
+        return self.num_divisions * self.num_seasons * self.num_teams * (self.num_teams - 1)
+
+    def results(self):
+        """ :return: generator of (date, home_team, home_score, away_team, away_score) in date order, dates as ISO
+         strings."""
+        random_state = np.random.RandomState(self.seed)
+        strengths = random_state.normal(0.0, self.strength_sd, (self.num_divisions, self.num_teams))
+        log_mean_goals = np.log(self.mean_goals)
+
+        for season in range(self.num_seasons):
+            if season > 0:
+                strengths = strengths + random_state.normal(0.0, self.strength_drift_sd, strengths.shape)
+
+            rounds = double_round_robin(range(self.num_teams))
+            match_date = season_start(self.first_season + season)
+            for fixtures in rounds:
+                home_ids = np.array([home_id for (home_id, _) in fixtures])
+                away_ids = np.array([away_id for (_, away_id) in fixtures])
+                for division in range(self.num_divisions):
+                    strength_diffs = strengths[division, home_ids] - strengths[division, away_ids]
+                    home_scores = random_state.poisson(np.exp(log_mean_goals + self.home_advantage +
+                                                              strength_diffs / 2))
+                    away_scores = random_state.poisson(np.exp(log_mean_goals - strength_diffs / 2))
+                    teams = self.teams[division]
+                    for (home_id, away_id, home_score, away_score) in zip(home_ids, away_ids, home_scores,
+                                                                          away_scores):
+                        yield (match_date.isoformat(), teams[home_id], int(home_score), teams[away_id],
+                               int(away_score))
+                match_date += timedelta(weeks=1)
+
+    def write(self, db_connection: sqlite3.Connection):
+        """ Adds the results to a DB, creating the results table and its indexes as need be."""
+        db_cursor = db_connection.cursor()
+        db_cursor.execute(SQL_CREATE_RESULTS_TABLE)
+
+        with BulkWriter(db_connection, SQL_INSERT_RESULT, batch_size=10000, commit_every=None) as results_writer:
+            results_writer.add_many(self.results())
+
+        ensure_indexes(db_cursor)
+        ensure_natural_key(db_cursor)
+        db_connection.commit()
+        logging.info('Generated %i results for %i teams' % (results_writer.rows_written,
+                                                           self.num_divisions * self.num_teams))
+
+    def write_file(self, db_file: str):
+        with sqlite3.connect(db_file) as db_connection:
+            self.write(db_connection)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=os.environ.get("LOGLEVEL", "INFO"))
+
+    parser: ArgumentParser = ArgumentParser()
+    parser.description = "Generates a results DB of made up matches, reproducibly, e.g. for benchmarking at scale"
+    parser.add_argument('-o', '--out-db',
+                        help='Sqlite file to write the results to',
+                        required=True,
+                        type=str
+                        )
+
+    parser.add_argument('-t', '--teams',
+                        help='Number of teams in each division, default %i' % 20,
+                        default=20,
+                        required=False,
+                        type=int
+                        )
+
+    parser.add_argument('-s', '--seasons',
+                        help='Number of seasons, default %i' % 1,
+                        default=1,
+                        required=False,
+                        type=int
+                        )
+
+    parser.add_argument('-d', '--divisions',
+                        help='Number of divisions, default %i' % 1,
+                        default=1,
+                        required=False,
+                        type=int
+                        )
+
+    parser.add_argument('--first-season',
+                        help='Year the first season starts, default %i' % 2000,
+                        default=2000,
+                        required=False,
+                        type=int
+                        )
+
+    parser.add_argument('--seed',
+                        help='Random seed, default %i' % 0,
+                        default=0,
+                        required=False,
+                        type=int
+                        )
+
+    parser.add_argument('-f', '--force',
+                        help='Overwrite any existing DB, default is to refuse',
+                        default=False,
+                        action='store_true'
+                        )
+
+    args = parser.parse_args()
+
+    if os.path.exists(args.out_db):
+        if not args.force:
+            logging.error('%s already exists, use --force to overwrite it' % args.out_db)
+            sys.exit(1)
+        os.remove(args.out_db)
+
+    SyntheticLeague(num_teams=args.teams, num_seasons=args.seasons, num_divisions=args.divisions,
+                    first_season=args.first_season, seed=args.seed).write_file(args.out_db)
@@ -0,0 +1,45 @@
+import numpy as np
+
+
+class TeamIds(object):
+    """Interns team names as small, dense, integer ids.
+
+    Internally the engines work on these ids, e.g. as indexes into arrays, and only convert back to names when
+    producing output. Ids are handed out in the order that names are first seen.
+    """
+
+    def __init__(self, names: [str] = ()):
+        self.id2name: [str] = []
+        self.name2id: {str: int} = {}
+        for name in names:
+            self.intern(name)
+
+    def intern(self, name: str) -> int:
+        team_id = self.name2id.get(name)
+        if team_id is None:
+            team_id = len(self.id2name)
+            self.name2id[name] = team_id
+            self.id2name.append(name)
+        return team_id
+
+    def id(self, name: str, default: int = None) -> int:
+        return self.name2id.get(name, default)
+
+    def name(self, team_id: int) -> str:
+        return self.id2name[team_id]
+
+    def ids(self, names: [str], default: int = -1) -> np.ndarray:
+        """ Ids for each of the names as an array, names that have not been interned get the default."""
+        return np.array([self.name2id.get(name, default) for name in names], dtype=np.intp)
+
+    def names(self, team_ids) -> [str]:
+        return [self.id2name[team_id] for team_id in team_ids]
+
+    def __len__(self) -> int:
+        return len(self.id2name)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.name2id
+
+    def __iter__(self):
+        return iter(self.id2name)
@@ -5,24 +5,12 @@ import os
 import sqlite3
 from argparse import ArgumentParser
 import datetime
-import re
 import sys
 
 
 lib_path = os.path.join(os.path.dirname(__file__), 'lib')
 sys.path.append(lib_path)
 
-# Use separate Home and Away models to predict match results
-from StatsLib import Stats
-from FeatureLib import FeatureModel, FootballMatchPredictor
-
-logging.basicConfig(level=os.environ.get("LOGLEVEL", "INFO"))
-
-# Maximum number of samples to use when calculating models, lets go for two years worth
-# 19 *
-MAX_SAMPLES = 19 * 2 * 2
-
-
 
 if __name__ == "__main__":
 
@@ -38,26 +26,120 @@ if __name__ == "__main__":
     parser.add_argument('-m', '--matches',
                         help='Specify the matches to predict, format is \'home team 1-away team 1, '
                              'home team 2-away team 2, ...\'',
-                        required=True,
+                        required=False,
                         type=str
                         )
 
+    parser.add_argument('-f', '--fixtures-file',
+                        help='File of matches to predict, or - for stdin, one per line as home team,away team for CSV or '
+                             '{"home_team": ..., "away_team": ...} for JSON lines. Any number can be predicted, they '
+                             'are read and predicted a batch at a time',
+                        default=None,
+                        required=False,
+                        type=str
+                        )
 
-    args = parser.parse_args()
+    parser.add_argument('--fixtures-format',
+                        help='Format of --fixtures-file, default is jsonl for .jsonl and .json files, otherwise csv',
+                        default=None,
+                        required=False,
+                        choices=['csv', 'jsonl']
+                        )
 
-    # De-couple front-end cli from program internals
-    results_db_file = args.results_sqlite
-    matches_str = args.matches
+    parser.add_argument('--batch-size',
+                        help='Number of --fixtures-file matches to predict at a time, default %i' % 1000,
+                        default=1000,
+                        required=False,
+                        type=int
+                        )
 
+    parser.add_argument('-O', '--output-format',
+                        help='How to print the predictions, default %s' % 'text',
+                        default='text',
+                        required=False,
+                        choices=['text', 'csv', 'jsonl']
+                        )
 
+    parser.add_argument('-s', '--serve',
+                        help='Rather than predicting --matches, run a local HTTP service on this port that keeps the '
+                             'models in memory, rebuilding them when the results change, e.g. '
+                             'curl "localhost:8017/predict?matches=Arsenal-Everton"',
+                        default=None,
+                        required=False,
+                        type=int
+                        )
 
+    parser.add_argument('--host',
+                        help='Address for --serve to listen on, default %s' % '127.0.0.1',
+                        default='127.0.0.1',
+                        required=False,
+                        type=str
+                        )
+
+    args = parser.parse_args()
+    if args.matches is None and args.fixtures_file is None and args.serve is None:
+        parser.error('One of --matches, --fixtures-file or --serve is required')
+    if args.batch_size < 1:
+        parser.error('--batch-size must be at least 1')
 
-    # Remove preceeding white space around match and team separators and create a list of match tuples
-    # to iterate over later.
-    matches_cleaned_up_str = re.sub(r'\s*-\s*', '-', re.sub(r'\s*,\s*', ',', matches_str))
-    matches_to_predict = [match_pair.split('-') for match_pair in matches_cleaned_up_str.split(',')]
+    logging.basicConfig(level=os.environ.get("LOGLEVEL", "INFO"))
 
-    # From the list of matches we're going to predict obtain a de-duplicated list of teams
+    # Imported once the arguments are known to be good, NumPy et al take longer to import than everything else put
+    # together, so --help and mistakes on the command line don't have to wait for them.
+    # Use separate Home and Away models to predict match results
+    from FeatureLib import FootballMatchPredictor
+    from PredictionServiceLib import MAX_SAMPLES, PredictionWriter, WarmModels, create_goal_diff_models, \
+        make_server, parse_matches, predictions_to_dicts, read_fixtures
+
+    # De-couple front-end cli from program internals
+    results_db_file = args.results_sqlite
+    matches_str = args.matches
+
+    if args.serve is not None:
+        server = make_server(WarmModels(results_db_file, n_samples=MAX_SAMPLES), host=args.host, port=args.serve)
+        logging.info('Serving predictions on %s:%i' % server.server_address)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            server.warm_models.close()
+        sys.exit(0)
+
+    prediction_writer = PredictionWriter(sys.stdout, output_format=args.output_format)
+
+    if args.fixtures_file is not None:
+        fixtures_format = args.fixtures_format
+        if fixtures_format is None:
+            fixtures_format = 'jsonl' if os.path.splitext(args.fixtures_file)[1] in ('.jsonl', '.json') else 'csv'
+
+        # Models for every team, as the teams aren't known until the fixtures have all been read.
+        warm_models = WarmModels(results_db_file, n_samples=MAX_SAMPLES)
+        fixtures_file = sys.stdin if args.fixtures_file == '-' else open(args.fixtures_file, newline='')
+        try:
+            fixtures = read_fixtures(fixtures_file, fixtures_format=fixtures_format)
+            for predictions in warm_models.predict_stream(fixtures, batch_size=args.batch_size):
+                prediction_writer.write(predictions)
+        except KeyError as e:
+            logging.error(e.args[0])
+            sys.exit(1)
+        except ValueError as e:
+            logging.error(e)
+            sys.exit(1)
+        finally:
+            if fixtures_file is not sys.stdin:
+                fixtures_file.close()
+            warm_models.close()
+        sys.exit(0)
+
+    try:
+        matches_to_predict = parse_matches(matches_str)
+    except ValueError as e:
+        logging.error(e)
+        sys.exit(1)
+
+    # From the list of matches we're going to predict obtain a de-duplicated list of teams
     # involved in those matches so that we can build models for them.
     teams = {team:True for match in matches_to_predict for team in match}.keys()
 
@@ -69,44 +151,18 @@ if __name__ == "__main__":
         db_conn.row_factory = sqlite3.Row
         db_cursor = db_conn.cursor()
 
-
-        def create_model_fn(fn_team: str):
-            team_stat_home = Stats.n_sample_stats_for_team(cursor=db_cursor,
-                                                           team=fn_team,
-                                                           last_sample_date=use_data_upto_date,
-                                                           n_samples=MAX_SAMPLES,
-                                                           home_only=True,
-                                                           normalize_by_matches=True)
-
-            team_stat_away = Stats.n_sample_stats_for_team(cursor=db_cursor,
-                                                           team=fn_team,
-                                                           last_sample_date=use_data_upto_date,
-                                                           n_samples=MAX_SAMPLES,
-                                                           home_only=False,
-                                                           normalize_by_matches=True)
-
-            return FeatureModel(
-                input_data=[team_stat_home.goal_diff, team_stat_away.goal_diff],
-                id=team_stat_home.team_name,
-            )
-
-
-        team_models: {str: FeatureModel} = FeatureModel.create_models_for_all_teams(
-            model_making_fn=create_model_fn, entities=teams)
-
-
-
-    for (home_team_name, away_team_name) in matches_to_predict:
-
-        # Use model to make a prediction
-        (predicted_result, predicted_distance, _) = FootballMatchPredictor(
-            models=team_models
-        ).predict(
-            home_team=home_team_name, away_team=away_team_name
-        )
-
-        print('Predicted results for %s vs %s is a %s with distance  %f' % (home_team_name, away_team_name,
-                                                                            predicted_result, predicted_distance))
-
-
-
+        try:
+            team_models = create_goal_diff_models(db_cursor=db_cursor, teams=list(teams),
+                                                  use_data_upto_date=use_data_upto_date, n_samples=MAX_SAMPLES)
+        except KeyError as e:
+            logging.error(e.args[0])
+            sys.exit(1)
+
+    # Use the models to make predictions for all of the matches in one go
+    predictions = FootballMatchPredictor(
+        models=team_models
+    ).predict_many(
+        fixtures=matches_to_predict
+    )
+
+    prediction_writer.write(predictions_to_dicts(predictions))
@@ -7,8 +7,13 @@ import sqlite3
 from datetime import timedelta
 from datetime import date
 from ActualResultsLib import ActualResults
-from FeatureLib import FeatureModel, FootballMatchPredictor
-from StatsLib import Stats
+from BulkWriterLib import BulkWriter, configure_scratch_db
+from ExperimentLib import ExperimentResult, ExperimentRunner, ExperimentWorker
+from FeatureLib import FeatureModel, FootballMatchPredictor, ModelTable
+from FeatureStoreLib import FeatureStore
+from InstrumentLib import Instrumentation
+from StatsLib import RollingTeamStats, StatsCache
+from SweepLib import BoostSweep, ThresholdSweep
 import unittest
 
 
@@ -17,6 +22,10 @@ RAW_MATCH_RESULTS_IN_DB_FILE = os.path.join(os.path.dirname(__file__), 'fixture'
 print(RAW_MATCH_RESULTS_IN_DB_FILE)
 TEST_OUTPUT_STEM_DIR = os.path.join(os.path.dirname(__file__), 'algorithm_test_results')
 print(TEST_OUTPUT_STEM_DIR)
+FEATURE_STORE_DIR = os.path.join(TEST_OUTPUT_STEM_DIR, 'feature_store')
+# Set INSTRUMENT=1 to time each phase of every test, reported in the log and written alongside its results DB as
+# <test name>_instrumentation.json
+INSTRUMENT = bool(os.environ.get("INSTRUMENT"))
 
 NUM_OF_TEAMS = 20
 ALL_TEAMS_PLAYED_HOME_OR_AWAY = date(2016, 8, 16)  #  Prior to this date not all teams had played at least once
@@ -39,8 +48,11 @@ SANITY_TEST_LEAGUE_ORDER = ['Chelsea', 'Tottenham Hotspur', 'Manchester City', '
                             'Burnley', 'Watford', 'Hull City', 'Middlesbrough', 'Sunderland']
 
 
+# Stats are memoized across the tests, many of which only differ in how the same stats are used.
+stats_cache: StatsCache = None
+
 # Override by default by setting Environmental variable 'LOGLEVEL' to 'DEBUG' to the program emit more debug information
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=os.environ.get("LOGLEVEL", "INFO"))
 
 ###
 #  Definitions related to the sqlite database - here for info, unlikely to want to tinker with.
@@ -138,6 +150,24 @@ SQL_INSERT_TEST_MODELS_LOG = \
 """
 
 
+###
+#  Model making functions for experiments run with ExperimentLib. These run in the worker processes so need to be defined
+# at the module level.
+###
+
+def make_moving_window_goal_diff_models(worker: ExperimentWorker, num_samples: int, model_date: date) -> ModelTable:
+    """ Normalised Goal Difference over each team's last num_samples matches, for both the home and away models."""
+    season_matrix = worker.season_matrix
+    team_stats = season_matrix.n_sample_stats_for_teams(teams=season_matrix.teams,
+                                                        last_sample_date=model_date,
+                                                        n_samples=num_samples,
+                                                        normalize_by_matches=True)
+
+    return ModelTable(ids=[team_stat.team_name for team_stat in team_stats],
+                      features=[[team_stat.goal_diff / team_stat.played, team_stat.goal_diff / team_stat.played]
+                                for team_stat in team_stats])
+
+
 class StatsPredictionPremierLeague(unittest.TestCase):
 
     def setUp(self):
@@ -156,23 +186,49 @@ class StatsPredictionPremierLeague(unittest.TestCase):
             played_home_OR_away_before_dates, \
             played_home_AND_away_before_dates, \
             db_log_connection, \
-            db_log_cursor
+            db_log_cursor, \
+            db_models_writer, \
+            db_log_writer, \
+            feature_store, \
+            stats_cache, \
+            instrumentation
+
+        instrumentation = None
+        if INSTRUMENT:
+            instrumentation = Instrumentation()
+            instrumentation.install()
 
         # Set up our connection to the raw input match data
         db_in_connection = sqlite3.connect(RAW_MATCH_RESULTS_IN_DB_FILE)
         db_in_connection.row_factory = sqlite3.Row
         db_in_cursor = db_in_connection.cursor()
-        
+
+        # Read the per team stats for each date from the precomputed feature store, rather than querying the database
+        # per team, per date. It is only built on the first run, or when the results change.
+        feature_store = FeatureStore.build(db_in_cursor, FEATURE_STORE_DIR)
+        if stats_cache is None:
+            stats_cache = StatsCache(db_in_cursor, stats_source=feature_store)
+        else:
+            stats_cache.rebind(db_in_cursor, stats_source=feature_store)
+
         # Setup our output logging connection for the test results and their associated models
         db_log_file_path = '%s/%s.db' % (TEST_OUTPUT_STEM_DIR, self.id().split('.')[-1])
         db_log_connection = sqlite3.connect(db_log_file_path)
+        configure_scratch_db(db_log_connection)
         db_log_cursor = db_log_connection.cursor()
+        if instrumentation is not None:
+            instrumentation.trace_connection(db_in_connection)
+            instrumentation.trace_connection(db_log_connection)
 
         db_log_cursor.execute(SQL_DROP_TEST_LOGGING)
         db_log_cursor.execute(SQL_CREATE_TEST_LOGGING)
         db_log_cursor.execute(SQL_DROP_TEST_MODELS_LOG)
         db_log_cursor.execute(SQL_CREATE_TEST_MODELS_LOG)
 
+        # Models and predictions are written in bulk, call flush_logging() before reading any of them back.
+        db_models_writer = BulkWriter(db_log_connection, SQL_INSERT_TEST_MODELS_LOG)
+        db_log_writer = BulkWriter(db_log_connection, SQL_INSERT_TEST_LOG_ENTRY)
+
         # Create a couple of lists of match dates we will be making predictions for, we do this by removing and
         # candidate dates where we do not have enough data to derive the models. The:
         # - First list is prediction dates where all teams have played home OR away least once i.e. when it's sensible
@@ -188,10 +244,24 @@ class StatsPredictionPremierLeague(unittest.TestCase):
         num_matches_in_season = 2 * (NUM_OF_TEAMS - 1)
 
     def tearDown(self):
+        logging.info('Stats cache %s' % (stats_cache.cache_info(),))
         db_in_connection.close()
-        db_log_connection.commit()
+        db_models_writer.close()
+        db_log_writer.close()
         db_log_connection.close()
 
+        if instrumentation is not None:
+            instrumentation.uninstall()
+            instrumentation.count('Models logged', db_models_writer.rows_written)
+            instrumentation.count('Predictions logged', db_log_writer.rows_written)
+            logging.info(instrumentation.format_report())
+            instrumentation.write_json('%s/%s_instrumentation.json' % (TEST_OUTPUT_STEM_DIR, self.id().split('.')[-1]))
+
+    @staticmethod
+    def flush_logging():
+        db_models_writer.flush()
+        db_log_writer.flush()
+
     def persist_models(self, model_gen_date, model_description, models):
         for team in models:
             sql_bindings = {
@@ -200,7 +270,7 @@ class StatsPredictionPremierLeague(unittest.TestCase):
                 'model_name': model_description,
                 'feature': str(models[team])
             }
-            db_log_cursor.execute(SQL_INSERT_TEST_MODELS_LOG, sql_bindings)
+            db_models_writer.add(sql_bindings)
 
     @staticmethod
     def crange(first, test, update):
@@ -232,17 +302,31 @@ class StatsPredictionPremierLeague(unittest.TestCase):
          and posterity.
         """
 
-        for unseen_match_data in ActualResults.get_results_data(db_cursor=db_in_cursor,
-                                                                win_size=timedelta(days=0),  # 0 == Just that day
-                                                                win_end=match_date):
-            (match_day, home_team_name, home_score, away_team_name, away_score, actual_result) = \
-                ActualResults.unpack_match_result_data(unseen_match_data)
-
-            # Use model to make a prediction
-            (predicted_result, predicted_distance, _) = FootballMatchPredictor(
-                models=models,
-            ).predict(
-                home_team=home_team_name, away_team=away_team_name)
+        unseen_matches_data = [ActualResults.unpack_match_result_data(unseen_match_data) for unseen_match_data in
+                               ActualResults.get_results_data(db_cursor=db_in_cursor,
+                                                              win_size=timedelta(days=0),  # 0 == Just that day
+                                                              win_end=match_date)]
+
+        # Use model to make predictions for all of the day's matches in one go
+        predictions = FootballMatchPredictor(
+            models=models,
+        ).predict_many(
+            fixtures=[(home_team_name, away_team_name) for (_, home_team_name, _, away_team_name, _, _) in
+                      unseen_matches_data])
+
+        self.store_predictions_for_date(match_date=match_date, unseen_matches_data=unseen_matches_data,
+                                        predictions=predictions, variants=variants, draw_range=draw_range)
+
+    def store_predictions_for_date(self, match_date: date, unseen_matches_data: [()], predictions,
+                                   variants=None, draw_range: (float, float) = None):
+        """ Stores predictions, as made by FootballMatchPredictor.predict_many, against the actual results for the
+        day's matches in the logging database, see make_and_store_predictions_for_date for the parameters.
+        """
+
+        for ((match_day, home_team_name, home_score, away_team_name, away_score, actual_result), prediction) in \
+                zip(unseen_matches_data, predictions):
+            predicted_result = prediction['predicted_result']
+            predicted_distance = prediction['distance']
             logging.debug(predicted_result, predicted_distance)
 
             # Override the vanilla prediction if distance is not large enough
@@ -269,7 +353,38 @@ class StatsPredictionPremierLeague(unittest.TestCase):
                 'actual_home_score': home_score,
                 'actual_away_score': away_score
             }
-            db_log_cursor.execute(SQL_INSERT_TEST_LOG_ENTRY, sql_binding)
+            db_log_writer.add(sql_binding)
+
+    def make_predictions_for_dates(self, match_dates: [date], model_making_fn) -> [ExperimentResult]:
+        """ Builds models, with ModelTable.create_for_all_teams, up to the day before each of the match dates and
+        predicts that day's matches with them, without storing anything. For experiments that then use the same
+        predictions in a number of ways.
+        """
+        results = []
+        for match_date in match_dates:
+            self.model_date = match_date - timedelta(days=1)
+            models: ModelTable = ModelTable.create_for_all_teams(model_making_fn=model_making_fn, entities=teams)
+
+            matches = [ActualResults.unpack_match_result_data(match_data) for match_data in
+                       ActualResults.get_results_data(db_cursor=db_in_cursor, win_size=timedelta(days=0),
+                                                      win_end=match_date)]
+            predictions = FootballMatchPredictor(models=models).predict_many(
+                fixtures=[(home_team_name, away_team_name) for (_, home_team_name, _, away_team_name, _, _) in
+                          matches])
+
+            results.append(ExperimentResult(parameter=None, match_date=match_date, model_date=self.model_date,
+                                            models={team: str(models[team]) for team in models}, matches=matches,
+                                            predictions=predictions))
+        return results
+
+    def check_num_correct_by_variant(self, expected_num_correct: [int]):
+        """ Sanity test that the number of correct predictions that a sweep came up with for each of the variants is the
+        same as was logged, in the order that the variants were logged.
+        """
+        self.flush_logging()
+        sql_query = 'SELECT SUM(prediction_correct) FROM test_logging_table GROUP BY variants ORDER BY MIN(id)'
+        logged_num_correct = [row[0] for row in db_log_cursor.execute(sql_query).fetchall()]
+        self.assertEqual(expected_num_correct, logged_num_correct)
 
     # End of create_model_fn
 
@@ -286,11 +401,10 @@ class StatsPredictionPremierLeague(unittest.TestCase):
         """
 
         def create_premier_league_model_fn(fn_team: str):
-            team_stat = Stats.n_sample_stats_for_team(cursor=db_in_cursor,
-                                                      team=fn_team,
-                                                      last_sample_date=self.model_date,
-                                                      n_samples=self.num_samples,
-                                                      normalize_by_matches=False)
+            team_stat = stats_cache.n_sample_stats_for_team(team=fn_team,
+                                                            last_sample_date=self.model_date,
+                                                            n_samples=self.num_samples,
+                                                            normalize_by_matches=False)
 
             #  Approximate premier league rank, by using points and a tiny nudge (compared to points) from goal
             # difference to separate those on the same points.
@@ -322,6 +436,7 @@ class StatsPredictionPremierLeague(unittest.TestCase):
         # the number skipped at the beginning to ensure all teams have played at least once so that the models
         # have something to work on.
         num_expected_match_predictions = (NUM_OF_TEAMS - 1) * NUM_OF_TEAMS - NUM_OF_TEAMS / 2
+        self.flush_logging()
         sql_query = 'SELECT COUNT(*) FROM test_logging_table'
         num_match_predictions = db_log_cursor.execute(sql_query).fetchone()[0]
         self.assertEqual(num_expected_match_predictions, num_match_predictions)
@@ -336,6 +451,7 @@ class StatsPredictionPremierLeague(unittest.TestCase):
             model_making_fn=create_premier_league_model_fn, entities=teams)
 
         self.persist_models(model_gen_date=self.model_date, model_description=self.shortDescription(), models=models)
+        self.flush_logging()
         sql_query = 'SELECT team FROM test_models_table WHERE date=:date ORDER BY feature DESC'
         generated_model_order = [tupe[0] for tupe in
                                  db_log_cursor.execute(sql_query, {'date': self.model_date.isoformat()}).fetchall()]
@@ -347,11 +463,10 @@ class StatsPredictionPremierLeague(unittest.TestCase):
         """
 
         def create_premier_league_normalised_model_fn(fn_team: str):
-            team_stat = Stats.n_sample_stats_for_team(cursor=db_in_cursor,
-                                                      team=fn_team,
-                                                      last_sample_date=self.model_date,
-                                                      n_samples=self.num_samples,
-                                                      normalize_by_matches=True)
+            team_stat = stats_cache.n_sample_stats_for_team(team=fn_team,
+                                                            last_sample_date=self.model_date,
+                                                            n_samples=self.num_samples,
+                                                            normalize_by_matches=True)
 
             #  Approximate premier league rank, by using points and a tiny nudge (compared to points) from goal
             # difference to separate those on the same points.
@@ -381,11 +496,10 @@ class StatsPredictionPremierLeague(unittest.TestCase):
         """
 
         def create_premier_league_normalised_points_model_fn(fn_team: str):
-            team_stat = Stats.n_sample_stats_for_team(cursor=db_in_cursor,
-                                                      team=fn_team,
-                                                      last_sample_date=self.model_date,
-                                                      n_samples=self.num_samples,
-                                                      normalize_by_matches=True)
+            team_stat = stats_cache.n_sample_stats_for_team(team=fn_team,
+                                                            last_sample_date=self.model_date,
+                                                            n_samples=self.num_samples,
+                                                            normalize_by_matches=True)
 
             #  Approximate premier league rank, by using points and a tiny nudge (compared to points) from goal
             # difference to separate those on the same points.
@@ -414,17 +528,19 @@ class StatsPredictionPremierLeague(unittest.TestCase):
         """
 
         def create_premier_league_normalised_goal_diff_fn(fn_team: str):
-            team_stat = Stats.n_sample_stats_for_team(cursor=db_in_cursor,
-                                                      team=fn_team,
-                                                      last_sample_date=self.model_date,
-                                                      n_samples=self.num_samples,
-                                                      normalize_by_matches=True)
+            team_stat = stats_cache.n_sample_stats_for_team(team=fn_team,
+                                                            last_sample_date=self.model_date,
+                                                            n_samples=self.num_samples,
+                                                            normalize_by_matches=True)
 
             return FeatureModel(input_data=team_stat,
                                 id=team_stat.team_name,
                                 feature_model_making_fn=lambda stat: stat.goal_diff
                                 )
 
+        # The dates only go forwards, so the stats can be rolled along from one to the next rather than each being
+        # looked up afresh.
+        stats_cache.rebind(db_in_cursor, stats_source=RollingTeamStats(db_in_cursor, n_samples=num_matches_in_season))
         for match_date in played_home_OR_away_before_dates:
             ####
             #  Build model up to the day before the match
@@ -446,17 +562,19 @@ class StatsPredictionPremierLeague(unittest.TestCase):
         """
 
         def create_premier_league_normalised_goal_diff_fn(fn_team: str):
-            team_stat = Stats.n_sample_stats_for_team(cursor=db_in_cursor,
-                                                      team=fn_team,
-                                                      last_sample_date=self.model_date,
-                                                      n_samples=self.num_samples,
-                                                      normalize_by_matches=True, home_only=True)
+            team_stat = stats_cache.n_sample_stats_for_team(team=fn_team,
+                                                            last_sample_date=self.model_date,
+                                                            n_samples=self.num_samples,
+                                                            normalize_by_matches=True, home_only=True)
 
             return FeatureModel(input_data=team_stat,
                                 id=team_stat.team_name,
                                 feature_model_making_fn=lambda stat: stat.goal_diff
                                 )
 
+        # As with 40, roll the stats along the dates.
+        stats_cache.rebind(db_in_cursor, stats_source=RollingTeamStats(db_in_cursor, n_samples=num_matches_in_season,
+                                                                       home_only=True))
         for match_date in played_home_AND_away_before_dates:
             ####
             #  Build model up to the day before the match
@@ -478,17 +596,19 @@ class StatsPredictionPremierLeague(unittest.TestCase):
         """
 
         def create_premier_league_normalised_goal_diff_fn(fn_team: str):
-            team_stat = Stats.n_sample_stats_for_team(cursor=db_in_cursor,
-                                                      team=fn_team,
-                                                      last_sample_date=self.model_date,
-                                                      n_samples=self.num_samples,
-                                                      normalize_by_matches=True, home_only=False)
+            team_stat = stats_cache.n_sample_stats_for_team(team=fn_team,
+                                                            last_sample_date=self.model_date,
+                                                            n_samples=self.num_samples,
+                                                            normalize_by_matches=True, home_only=False)
 
             return FeatureModel(input_data=team_stat,
                                 id=team_stat.team_name,
                                 feature_model_making_fn=lambda stat: stat.goal_diff
                                 )
 
+        # As with 40, roll the stats along the dates.
+        stats_cache.rebind(db_in_cursor, stats_source=RollingTeamStats(db_in_cursor, n_samples=num_matches_in_season,
+                                                                       home_only=False))
         for match_date in played_home_AND_away_before_dates:
             ####
             #  Build model up to the day before the match
@@ -512,11 +632,10 @@ class StatsPredictionPremierLeague(unittest.TestCase):
         """
 
         def create_model_fn(fn_team: str):
-            team_stat = Stats.n_sample_stats_for_team(cursor=db_in_cursor,
-                                                      team=fn_team,
-                                                      last_sample_date=self.model_date,
-                                                      n_samples=self.num_samples,
-                                                      normalize_by_matches=False)
+            team_stat = stats_cache.n_sample_stats_for_team(team=fn_team,
+                                                            last_sample_date=self.model_date,
+                                                            n_samples=self.num_samples,
+                                                            normalize_by_matches=False)
 
             return FeatureModel(input_data=team_stat,
                                 id=team_stat.team_name,
@@ -544,11 +663,10 @@ class StatsPredictionPremierLeague(unittest.TestCase):
         """
 
         def create_model_fn(fn_team: str):
-            team_stat = Stats.n_sample_stats_for_team(cursor=db_in_cursor,
-                                                      team=fn_team,
-                                                      last_sample_date=self.model_date,
-                                                      n_samples=self.num_samples,
-                                                      normalize_by_matches=False)
+            team_stat = stats_cache.n_sample_stats_for_team(team=fn_team,
+                                                            last_sample_date=self.model_date,
+                                                            n_samples=self.num_samples,
+                                                            normalize_by_matches=False)
 
             return FeatureModel(input_data=team_stat,
                                 id=team_stat.team_name,
@@ -575,11 +693,10 @@ class StatsPredictionPremierLeague(unittest.TestCase):
         """
 
         def create_model_fn(fn_team: str):
-            team_stat = Stats.n_sample_stats_for_team(cursor=db_in_cursor,
-                                                      team=fn_team,
-                                                      last_sample_date=self.model_date,
-                                                      n_samples=self.num_samples,
-                                                      normalize_by_matches=False)
+            team_stat = stats_cache.n_sample_stats_for_team(team=fn_team,
+                                                            last_sample_date=self.model_date,
+                                                            n_samples=self.num_samples,
+                                                            normalize_by_matches=False)
             return FeatureModel(input_data=team_stat,
                                 id=team_stat.team_name,
                                 feature_model_making_fn=lambda stat: (-1 * stat.lost) / stat.played
@@ -604,17 +721,13 @@ class StatsPredictionPremierLeague(unittest.TestCase):
         """
 
         def create_model_fn(fn_team: str):
-            team_stat = Stats.n_sample_stats_for_team(cursor=db_in_cursor,
-                                                      team=fn_team,
-                                                      last_sample_date=self.model_date,
-                                                      n_samples=self.num_samples,
-                                                      normalize_by_matches=True)
+            team_stat = stats_cache.n_sample_stats_for_team(team=fn_team,
+                                                            last_sample_date=self.model_date,
+                                                            n_samples=self.num_samples,
+                                                            normalize_by_matches=True)
 
 
-            return FeatureModel(
-                input_data=[self.home_boost + team_stat.goal_diff, team_stat.goal_diff],
-                            id=team_stat.team_name
-                )
+            return [self.home_boost + team_stat.goal_diff, team_stat.goal_diff]
 
 
         for match_date in played_home_OR_away_before_dates:
@@ -625,7 +738,7 @@ class StatsPredictionPremierLeague(unittest.TestCase):
             self.model_date = match_date - timedelta(days=1)
             self.num_samples = num_matches_in_season
 
-            models: {str: FeatureModel} = FeatureModel.create_models_for_all_teams(
+            models: ModelTable = ModelTable.create_for_all_teams(
                 model_making_fn=create_model_fn, entities=teams)
 
             self.persist_models(model_gen_date=self.model_date, model_description=self.shortDescription(), models=models)
@@ -640,37 +753,49 @@ class StatsPredictionPremierLeague(unittest.TestCase):
         """
 
         def create_model_fn(fn_team: str):
-            team_stat = Stats.n_sample_stats_for_team(cursor=db_in_cursor,
-                                                      team=fn_team,
-                                                      last_sample_date=self.model_date,
-                                                      n_samples=self.num_samples,
-                                                      normalize_by_matches=True)
+            team_stat = stats_cache.n_sample_stats_for_team(team=fn_team,
+                                                            last_sample_date=self.model_date,
+                                                            n_samples=self.num_samples,
+                                                            normalize_by_matches=True)
 
+            return [team_stat.goal_diff, team_stat.goal_diff]
 
-            return FeatureModel(
-                input_data=[self.home_boost + team_stat.goal_diff, team_stat.goal_diff],
-                            id=team_stat.team_name
-                )
+        # The boost only shifts the home models, so build the unboosted models, and get the matches, for each date once
+        # and then work out the predictions for all of the boosts in one go.
+        self.num_samples = num_matches_in_season
+        days = []
+        for match_date in played_home_OR_away_before_dates:
+            self.model_date = match_date - timedelta(days=1)
+            models: ModelTable = ModelTable.create_for_all_teams(model_making_fn=create_model_fn, entities=teams)
+            matches = [ActualResults.unpack_match_result_data(match_data) for match_data in
+                       ActualResults.get_results_data(db_cursor=db_in_cursor, win_size=timedelta(days=0),
+                                                      win_end=match_date)]
+            days.append((match_date, models, matches))
 
-        # TODO: convert this to use crange
-        for i in range(0, 201):
-            boost = i/100
+        sweep = BoostSweep.from_models(
+            models_by_day=[models for (_, models, _) in days],
+            fixtures_by_day=[[(match[1], match[3]) for match in matches] for (_, _, matches) in days],
+            actual_results_by_day=[[match[5] for match in matches] for (_, _, matches) in days])
 
-            for match_date in played_home_OR_away_before_dates:
-                ####
-                #  Build model up to the day before the match
-                ####
-                self.home_boost = boost
-                self.model_date = match_date - timedelta(days=1)
-                self.num_samples = num_matches_in_season
+        # TODO: convert this to use crange
+        boosts = [i/100 for i in range(0, 201)]
+        predictions = sweep.predictions(boosts)
 
-                models: {str: FeatureModel} = FeatureModel.create_models_for_all_teams(
-                    model_making_fn=create_model_fn, entities=teams)
+        for (i, boost) in enumerate(boosts):
+            model_desc = 'gdn_boost_%s' % boost
+            first_fixture = 0
+            for (match_date, models, matches) in days:
+                boosted_features = models.features.copy()
+                boosted_features[:, 0] = boost + boosted_features[:, 0]
+                self.persist_models(model_gen_date=match_date - timedelta(days=1), model_description=model_desc,
+                                    models=ModelTable(ids=models.ids, features=boosted_features))
 
-                model_desc = 'gdn_boost_%s' % boost
-                self.persist_models(model_gen_date=self.model_date, model_description=model_desc, models=models)
+                self.store_predictions_for_date(
+                    match_date=match_date, unseen_matches_data=matches,
+                    predictions=predictions[i, first_fixture:first_fixture + len(matches)], variants=model_desc)
+                first_fixture += len(matches)
 
-                self.make_and_store_predictions_for_date(match_date=match_date, models=models, variants=model_desc)
+        self.check_num_correct_by_variant([int(count) for count in sweep.correct_counts(boosts)])
 
 
 
@@ -713,24 +838,19 @@ class StatsPredictionPremierLeague(unittest.TestCase):
         """
 
         def create_model_fn(fn_team: str):
-            team_stat_home = Stats.n_sample_stats_for_team(cursor=db_in_cursor,
-                                                           team=fn_team,
-                                                           last_sample_date=self.model_date,
-                                                           n_samples=self.num_samples,
-                                                           home_only=True,
-                                                           normalize_by_matches=True)
-
-            team_stat_away = Stats.n_sample_stats_for_team(cursor=db_in_cursor,
-                                                           team=fn_team,
-                                                           last_sample_date=self.model_date,
-                                                           n_samples=self.num_samples,
-                                                           home_only=False,
-                                                           normalize_by_matches=True)
+            team_stat_home = stats_cache.n_sample_stats_for_team(team=fn_team,
+                                                                 last_sample_date=self.model_date,
+                                                                 n_samples=self.num_samples,
+                                                                 home_only=True,
+                                                                 normalize_by_matches=True)
 
-            return FeatureModel(
-                input_data=[team_stat_home.goal_diff, team_stat_away.goal_diff],
-                id=team_stat_home.team_name,
-                )
+            team_stat_away = stats_cache.n_sample_stats_for_team(team=fn_team,
+                                                                 last_sample_date=self.model_date,
+                                                                 n_samples=self.num_samples,
+                                                                 home_only=False,
+                                                                 normalize_by_matches=True)
+
+            return [team_stat_home.goal_diff, team_stat_away.goal_diff]
 
         for match_date in played_home_AND_away_before_dates:
             ####
@@ -739,7 +859,7 @@ class StatsPredictionPremierLeague(unittest.TestCase):
             self.model_date = match_date - timedelta(days=1)
             self.num_samples = num_matches_in_season
 
-            models: {str: FeatureModel} = FeatureModel.create_models_for_all_teams(
+            models: ModelTable = ModelTable.create_for_all_teams(
                 model_making_fn=create_model_fn, entities=teams)
 
             self.persist_models(model_gen_date=self.model_date, model_description=self.shortDescription(), models=models)
@@ -753,36 +873,20 @@ class StatsPredictionPremierLeague(unittest.TestCase):
         windowing approach that routinely discards old results leads to improved performances.
         """
 
-        def create_model_fn(fn_team: str):
-            team_stat = Stats.n_sample_stats_for_team(cursor=db_in_cursor,
-                                                      team=fn_team,
-                                                      last_sample_date=self.model_date,
-                                                      n_samples=self.num_samples,
-                                                      normalize_by_matches=True)
-
-            return FeatureModel(
-                input_data=[(abs(self.home_boost * team_stat.goal_diff) + team_stat.goal_diff) / team_stat.played,
-                            team_stat.goal_diff / team_stat.played],
-                id=team_stat.team_name,
-                )
-
-        for num_samples in range(1, num_matches_in_season+1):
-            for match_date in played_home_OR_away_before_dates:
-                ####
-                #  Build model up to the day before the match
-                ####
-                self.home_boost = 0.0
-                self.model_date = match_date - timedelta(days=1)
-                self.num_samples = num_samples
-
-                models: {str: FeatureModel} = FeatureModel.create_models_for_all_teams(
-                    model_making_fn=create_model_fn, entities=teams)
+        # Every window size and date is independent of the others, so farm them out across processes and just log the
+        # results here, in the same order as nested loops over the window sizes and then the dates.
+        runner = ExperimentRunner(results_db_file=RAW_MATCH_RESULTS_IN_DB_FILE)
+        for result in runner.run(model_making_fn=make_moving_window_goal_diff_models,
+                                 parameters=list(range(1, num_matches_in_season+1)),
+                                 match_dates=played_home_OR_away_before_dates):
+            self.num_samples = result.parameter
+            model_description = '%s - num_samples = %s' % (self.shortDescription(), result.parameter)
+            print(model_description)
+            self.persist_models(model_gen_date=result.model_date, model_description=model_description,
+                                models=result.models)
 
-                model_description = '%s - num_samples = %s' % (self.shortDescription(), num_samples)
-                print(model_description)
-                self.persist_models(model_gen_date=self.model_date, model_description=model_description, models=models)
-
-                self.make_and_store_predictions_for_date(match_date=match_date, models=models, variants=model_description)
+            self.store_predictions_for_date(match_date=result.match_date, unseen_matches_data=result.matches,
+                                            predictions=result.predictions, variants=model_description)
 
 
     def test_200_boosted_goal_difference_for_home_models_with_thresholds(self):
@@ -792,17 +896,13 @@ class StatsPredictionPremierLeague(unittest.TestCase):
         """
 
         def create_model_fn(fn_team: str):
-            team_stat = Stats.n_sample_stats_for_team(cursor=db_in_cursor,
-                                                      team=fn_team,
-                                                      last_sample_date=self.model_date,
-                                                      n_samples=self.num_samples,
-                                                      normalize_by_matches=True)
+            team_stat = stats_cache.n_sample_stats_for_team(team=fn_team,
+                                                            last_sample_date=self.model_date,
+                                                            n_samples=self.num_samples,
+                                                            normalize_by_matches=True)
 
 
-            return FeatureModel(
-                input_data=[self.home_boost + team_stat.goal_diff, team_stat.goal_diff],
-                            id=team_stat.team_name
-                )
+            return [self.home_boost + team_stat.goal_diff, team_stat.goal_diff]
 
 
         for match_date in played_home_OR_away_before_dates:
@@ -813,7 +913,7 @@ class StatsPredictionPremierLeague(unittest.TestCase):
             self.model_date = match_date - timedelta(days=1)
             self.num_samples = num_matches_in_season
 
-            models: {str: FeatureModel} = FeatureModel.create_models_for_all_teams(
+            models: ModelTable = ModelTable.create_for_all_teams(
                 model_making_fn=create_model_fn, entities=teams)
 
             self.persist_models(model_gen_date=self.model_date, model_description=self.shortDescription(), models=models)
@@ -826,17 +926,13 @@ class StatsPredictionPremierLeague(unittest.TestCase):
         """
 
         def create_model_fn(fn_team: str):
-            team_stat = Stats.n_sample_stats_for_team(cursor=db_in_cursor,
-                                                      team=fn_team,
-                                                      last_sample_date=self.model_date,
-                                                      n_samples=self.num_samples,
-                                                      normalize_by_matches=True)
+            team_stat = stats_cache.n_sample_stats_for_team(team=fn_team,
+                                                            last_sample_date=self.model_date,
+                                                            n_samples=self.num_samples,
+                                                            normalize_by_matches=True)
 
 
-            return FeatureModel(
-                input_data=[self.home_boost + team_stat.goal_diff, team_stat.goal_diff],
-                            id=team_stat.team_name
-                )
+            return [self.home_boost + team_stat.goal_diff, team_stat.goal_diff]
 
 
         for match_date in played_home_OR_away_before_dates:
@@ -847,7 +943,7 @@ class StatsPredictionPremierLeague(unittest.TestCase):
             self.model_date = match_date - timedelta(days=1)
             self.num_samples = num_matches_in_season
 
-            models: {str: FeatureModel} = FeatureModel.create_models_for_all_teams(
+            models: ModelTable = ModelTable.create_for_all_teams(
                 model_making_fn=create_model_fn, entities=teams)
 
             self.persist_models(model_gen_date=self.model_date, model_description=self.shortDescription(), models=models)
@@ -863,17 +959,13 @@ class StatsPredictionPremierLeague(unittest.TestCase):
         """
 
         def create_model_fn(fn_team: str):
-            team_stat = Stats.n_sample_stats_for_team(cursor=db_in_cursor,
-                                                      team=fn_team,
-                                                      last_sample_date=self.model_date,
-                                                      n_samples=self.num_samples,
-                                                      normalize_by_matches=True)
+            team_stat = stats_cache.n_sample_stats_for_team(team=fn_team,
+                                                            last_sample_date=self.model_date,
+                                                            n_samples=self.num_samples,
+                                                            normalize_by_matches=True)
 
 
-            return FeatureModel(
-                input_data=[self.home_boost + team_stat.goal_diff, team_stat.goal_diff],
-                            id=team_stat.team_name
-                )
+            return [self.home_boost + team_stat.goal_diff, team_stat.goal_diff]
 
         default_threshold_lower = 0.3
         default_threshold_upper = 0.9
@@ -883,25 +975,34 @@ class StatsPredictionPremierLeague(unittest.TestCase):
         step_size = (explore_range[1] - explore_range[0])/num_steps_wanted
 
         threshold_upper = default_threshold_upper
-        for threshold_lower in StatsPredictionPremierLeague.crange(first=explore_range[0], test=lambda x: x <= explore_range[1],
-                                                             update=lambda x: x + step_size):
-            for match_date in played_home_OR_away_before_dates:
-                ####
-                #  Build model up to the day before the match
-                ####
-                self.home_boost = 0.72
-                self.model_date = match_date - timedelta(days=1)
-                self.num_samples = num_matches_in_season
-
-                models: {str: FeatureModel} = FeatureModel.create_models_for_all_teams(
-                    model_making_fn=create_model_fn, entities=teams)
 
-                self.persist_models(model_gen_date=self.model_date, model_description=self.shortDescription(), models=models)
+        # Only the classification of the predictions changes with the threshold, so make them once and then sweep.
+        self.home_boost = 0.72
+        self.num_samples = num_matches_in_season
+        days = self.make_predictions_for_dates(match_dates=played_home_OR_away_before_dates,
+                                               model_making_fn=create_model_fn)
+        sweep = ThresholdSweep.from_predictions(
+            predictions=[day.predictions for day in days],
+            actual_results=[[actual_result for (*_, actual_result) in day.matches] for day in days])
+
+        draw_ranges = [(threshold_lower, threshold_upper) for threshold_lower in
+                       StatsPredictionPremierLeague.crange(first=explore_range[0], test=lambda x: x <= explore_range[1],
+                                                           update=lambda x: x + step_size)]
+        logging.info('Best (lower, upper, accuracy) %s' % (sweep.best(
+            lowers=[lower for (lower, _) in draw_ranges], uppers=[upper for (_, upper) in draw_ranges]),))
+
+        for draw_range in draw_ranges:
+            for day in days:
+                self.persist_models(model_gen_date=day.model_date, model_description=self.shortDescription(),
+                                    models=day.models)
 
                 # variant_string = 'threshold_lower=%f, threshold_upper=%f' % (threshold_lower, threshold_upper)
-                self.make_and_store_predictions_for_date(match_date=match_date, models=models, draw_range=(threshold_lower, threshold_upper),
-                                                         variants=threshold_lower)
+                self.store_predictions_for_date(match_date=day.match_date, unseen_matches_data=day.matches,
+                                                predictions=day.predictions, draw_range=draw_range,
+                                                variants=draw_range[0])
 
+        self.check_num_correct_by_variant(
+            [int(sweep.correct_counts([lower], [upper])[0, 0]) for (lower, upper) in draw_ranges])
 
     def test_220_boosted_goal_difference_for_home_models_with_various_upper_home_win_threshold(self):
         """ Giving the home team a 0.72 head start, 0.72 determined from 071, with various upper thresholds. This is
@@ -910,17 +1011,13 @@ class StatsPredictionPremierLeague(unittest.TestCase):
         """
 
         def create_model_fn(fn_team: str):
-            team_stat = Stats.n_sample_stats_for_team(cursor=db_in_cursor,
-                                                      team=fn_team,
-                                                      last_sample_date=self.model_date,
-                                                      n_samples=self.num_samples,
-                                                      normalize_by_matches=True)
+            team_stat = stats_cache.n_sample_stats_for_team(team=fn_team,
+                                                            last_sample_date=self.model_date,
+                                                            n_samples=self.num_samples,
+                                                            normalize_by_matches=True)
 
 
-            return FeatureModel(
-                input_data=[self.home_boost + team_stat.goal_diff, team_stat.goal_diff],
-                            id=team_stat.team_name
-                )
+            return [self.home_boost + team_stat.goal_diff, team_stat.goal_diff]
 
         default_threshold_lower = 0.3
         default_threshold_upper = 0.9
@@ -930,22 +1027,31 @@ class StatsPredictionPremierLeague(unittest.TestCase):
         step_size = (explore_range[1] - explore_range[0])/num_steps_wanted
 
         threshold_lower = default_threshold_lower
-        for threshold_upper in StatsPredictionPremierLeague.crange(first=explore_range[0], test=lambda x: x <= explore_range[1],
-                                                             update=lambda x: x + step_size):
-            for match_date in played_home_OR_away_before_dates:
-                ####
-                #  Build model up to the day before the match
-                ####
-                self.home_boost = 0.72
-                self.model_date = match_date - timedelta(days=1)
-                self.num_samples = num_matches_in_season
-
-                models: {str: FeatureModel} = FeatureModel.create_models_for_all_teams(
-                    model_making_fn=create_model_fn, entities=teams)
 
-                self.persist_models(model_gen_date=self.model_date, model_description=self.shortDescription(), models=models)
+        # Only the classification of the predictions changes with the threshold, so make them once and then sweep.
+        self.home_boost = 0.72
+        self.num_samples = num_matches_in_season
+        days = self.make_predictions_for_dates(match_dates=played_home_OR_away_before_dates,
+                                               model_making_fn=create_model_fn)
+        sweep = ThresholdSweep.from_predictions(
+            predictions=[day.predictions for day in days],
+            actual_results=[[actual_result for (*_, actual_result) in day.matches] for day in days])
+
+        draw_ranges = [(threshold_lower, threshold_upper) for threshold_upper in
+                       StatsPredictionPremierLeague.crange(first=explore_range[0], test=lambda x: x <= explore_range[1],
+                                                           update=lambda x: x + step_size)]
+        logging.info('Best (lower, upper, accuracy) %s' % (sweep.best(
+            lowers=[lower for (lower, _) in draw_ranges], uppers=[upper for (_, upper) in draw_ranges]),))
+
+        for draw_range in draw_ranges:
+            for day in days:
+                self.persist_models(model_gen_date=day.model_date, model_description=self.shortDescription(),
+                                    models=day.models)
 
                 # variant_string = 'threshold_lower=%f, threshold_upper=%f' % (threshold_lower, threshold_upper)
-                self.make_and_store_predictions_for_date(match_date=match_date, models=models, draw_range=(threshold_lower, threshold_upper),
-                                                         variants=threshold_upper)
+                self.store_predictions_for_date(match_date=day.match_date, unseen_matches_data=day.matches,
+                                                predictions=day.predictions, draw_range=draw_range,
+                                                variants=draw_range[1])
 
+        self.check_num_correct_by_variant(
+            [int(sweep.correct_counts([lower], [upper])[0, 0]) for (lower, upper) in draw_ranges])
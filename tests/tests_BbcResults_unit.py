@@ -0,0 +1,130 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import date
+
+from BbcResultsLib import DEFAULT_PARSER, SQL_CREATE_TABLE, SQL_UPSERT, get_match_date, latest_result_date, \
+    parse_results_files, parse_results_page, results_page_files
+from SchemaLib import ensure_natural_key
+
+RESULTS_PAGE_FIXTURE = os.path.join(os.path.dirname(__file__), 'fixture', 'bbc_results_2017_05_21.html')
+RESULTS_FIXTURE_DATA = os.path.join(os.path.dirname(__file__), 'fixture', 'results_2017_04_28.db')
+
+EXPECTED_RESULTS = [('2017-05-21', 'Arsenal', 3, 'Everton', 1),
+                    ('2017-05-21', 'Burnley', 1, 'West Ham United', 2),
+                    ('2017-05-19', 'Tottenham Hotspur', 1, 'Hull City', 1),
+                    ('2017-05-17', 'Sunderland', 0, 'Chelsea', 1),
+                    ('2017-05-17', 'Southampton', 0, 'Manchester United', 0)]
+
+SQL_ALL_RESULTS = 'SELECT date, home_team, home_score, away_team, away_score FROM results ORDER BY id'
+
+
+class BbcResultsTests(unittest.TestCase):
+
+    def setUp(self):
+        global page_data
+        with open(RESULTS_PAGE_FIXTURE) as page_file:
+            page_data = page_file.read()
+        global db_connection
+        db_connection = sqlite3.connect(':memory:')
+        global db_cursor
+        db_cursor = db_connection.cursor()
+        db_cursor.execute(SQL_CREATE_TABLE)
+        ensure_natural_key(db_cursor)
+
+    def tearDown(self):
+        db_connection.close()
+
+    def test_parse_results_page(self):
+        self.assertEqual(EXPECTED_RESULTS, parse_results_page(page_data))
+
+    def test_parsers(self):
+        self.assertEqual(EXPECTED_RESULTS, parse_results_page(page_data, parser='html.parser'))
+        self.assertEqual(EXPECTED_RESULTS, parse_results_page(page_data, parser=DEFAULT_PARSER))
+
+    def test_ignores_other_tables(self):
+        other_table = '<table class="table-stats"><caption>League table</caption><tbody><tr>' \
+                      '<td class="match-details">Not a result</td></tr></tbody></table>'
+        self.assertEqual(EXPECTED_RESULTS, parse_results_page(page_data.replace('<body>', '<body>' + other_table)))
+
+    def test_get_match_date(self):
+        self.assertEqual(date(2016, 10, 17), get_match_date('\n           Monday 17th October 2016    '))
+        self.assertEqual(date(2017, 5, 1), get_match_date('Monday 1st May 2017'))
+
+    def test_stop_before(self):
+        self.assertEqual(EXPECTED_RESULTS[:3], parse_results_page(page_data, stop_before=date(2017, 5, 19)))
+        self.assertEqual([], parse_results_page(page_data, stop_before=date(2017, 5, 22)))
+
+    def test_parse_results_files(self):
+        with tempfile.TemporaryDirectory() as archive_dir:
+            # Two seasons' worth, where the later page also has a corrected score for one of the earlier matches.
+            earlier_season = page_data.replace('2017', '2016')
+            later_season = page_data.replace('3-1', '4-1') + earlier_season.replace('0-0', '2-2')
+            for (file_name, data) in [('results_2016.html', earlier_season), ('results_2017.html', later_season),
+                                      ('notes.txt', 'Not a results page')]:
+                with open(os.path.join(archive_dir, file_name), 'w') as archive_file:
+                    archive_file.write(data)
+
+            results_files = results_page_files(archive_dir)
+            self.assertEqual(['results_2016.html', 'results_2017.html'],
+                             [os.path.basename(file_name) for file_name in results_files])
+            self.assertEqual(results_files, results_page_files(os.path.join(archive_dir, 'results_*.html')))
+
+            for max_workers in [0, 2]:
+                with self.subTest(max_workers=max_workers):
+                    results = parse_results_files(results_files, max_workers=max_workers)
+                    self.assertEqual(10, len(results))
+                    self.assertEqual(sorted(result[0] for result in results), [result[0] for result in results])
+                    self.assertIn(('2016-05-17', 'Southampton', 2, 'Manchester United', 2), results)
+                    self.assertIn(('2017-05-21', 'Arsenal', 4, 'Everton', 1), results)
+
+    def test_latest_result_date(self):
+        self.assertIsNone(latest_result_date(db_cursor))
+        db_cursor.executemany(SQL_UPSERT, EXPECTED_RESULTS)
+        self.assertEqual(date(2017, 5, 21), latest_result_date(db_cursor))
+
+    def test_upsert(self):
+        db_cursor.executemany(SQL_UPSERT, EXPECTED_RESULTS[2:])
+        # Re-scraping a match updates its score rather than adding it again.
+        db_cursor.executemany(SQL_UPSERT, [('2017-05-19', 'Tottenham Hotspur', 2, 'Hull City', 1)] +
+                              EXPECTED_RESULTS[:2])
+
+        self.assertEqual([('2017-05-19', 'Tottenham Hotspur', 2, 'Hull City', 1)] + EXPECTED_RESULTS[3:] +
+                         EXPECTED_RESULTS[:2], db_cursor.execute(SQL_ALL_RESULTS).fetchall())
+
+    def test_natural_key_refuses_duplicates(self):
+        with sqlite3.connect(':memory:') as fixture_db_connection:
+            with sqlite3.connect(RESULTS_FIXTURE_DATA) as fixture_connection:
+                fixture_db_connection.executescript('\n'.join(fixture_connection.iterdump()))
+            fixture_db_cursor = fixture_db_connection.cursor()
+            num_results = fixture_db_cursor.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+            fixture_db_cursor.execute('INSERT INTO results(date, home_team, home_score, away_team, away_score) '
+                                      'SELECT date, home_team, home_score, away_team, away_score FROM results LIMIT 3')
+
+            with self.assertRaisesRegex(ValueError, '^3 duplicate results'):
+                ensure_natural_key(fixture_db_cursor)
+            # Nothing deleted and no key.
+            self.assertEqual(num_results + 3,
+                             fixture_db_cursor.execute('SELECT COUNT(*) FROM results').fetchone()[0])
+            fixture_db_cursor.execute('INSERT INTO results(date, home_team, home_score, away_team, away_score) '
+                                      'SELECT date, home_team, home_score, away_team, away_score FROM results LIMIT 1')
+
+    def test_natural_key_dedupe(self):
+        with sqlite3.connect(':memory:') as fixture_db_connection:
+            with sqlite3.connect(RESULTS_FIXTURE_DATA) as fixture_connection:
+                fixture_db_connection.executescript('\n'.join(fixture_connection.iterdump()))
+            fixture_db_cursor = fixture_db_connection.cursor()
+            num_results = fixture_db_cursor.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+            fixture_db_cursor.execute('INSERT INTO results(date, home_team, home_score, away_team, away_score) '
+                                      'SELECT date, home_team, home_score, away_team, away_score FROM results LIMIT 3')
+
+            ensure_natural_key(fixture_db_cursor, dedupe=True)
+            self.assertEqual(num_results, fixture_db_cursor.execute('SELECT COUNT(*) FROM results').fetchone()[0])
+            self.assertRaises(sqlite3.IntegrityError, fixture_db_cursor.execute,
+                              'INSERT INTO results(date, home_team, home_score, away_team, away_score) '
+                              'SELECT date, home_team, home_score, away_team, away_score FROM results LIMIT 1')
+
+
+if __name__ == '__main__':
+    unittest.main()
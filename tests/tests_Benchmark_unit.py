@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+
+from BenchmarkLib import compare_to_baseline, format_report, load_baseline, save_baseline, summarise, time_benchmark
+
+
+class BenchmarkTests(unittest.TestCase):
+
+    def test_summarise(self):
+        result = summarise('sleepy', [0.001 * i for i in range(1, 101)], items_per_iteration=10)
+        self.assertEqual(100, result.iterations)
+        self.assertAlmostEqual(0.0505, result.p50)
+        self.assertAlmostEqual(0.0901, result.p90)
+        self.assertAlmostEqual(0.09901, result.p99)
+        self.assertAlmostEqual(10 / 0.0505, result.throughput)
+
+    def test_time_benchmark(self):
+        calls = []
+        setups = []
+        result = time_benchmark('calls', calls.append, iterations=5, warmup=2, setup_fn=lambda: setups.append(None))
+        self.assertEqual([0, 1, 0, 1, 2, 3, 4], calls)
+        self.assertEqual(7, len(setups))
+        self.assertEqual(5, result.iterations)
+
+    def test_compare_to_baseline(self):
+        with tempfile.TemporaryDirectory() as baseline_dir:
+            baseline_file = os.path.join(baseline_dir, 'baseline.json')
+            save_baseline(baseline_file, [summarise('a', [1.0]), summarise('b', [1.0])], dataset='results.db',
+                          description='test')
+            baseline = load_baseline(baseline_file, dataset='results.db')
+            self.assertEqual({}, load_baseline(baseline_file, dataset='other_results.db'))
+
+        comparisons = compare_to_baseline([summarise('a', [1.2]), summarise('b', [1.6]), summarise('c', [1.0])],
+                                          baseline, tolerance=0.5)
+        self.assertEqual([('a', 1.2, False), ('b', 1.6, True), ('c', None, False)],
+                         [(result.name, ratio if ratio is None else round(ratio, 6), regressed)
+                          for (result, ratio, regressed) in comparisons])
+        self.assertIn('REGRESSION', format_report(comparisons).splitlines()[2])
+
+    def test_compare_to_baseline_allows_for_reference(self):
+        baseline = {'a': summarise('a', [1.0])._replace(reference_p50=1.0)._asdict()}
+        # Taking twice as long when the reference does too, e.g. on a slower machine, isn't a regression.
+        for (timing, reference_p50, expected) in [(2.0, 2.0, (1.0, False)), (2.0, 1.0, (2.0, True)),
+                                                  (2.0, None, (2.0, True)), (1.0, 0.5, (2.0, True))]:
+            with self.subTest(timing=timing, reference_p50=reference_p50):
+                [(_, ratio, regressed)] = compare_to_baseline(
+                    [summarise('a', [timing])._replace(reference_p50=reference_p50)], baseline, tolerance=0.5)
+                self.assertEqual(expected, (round(ratio, 6), regressed))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from BulkWriterLib import BulkWriter, configure_scratch_db
+
+SQL_CREATE_TABLE = 'CREATE TABLE log (id INTEGER PRIMARY KEY, name TEXT NOT NULL, value INTEGER)'
+SQL_INSERT = 'INSERT INTO log (name, value) VALUES (:name, :value)'
+SQL_COUNT = 'SELECT COUNT(*) FROM log'
+
+
+class BulkWriterTests(unittest.TestCase):
+
+    def setUp(self):
+        global db_dir
+        db_dir = tempfile.TemporaryDirectory()
+        global db_file
+        db_file = os.path.join(db_dir.name, 'log.db')
+        global db_connection
+        db_connection = sqlite3.connect(db_file)
+        configure_scratch_db(db_connection)
+        db_connection.execute(SQL_CREATE_TABLE)
+
+    def tearDown(self):
+        db_connection.close()
+        db_dir.cleanup()
+
+    @staticmethod
+    def committed_count() -> int:
+        """ Count as seen by another connection, i.e. only what has been committed."""
+        with sqlite3.connect(db_file) as other_connection:
+            return other_connection.execute(SQL_COUNT).fetchone()[0]
+
+    def test_scratch_db_pragmas(self):
+        self.assertEqual('wal', db_connection.execute('PRAGMA journal_mode').fetchone()[0])
+        self.assertEqual(1, db_connection.execute('PRAGMA synchronous').fetchone()[0])  # 1 == NORMAL
+
+    def test_buffers_until_batch_size(self):
+        writer = BulkWriter(db_connection, SQL_INSERT, batch_size=3, commit_every=6)
+        writer.add({'name': 'a', 'value': 1})
+        writer.add({'name': 'b', 'value': 2})
+        self.assertEqual(0, db_connection.execute(SQL_COUNT).fetchone()[0])
+
+        writer.add({'name': 'c', 'value': 3})
+        self.assertEqual(3, db_connection.execute(SQL_COUNT).fetchone()[0])
+        self.assertEqual(0, self.committed_count())
+
+    def test_commits_every(self):
+        writer = BulkWriter(db_connection, SQL_INSERT, batch_size=2, commit_every=4)
+        writer.add_many([{'name': str(i), 'value': i} for i in range(5)])
+        self.assertEqual(4, self.committed_count())
+        self.assertEqual(4, db_connection.execute(SQL_COUNT).fetchone()[0])
+
+        writer.close()
+        self.assertEqual(5, self.committed_count())
+        self.assertEqual(5, writer.rows_written)
+
+    def test_caller_commits(self):
+        writer = BulkWriter(db_connection, SQL_INSERT, batch_size=2, commit_every=None)
+        writer.add_many([{'name': str(i), 'value': i} for i in range(5)])
+        writer.close()
+        self.assertEqual(0, self.committed_count())
+        self.assertEqual(5, writer.rows_written)
+
+        db_connection.commit()
+        self.assertEqual(5, self.committed_count())
+
+    def test_keeps_order(self):
+        with BulkWriter(db_connection, SQL_INSERT, batch_size=3) as writer:
+            writer.add_many([{'name': str(i), 'value': i} for i in range(10)])
+
+        self.assertEqual([(i + 1, str(i), i) for i in range(10)],
+                         db_connection.execute('SELECT id, name, value FROM log ORDER BY id').fetchall())
+
+    def test_tuple_rows(self):
+        with BulkWriter(db_connection, 'INSERT INTO log (name, value) VALUES (?, ?)') as writer:
+            writer.add(('a', 1))
+        self.assertEqual(1, self.committed_count())
+
+    def test_rolls_back_on_error(self):
+        with self.assertRaises(RuntimeError):
+            with BulkWriter(db_connection, SQL_INSERT, batch_size=1) as writer:
+                writer.add({'name': 'a', 'value': 1})
+                raise RuntimeError('Oops')
+
+        self.assertEqual(0, db_connection.execute(SQL_COUNT).fetchone()[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import sqlite3
+import unittest
+from datetime import date, timedelta
+
+from ActualResultsLib import ActualResults
+from ExperimentLib import ExperimentRunner, ExperimentWorker, connect_read_only
+from FeatureLib import FootballMatchPredictor, ModelTable
+
+RESULTS_FIXTURE_DATA = os.path.join(os.path.dirname(__file__), 'fixture', 'results_2017_04_28.db')
+
+MATCH_DATES = [date(2016, 9, 10), date(2016, 9, 11), date(2016, 12, 31)]
+HOME_BOOSTS = [0.0, 0.72]
+
+
+def make_boosted_goal_diff_models(worker: ExperimentWorker, home_boost: float, model_date: date) -> ModelTable:
+    team_stats = worker.season_matrix.n_sample_stats_for_teams(teams=worker.season_matrix.teams, n_samples=-1,
+                                                               last_sample_date=model_date, normalize_by_matches=True)
+    return ModelTable(ids=[team_stat.team_name for team_stat in team_stats],
+                      features=[[home_boost + team_stat.goal_diff, team_stat.goal_diff] for team_stat in team_stats])
+
+
+class ExperimentRunnerTests(unittest.TestCase):
+
+    def setUp(self):
+        global db_connection
+        db_connection = sqlite3.connect(RESULTS_FIXTURE_DATA)
+        db_connection.row_factory = sqlite3.Row
+        global db_cursor
+        db_cursor = db_connection.cursor()
+
+    def tearDown(self):
+        db_connection.close()
+
+    def expected_results(self):
+        worker = ExperimentWorker(RESULTS_FIXTURE_DATA)
+        expected = []
+        for home_boost in HOME_BOOSTS:
+            for match_date in MATCH_DATES:
+                model_date = match_date - timedelta(days=1)
+                models = make_boosted_goal_diff_models(worker, home_boost, model_date)
+                matches = [ActualResults.unpack_match_result_data(match_data) for match_data in
+                           ActualResults.get_results_data(db_cursor=db_cursor, win_size=timedelta(days=0),
+                                                          win_end=match_date)]
+                predictions = FootballMatchPredictor(models=models).predict_many(
+                    fixtures=[(match[1], match[3]) for match in matches])
+                expected.append((home_boost, match_date, model_date, {team: str(models[team]) for team in models},
+                                 matches, predictions.tolist()))
+        worker.db_connection.close()
+        return expected
+
+    def assertResultsEqual(self, expected, results):
+        self.assertEqual(expected, [(result.parameter, result.match_date, result.model_date, result.models,
+                                     result.matches, result.predictions.tolist()) for result in results])
+
+    def test_in_process(self):
+        runner = ExperimentRunner(results_db_file=RESULTS_FIXTURE_DATA, max_workers=0)
+        results = list(runner.run(model_making_fn=make_boosted_goal_diff_models, parameters=HOME_BOOSTS,
+                                  match_dates=MATCH_DATES))
+        self.assertResultsEqual(self.expected_results(), results)
+
+    def test_process_pool_keeps_order(self):
+        runner = ExperimentRunner(results_db_file=RESULTS_FIXTURE_DATA, max_workers=2, chunk_size=1)
+        results = list(runner.run(model_making_fn=make_boosted_goal_diff_models, parameters=HOME_BOOSTS,
+                                  match_dates=MATCH_DATES))
+        self.assertResultsEqual(self.expected_results(), results)
+
+    def test_no_matches_on_date(self):
+        runner = ExperimentRunner(results_db_file=RESULTS_FIXTURE_DATA, max_workers=0)
+        [result] = list(runner.run(model_making_fn=make_boosted_goal_diff_models, parameters=[0.0],
+                                   match_dates=[date(2016, 9, 13)]))
+        self.assertEqual([], result.matches)
+        self.assertEqual(0, len(result.predictions))
+
+    def test_workers_are_read_only(self):
+        db_connection_ro = connect_read_only(RESULTS_FIXTURE_DATA)
+        with self.assertRaises(sqlite3.OperationalError):
+            db_connection_ro.execute('DELETE FROM results')
+        db_connection_ro.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
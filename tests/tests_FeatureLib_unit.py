@@ -6,7 +6,8 @@ from math import sqrt
 
 import numpy as np
 
-from FeatureLib import Feature, FeatureModel, FootballMatchPredictor
+from FeatureLib import Feature, FeatureModel, FootballMatchPredictor, ModelTable
+from SeasonMatrixLib import SeasonMatrix
 from StatsLib import Stats
 
 RESULTS_FIXTURE_DATA = os.path.join(os.path.dirname(__file__), 'fixture','results_2017_04_28.db')
@@ -90,6 +91,54 @@ class FeatureModelTests(unittest.TestCase):
         self.assertEqual(b.id, 'Bob')
         self.assertGreater(b, a)
 
+    def test_views_keep_metadata(self):
+        a = FeatureModel(input_data=[1, 2], id='Andy', good_data=False, bad_data_reason='Testing')
+        b = a[:1]
+        self.assertEqual('Andy', b.id)
+        self.assertEqual(False, b.good_data)
+        self.assertEqual('Testing', b.bad_data_reason)
+        self.assertEqual([1, 2], b.input_data)
+
+
+class ModelTableTests(unittest.TestCase):
+
+    def test_table_from_models(self):
+        models = {m.id: m for m in [FeatureModel(input_data=[1, 2], id='Andy'),
+                                    FeatureModel(input_data=[3, 4], id='Bob', good_data=False,
+                                                 bad_data_reason='Testing')]}
+        table = ModelTable.from_models(models)
+
+        self.assertEqual((2, 2), table.features.shape)
+        self.assertTrue(table.features.flags['C_CONTIGUOUS'])
+        self.assertEqual(['Andy', 'Bob'], list(table))
+        self.assertEqual([False, True], list(table.bad_data))
+
+    def test_rows_are_feature_model_views(self):
+        table = ModelTable(ids=['Andy', 'Bob'], features=[[1, 2], [3, 4]], good_data=[True, False],
+                           bad_data_reasons=[None, 'Testing'])
+        bob = table['Bob']
+
+        self.assertIsInstance(bob, FeatureModel)
+        self.assertEqual('Bob', bob.id)
+        self.assertEqual(False, bob.good_data)
+        self.assertEqual('Testing', bob.bad_data_reason)
+        self.assertEqual([3, 4], list(bob))
+
+        table.features[1, 0] = 5
+        self.assertEqual([5, 4], list(bob))
+        self.assertRaises(KeyError, table.__getitem__, 'Nobody')
+
+    def test_create_for_all_teams(self):
+        table = ModelTable.create_for_all_teams(model_making_fn=lambda team: [len(team), -len(team)],
+                                                entities=['Andy', 'Bob'])
+        self.assertEqual([[4, -4], [3, -3]], table.features.tolist())
+        self.assertEqual([None, None], list(table.good_data))
+
+    def test_single_feature_models(self):
+        table = ModelTable.from_models({'Andy': FeatureModel(input_data=1, id='Andy'),
+                                        'Bob': FeatureModel(input_data=[2], id='Bob')})
+        self.assertEqual((2, 1), table.features.shape)
+
 
 class FootballMatchPredictorTests(unittest.TestCase):
 
@@ -146,6 +195,79 @@ class FootballMatchPredictorTests(unittest.TestCase):
         actual = FootballMatchPredictor(models=models).predict(home_team=team_a, away_team=team_b)
         self.assertEqual(expect, actual)
 
+    def test_predict_many_matches_predict(self):
+        teams = ['Mudchester United', 'Bogglington Stanley Rovers', 'Real Sociable', 'Inter Nationale']
+        fixtures = [(home, away) for home in teams for away in teams if home != away]
+
+        for features in ([[1], [2], [2], [-0.5]], [[1, 1], [2, 0], [0.5, 0.25], [-1, 3]]):
+            models = {team: FeatureModel(input_data=feature, id=team) for team, feature in zip(teams, features)}
+            for (boost, threshold) in [(0.0, 0.0), (0.72, 0.0), (0.0, 0.6), (0.5, 1.2)]:
+                predictor = FootballMatchPredictor(models=models, home_advantage_boost=boost,
+                                                   decision_threshold=threshold)
+                with self.subTest(features=features, boost=boost, threshold=threshold):
+                    predictions = predictor.predict_many(fixtures)
+                    for (home, away), prediction in zip(fixtures, predictions):
+                        (e_result, e_distance, e_explanation) = predictor.predict(home_team=home, away_team=away)
+                        self.assertEqual((home, away), (prediction['home_team'], prediction['away_team']))
+                        self.assertEqual(e_result, prediction['predicted_result'])
+                        self.assertAlmostEqual(float(np.squeeze(e_distance)), prediction['distance'])
+                        self.assertEqual(e_explanation, prediction['bad_data_explanation'])
+
+    def test_predict_and_predict_many_with_model_table(self):
+        team_a = 'Mudchester United'
+        team_b = 'Bogglington Stanley Rovers'
+        table = ModelTable(ids=[team_a, team_b], features=[[1, 1], [2, 0]])
+        predictor = FootballMatchPredictor(models=table)
+
+        self.assertEqual(('home_win', 1, None), predictor.predict(home_team=team_a, away_team=team_b))
+        prediction = predictor.predict_many([(team_a, team_b)])[0]
+        self.assertEqual(('home_win', 1, None), (prediction['predicted_result'], prediction['distance'],
+                                                 prediction['bad_data_explanation']))
+
+    def test_predict_many_bad_data(self):
+        team_a = 'Mudchester United'
+        team_b = 'Bogglington Stanley Rovers'
+        team_c = 'Real Sociable'
+        why_bad = 'Testing'
+        models = {m.id: m for m in [FeatureModel(input_data=[1], id=team_a, good_data=True),
+                                    FeatureModel(input_data=[2], id=team_b, good_data=False, bad_data_reason=why_bad),
+                                    FeatureModel(input_data=[3], id=team_c, good_data=False)]}
+
+        predictions = FootballMatchPredictor(models=models).predict_many([(team_a, team_b), (team_b, team_c),
+                                                                          (team_a, team_a)])
+        self.assertEqual('Bad model for %s - %s' % (team_b, why_bad), predictions[0]['bad_data_explanation'])
+        self.assertEqual('Bad model for %s - %s, Bad model for %s - No reason given' % (team_b, why_bad, team_c),
+                         predictions[1]['bad_data_explanation'])
+        self.assertIsNone(predictions[2]['bad_data_explanation'])
+
+    def test_predict_many_team_ids(self):
+        with sqlite3.connect(RESULTS_FIXTURE_DATA) as db_conn:
+            season_matrix = SeasonMatrix(db_conn.cursor())
+
+        # Models sharing the season matrix's team ids, so its matches can be predicted without going back to names.
+        models = ModelTable.create_for_all_teams(
+            model_making_fn=lambda team: [season_matrix.n_sample_stats_for_team(
+                team=team, n_samples=10, last_sample_date=date(2017, 1, 1), home_only=home_only).goal_diff
+                                          for home_only in (True, False)],
+            entities=season_matrix.team_ids)
+        self.assertIs(season_matrix.team_ids, models.team_ids)
+
+        predictor = FootballMatchPredictor(models=models)
+        fixtures = np.stack([season_matrix.home_ids, season_matrix.away_ids], axis=1)
+        by_id = predictor.predict_many(fixtures)
+        by_name = predictor.predict_many([(season_matrix.team_ids.name(home_id), season_matrix.team_ids.name(away_id))
+                                          for (home_id, away_id) in fixtures])
+        self.assertEqual(by_name.tolist(), by_id.tolist())
+
+        self.assertRaises(KeyError, predictor.predict_many, np.array([[0, len(season_matrix.teams)]]))
+        self.assertRaises(AssertionError, ModelTable, ids=['Arsenal', 'Burnley'], features=[1, 2],
+                          team_ids=season_matrix.team_ids)
+
+    def test_predict_many_unknown_team(self):
+        models = {'Mudchester United': FeatureModel(input_data=[1], id='Mudchester United')}
+        self.assertRaises(KeyError, FootballMatchPredictor(models=models).predict_many,
+                          [('Mudchester United', 'Nowhere Town')])
+
     def test_create_models(self):
         """
         """
@@ -3,6 +3,9 @@ import unittest
 import sqlite3
 from datetime import date
 
+import numpy as np
+
+from FeatureLib import FeatureModelRanking
 from StatsLib import Stats, create_league_using_windowed_stats
 
 RESULTS_FIXTURE_DATA = os.path.join(os.path.dirname(__file__), 'fixture','results_2017_04_28.db')
@@ -207,6 +210,75 @@ class LeagueGenerationUsingPremierLeagueRules(unittest.TestCase):
         pos_found = league.id2ranking[team]
         self.assertEqual(pos_expected, pos_found)
 
+    def test_league_points_then_goal_diff(self):
+        league = create_league_using_windowed_stats(cursor=db_cursor, teams=TEAMS, win_size=2,
+                                                    win_end_date=date(2017, 4, 28),
+                                                    stats_ranking_function=lambda stats: (stats.points,
+                                                                                          stats.goal_diff))
+        expected = create_league_using_windowed_stats(cursor=db_cursor, teams=TEAMS, win_size=2,
+                                                      win_end_date=date(2017, 4, 28),
+                                                      stats_ranking_function=Stats.premier_league_ranking_fn)
+        self.assertEqual([[row[0], *list(row[1])] for row in expected], [[row[0], *list(row[1])] for row in league])
+        self.assertEqual(expected.id2ranking, league.id2ranking)
+
+
+class CompetitionRanks(unittest.TestCase):
+
+    def test_ties_share_the_best_place(self):
+        (ranks, order) = FeatureModelRanking.competition_ranks([3, 7, 3, 9, 7, 1])
+        self.assertEqual([4, 2, 4, 1, 2, 6], ranks.tolist())
+        # Level teams stay in the order they were given.
+        self.assertEqual([3, 1, 4, 0, 2, 5], order.tolist())
+
+    def test_tie_breakers(self):
+        points = [6, 6, 4, 6, 4]
+        goal_diff = [1, 3, 0, 1, -2]
+        (ranks, order) = FeatureModelRanking.competition_ranks(points, goal_diff)
+        self.assertEqual([2, 1, 4, 2, 5], ranks.tolist())
+        self.assertEqual([1, 0, 3, 2, 4], order.tolist())
+
+    def test_many_dates(self):
+        random_state = np.random.RandomState(0)
+        points = random_state.randint(0, 10, (50, 20))
+        goal_diff = random_state.randint(-3, 4, (50, 20))
+        (ranks, order) = FeatureModelRanking.competition_ranks(points, goal_diff)
+        self.assertEqual((50, 20), ranks.shape)
+
+        for (day, (day_points, day_goal_diff)) in enumerate(zip(points, goal_diff)):
+            with self.subTest(day=day):
+                (day_ranks, day_order) = FeatureModelRanking.competition_ranks(day_points, day_goal_diff)
+                self.assertEqual(day_ranks.tolist(), ranks[day].tolist())
+                self.assertEqual(day_order.tolist(), order[day].tolist())
+                # Same as sorting the teams by hand, best first and keeping the given order when level.
+                expected_order = sorted(range(20), key=lambda t: (day_points[t], day_goal_diff[t]), reverse=True)
+                self.assertEqual(expected_order, day_order.tolist())
+
+    def test_empty(self):
+        (ranks, order) = FeatureModelRanking.competition_ranks([])
+        self.assertEqual([], ranks.tolist())
+        self.assertEqual([], list(FeatureModelRanking(input_data=[], feature_making_fn=lambda x: x)))
+
+    def test_feature_models_made_once(self):
+        calls = []
+
+        def feature_making_fn(data):
+            calls.append(data)
+            return data[1]
+
+        ranking = FeatureModelRanking(input_data=[('a', 3), ('b', 7), ('c', 5)], feature_making_fn=feature_making_fn,
+                                      id_fn=lambda data: data[0])
+        num_ranking_calls = len(calls)
+        feature_models = ranking.feature_models
+        self.assertEqual(['b', 'c', 'a'], [feature_model.id for feature_model in feature_models])
+        self.assertIs(feature_models, ranking.feature_models)
+        self.assertEqual(num_ranking_calls + 3, len(calls))
+
+        # Built from the same FeatureModels, rather than making more.
+        self.assertEqual({id(feature_model) for feature_model in feature_models},
+                         {id(feature_model) for feature_model in ranking.id2feature_models.values()})
+        self.assertIs(ranking.id2feature_models, ranking.id2feature_models)
+        self.assertEqual(num_ranking_calls + 3, len(calls))
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,152 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import date
+
+import numpy as np
+
+from FeatureStoreLib import FeatureStore
+from SeasonMatrixLib import SeasonMatrix
+
+RESULTS_FIXTURE_DATA = os.path.join(os.path.dirname(__file__), 'fixture', 'results_2017_04_28.db')
+
+WINDOWS = [1, 2, 5, 38, -1]
+
+
+class FeatureStoreTests(unittest.TestCase):
+
+    def setUp(self):
+        global db_connection
+        db_connection = sqlite3.connect(':memory:')
+        with sqlite3.connect(RESULTS_FIXTURE_DATA) as fixture_connection:
+            db_connection.executescript('\n'.join(fixture_connection.iterdump()))
+        db_connection.row_factory = sqlite3.Row
+        global db_cursor
+        db_cursor = db_connection.cursor()
+        global store_dir
+        store_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        db_connection.close()
+        store_dir.cleanup()
+
+    def assertStoreMatchesSeasonMatrix(self, feature_store: FeatureStore):
+        season_matrix = SeasonMatrix(db_cursor)
+        teams = season_matrix.teams + ['Nowhere Town']
+        for last_sample_date in [date(2016, 8, 12), date(2016, 8, 14), date(2016, 9, 23), date(2016, 12, 31),
+                                 date(2017, 4, 28)]:
+            for n_samples in WINDOWS:
+                for home_only in FeatureStore.SPLITS:
+                    with self.subTest(last_sample_date=last_sample_date, n_samples=n_samples, home_only=home_only):
+                        expected = season_matrix.n_sample_stats_for_teams(teams=teams, n_samples=n_samples,
+                                                                          last_sample_date=last_sample_date,
+                                                                          home_only=home_only,
+                                                                          normalize_by_matches=True)
+                        actual = feature_store.n_sample_stats_for_teams(teams=teams, n_samples=n_samples,
+                                                                        last_sample_date=last_sample_date,
+                                                                        home_only=home_only,
+                                                                        normalize_by_matches=True)
+                        self.assertEqual([list(stats) for stats in expected], [list(stats) for stats in actual])
+                        self.assertEqual([stats.cover_from for stats in expected],
+                                         [stats.cover_from for stats in actual])
+
+    def test_matches_season_matrix(self):
+        feature_store = FeatureStore.build(db_cursor, store_dir.name, windows=WINDOWS)
+        self.assertIsInstance(feature_store.totals, np.memmap)
+        self.assertStoreMatchesSeasonMatrix(feature_store)
+
+    def test_reopen(self):
+        FeatureStore.build(db_cursor, store_dir.name, windows=WINDOWS)
+        self.assertStoreMatchesSeasonMatrix(FeatureStore(store_dir.name))
+
+    def test_unknown_window(self):
+        feature_store = FeatureStore.build(db_cursor, store_dir.name, windows=WINDOWS)
+        self.assertRaises(KeyError, feature_store.n_sample_stats_for_team, team='Arsenal', n_samples=3,
+                          last_sample_date=date(2016, 12, 31))
+
+    def test_feature(self):
+        feature_store = FeatureStore.build(db_cursor, store_dir.name, windows=WINDOWS)
+        on_date = feature_store.date_index(date(2016, 12, 31))
+        goal_diffs = feature_store.feature('goal_diff', n_samples=5, home_only=True, normalize_by_matches=True)
+        lost_rates = feature_store.feature('lost_rate', n_samples=5)
+
+        for team in feature_store.teams:
+            stats = feature_store.n_sample_stats_for_team(team=team, n_samples=5, last_sample_date=date(2016, 12, 31),
+                                                          home_only=True, normalize_by_matches=True)
+            self.assertEqual(stats.goal_diff, goal_diffs[on_date, feature_store.team_ids.id(team)])
+
+            stats = feature_store.n_sample_stats_for_team(team=team, n_samples=5, last_sample_date=date(2016, 12, 31))
+            self.assertEqual(stats.lost / stats.played, lost_rates[on_date, feature_store.team_ids.id(team)])
+
+    def test_incremental_append(self):
+        # Results are kept by when they were added, take the most recent off and then put them back.
+        appended = db_cursor.execute("SELECT * FROM results WHERE date > '2017-04-01' ORDER BY date").fetchall()
+        db_cursor.execute("DELETE FROM results WHERE date > '2017-04-01'")
+        FeatureStore.build(db_cursor, store_dir.name, windows=WINDOWS)
+
+        db_cursor.executemany('INSERT INTO results(date, home_team, home_score, away_team, away_score) '
+                              'VALUES (?, ?, ?, ?, ?)', [tuple(row)[1:] for row in appended])
+        feature_store = FeatureStore.build(db_cursor, store_dir.name)
+
+        self.assertEqual(appended[0]['date'], feature_store.metadata['rebuilt_from'])
+        self.assertStoreMatchesSeasonMatrix(feature_store)
+
+    def test_incremental_append_in_place(self):
+        db_cursor.execute("DELETE FROM results WHERE date > '2017-04-01'")
+        feature_store = FeatureStore.build(db_cursor, store_dir.name, windows=WINDOWS)
+        kept_totals = np.array(feature_store.totals)
+        totals_inode = os.stat(os.path.join(store_dir.name, 'totals.npy')).st_ino
+        del feature_store
+
+        with sqlite3.connect(RESULTS_FIXTURE_DATA) as fixture_connection:
+            appended = fixture_connection.execute('SELECT date, home_team, home_score, away_team, away_score '
+                                                  "FROM results WHERE date > '2017-04-01'").fetchall()
+        db_cursor.executemany('INSERT INTO results(date, home_team, home_score, away_team, away_score) '
+                              'VALUES (?, ?, ?, ?, ?)', appended)
+        feature_store = FeatureStore.build(db_cursor, store_dir.name)
+
+        # The same file, grown, with the rows from before the appended results as they were.
+        self.assertEqual(totals_inode, os.stat(os.path.join(store_dir.name, 'totals.npy')).st_ino)
+        self.assertGreater(len(feature_store.totals), len(kept_totals))
+        np.testing.assert_array_equal(kept_totals, feature_store.totals[:len(kept_totals)])
+        self.assertStoreMatchesSeasonMatrix(feature_store)
+
+    def test_compute_in_chunks(self):
+        season_matrix = SeasonMatrix(db_cursor)
+        dates = np.unique(season_matrix.dates)
+        shape = (len(dates), len(FeatureStore.SPLITS), len(WINDOWS), len(season_matrix.teams), len(FeatureStore.FIELDS))
+
+        results = []
+        for dates_per_chunk in (1, 7, len(dates)):
+            totals = np.zeros(shape, dtype=np.int32)
+            cover_from = np.full(shape[:-1], np.datetime64('NaT'), dtype='datetime64[D]')
+            FeatureStore.compute(season_matrix, WINDOWS, dates, totals, cover_from, dates_per_chunk=dates_per_chunk)
+            results.append((totals, cover_from))
+
+        for (totals, cover_from) in results[1:]:
+            np.testing.assert_array_equal(results[0][0], totals)
+            np.testing.assert_array_equal(results[0][1], cover_from)
+
+    def test_default_windows(self):
+        self.assertEqual(list(range(1, 39)), FeatureStore.default_windows(['Team %i' % i for i in range(20)]))
+        # Several divisions' worth of teams are bounded by the size of a division, not the number of teams.
+        self.assertEqual(list(range(1, FeatureStore.MAX_DEFAULT_WINDOW + 1)),
+                         FeatureStore.default_windows(['Team %i' % i for i in range(100)]))
+
+    def test_up_to_date(self):
+        FeatureStore.build(db_cursor, store_dir.name, windows=WINDOWS)
+        feature_store = FeatureStore.build(db_cursor, store_dir.name)
+        self.assertEqual('2016-08-13', feature_store.metadata['rebuilt_from'])
+
+    def test_rebuilds_if_changed(self):
+        FeatureStore.build(db_cursor, store_dir.name, windows=WINDOWS)
+        db_cursor.execute("UPDATE results SET home_score = 9 WHERE date = '2016-12-31'")
+        feature_store = FeatureStore.build(db_cursor, store_dir.name)
+
+        self.assertEqual('2016-08-13', feature_store.metadata['rebuilt_from'])
+        self.assertStoreMatchesSeasonMatrix(feature_store)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import json
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+from datetime import date
+
+from BulkWriterLib import BulkWriter
+from FeatureLib import Feature, FootballMatchPredictor, ModelTable
+from InstrumentLib import Instrumentation, normalise_sql
+from StatsLib import Stats
+
+RESULTS_FIXTURE_DATA = os.path.join(os.path.dirname(__file__), 'fixture', 'results_2016_2017_season.db')
+
+
+class InstrumentTests(unittest.TestCase):
+
+    def setUp(self):
+        global db_connection
+        db_connection = sqlite3.connect(RESULTS_FIXTURE_DATA)
+        db_connection.row_factory = sqlite3.Row
+        global db_cursor
+        db_cursor = db_connection.cursor()
+        global instrumentation
+        instrumentation = Instrumentation(progress_instructions=100)
+
+    def tearDown(self):
+        instrumentation.uninstall()
+        db_connection.close()
+
+    def test_normalise_sql(self):
+        self.assertEqual('SELECT * FROM results WHERE home_team = ? AND home_score > ? LIMIT ?',
+                         normalise_sql("SELECT *\n  FROM results WHERE home_team = 'Arsenal' AND home_score > 2 "
+                                       "LIMIT 10"))
+        self.assertEqual('SELECT ? AS name', normalise_sql("SELECT 'It''s' AS name"))
+
+    def test_install_and_uninstall(self):
+        originals = (Stats.__dict__['n_sample_stats_for_team'], Feature.__dict__['__new__'],
+                     ModelTable.__dict__['create_for_all_teams'], FootballMatchPredictor.__dict__['predict'])
+
+        instrumentation.install()
+        stats = Stats.n_sample_stats_for_team(cursor=db_cursor, team='Arsenal', n_samples=10,
+                                              last_sample_date=date(2017, 1, 1))
+        models = ModelTable.create_for_all_teams(model_making_fn=lambda team: [team == 'Arsenal', 1.0],
+                                                 entities=['Arsenal', 'Chelsea'])
+        FootballMatchPredictor(models=models).predict('Arsenal', 'Chelsea')
+        self.assertEqual(10, stats.played)
+        self.assertIsInstance(Feature(1.0), Feature)
+
+        timers = instrumentation.report()['timers']
+        self.assertEqual(1, timers['Stats.n_sample_stats_for_team']['count'])
+        self.assertGreaterEqual(timers['Stats.__init__']['count'], 1)
+        self.assertEqual(1, timers['ModelTable.create_for_all_teams']['count'])
+        self.assertEqual(1, timers['FootballMatchPredictor.predict']['count'])
+        self.assertGreaterEqual(timers['Feature.__new__']['count'], 1)
+        self.assertGreaterEqual(timers['Stats.n_sample_stats_for_team']['total_seconds'],
+                                timers['Stats.__init__']['total_seconds'])
+
+        instrumentation.uninstall()
+        self.assertEqual(originals, (Stats.__dict__['n_sample_stats_for_team'], Feature.__dict__['__new__'],
+                                     ModelTable.__dict__['create_for_all_teams'],
+                                     FootballMatchPredictor.__dict__['predict']))
+
+        # Nothing is timed once it's uninstalled.
+        Stats.n_sample_stats_for_team(cursor=db_cursor, team='Arsenal', n_samples=10, last_sample_date=date(2017, 1, 1))
+        self.assertEqual(1, instrumentation.report()['timers']['Stats.n_sample_stats_for_team']['count'])
+
+    def test_trace_connection(self):
+        instrumentation.trace_connection(db_connection)
+        for team in ['Arsenal', 'Chelsea', 'Everton']:
+            db_cursor.execute("SELECT COUNT(*) FROM results WHERE home_team = '%s'" % team).fetchone()
+        db_cursor.execute('SELECT * FROM results ORDER BY away_score').fetchall()
+
+        sql = instrumentation.report()['sql']
+        self.assertEqual(3, sql['SELECT COUNT(*) FROM results WHERE home_team = ?']['count'])
+        self.assertEqual(1, sql['SELECT * FROM results ORDER BY away_score']['count'])
+        self.assertGreater(sql['SELECT * FROM results ORDER BY away_score']['approx_vm_instructions'], 0)
+
+        # Once detached, statements are no longer seen.
+        instrumentation.uninstall()
+        db_cursor.execute('SELECT * FROM results ORDER BY away_score').fetchall()
+        self.assertEqual(1, instrumentation.report()['sql']['SELECT * FROM results ORDER BY away_score']['count'])
+
+    def test_trace_connection_short_statements(self):
+        # Each is far fewer instructions than the progress handler is called every, they still have to be timed.
+        instrumentation.trace_connection(db_connection)
+        start = time.perf_counter()
+        for i in range(2000):
+            db_cursor.execute('SELECT date FROM results WHERE id = ?', (i % 100 + 1,)).fetchone()
+        elapsed = time.perf_counter() - start
+
+        sql = instrumentation.report()['sql']['SELECT date FROM results WHERE id = ?']
+        self.assertEqual(2000, sql['count'])
+        self.assertGreater(sql['seconds'], 0.5 * elapsed)
+
+    def test_bulk_writer_flush(self):
+        instrumentation.install()
+        log_connection = sqlite3.connect(':memory:')
+        instrumentation.trace_connection(log_connection)
+        log_connection.execute('CREATE TABLE log (value INTEGER)')
+        with BulkWriter(log_connection, 'INSERT INTO log VALUES (?)', batch_size=10) as log_writer:
+            log_writer.add_many((i,) for i in range(25))
+        log_connection.close()
+
+        report = instrumentation.report()
+        self.assertEqual(3, report['timers']['BulkWriter.flush']['count'])
+        self.assertIn('INSERT INTO log VALUES (?)', report['sql'])
+
+    def test_report(self):
+        with instrumentation.timed('phase'):
+            instrumentation.count('things', 3)
+        instrumentation.count('things')
+
+        with tempfile.TemporaryDirectory() as out_dir:
+            json_file = os.path.join(out_dir, 'instrumentation.json')
+            instrumentation.write_json(json_file)
+            with open(json_file) as infile:
+                report = json.load(infile)
+
+        self.assertEqual(1, report['timers']['phase']['count'])
+        self.assertEqual({'things': 4}, report['counters'])
+        self.assertIn('phase', instrumentation.format_report())
+
+
+if __name__ == '__main__':
+    unittest.main()
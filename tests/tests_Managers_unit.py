@@ -0,0 +1,50 @@
+import os
+import sqlite3
+import unittest
+from datetime import date
+
+from ManagersLib import ManagerLookup
+
+MANAGERS_FIXTURE_DATA = os.path.join(os.path.dirname(__file__), 'fixture', 'managers_2017_05_17.db')
+
+SQL_MANAGER_ON_DATE = \
+    '''SELECT manager_name FROM managers WHERE team_name = ? AND appointed <= ? ORDER BY appointed DESC LIMIT 1'''
+
+
+class ManagerLookupTests(unittest.TestCase):
+
+    def setUp(self):
+        global db_connection
+        db_connection = sqlite3.connect(MANAGERS_FIXTURE_DATA)
+        global db_cursor
+        db_cursor = db_connection.cursor()
+        global manager_lookup
+        manager_lookup = ManagerLookup(db_cursor)
+
+    def tearDown(self):
+        db_connection.close()
+
+    def test_get_manager(self):
+        self.assertEqual('Arsene Wenger', manager_lookup.get_manager('Arsenal', date(2017, 5, 21)))
+        self.assertEqual('Walter Mazzarri', manager_lookup.get_manager('Watford', '2016-07-01'))
+        # Nobody in place, so still the one who departed.
+        self.assertEqual('Quique Sanchez Flores', manager_lookup.get_manager('Watford', '2016-06-30'))
+        self.assertEqual("Walter Mazzarri's Watford", manager_lookup.team_str('Watford', '2016-12-31'))
+
+    def test_no_manager(self):
+        self.assertRaises(KeyError, manager_lookup.get_manager, 'Arsenal', '1990-01-01')
+        self.assertRaises(KeyError, manager_lookup.get_manager, 'Nowhere Town', '2017-01-01')
+
+    def test_same_as_query(self):
+        teams = [row[0] for row in db_cursor.execute('SELECT DISTINCT team_name FROM managers').fetchall()]
+        dates = sorted({row[0] for row in db_cursor.execute('SELECT appointed FROM managers').fetchall()})
+        for team in teams:
+            for on_date in dates + ['2016-08-13', '2017-05-21']:
+                expected = db_cursor.execute(SQL_MANAGER_ON_DATE, (team, on_date)).fetchone()
+                if expected is not None:
+                    with self.subTest(team=team, on_date=on_date):
+                        self.assertEqual(expected[0], manager_lookup.get_manager(team, on_date))
+
+
+if __name__ == '__main__':
+    unittest.main()
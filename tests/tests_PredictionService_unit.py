@@ -0,0 +1,175 @@
+import datetime
+import io
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+from urllib.error import HTTPError
+from urllib.parse import quote
+from urllib.request import Request, urlopen
+
+from FeatureLib import FootballMatchPredictor
+from PredictionServiceLib import PredictionWriter, WarmModels, batches, create_goal_diff_models, make_server, \
+    parse_matches, predictions_to_dicts, read_fixtures
+
+RESULTS_FIXTURE_DATA = os.path.join(os.path.dirname(__file__), 'fixture', 'results_2017_04_28.db')
+
+FIXTURES = [('Arsenal', 'Everton'), ('Hull City', 'Chelsea'), ('Burnley', 'Burnley')]
+
+
+class PredictionServiceTests(unittest.TestCase):
+
+    def setUp(self):
+        global db_dir
+        db_dir = tempfile.TemporaryDirectory()
+        global db_file
+        db_file = os.path.join(db_dir.name, 'results.db')
+        shutil.copyfile(RESULTS_FIXTURE_DATA, db_file)
+        global warm_models
+        warm_models = WarmModels(db_file)
+
+    def tearDown(self):
+        warm_models.close()
+        db_dir.cleanup()
+
+    @staticmethod
+    def one_shot_predictions(fixtures: [(str, str)]) -> [dict]:
+        """ As predictOmatic.py does it, models for just the teams in the fixtures."""
+        teams = list({team: True for fixture in fixtures for team in fixture}.keys())
+        with sqlite3.connect(db_file) as db_connection:
+            models = create_goal_diff_models(db_cursor=db_connection.cursor(), teams=teams,
+                                             use_data_upto_date=datetime.datetime.today().date())
+        return predictions_to_dicts(FootballMatchPredictor(models=models).predict_many(fixtures))
+
+    def test_parse_matches(self):
+        self.assertEqual([('Arsenal', 'Everton'), ('Hull City', 'Chelsea')],
+                         parse_matches(' Arsenal - Everton , Hull City-Chelsea '))
+        for matches_str in ['Arsenal', 'Arsenal-Everton, Chelsea', 'Arsenal-Everton-Chelsea', 'Arsenal-', '']:
+            with self.subTest(matches_str=matches_str):
+                self.assertRaisesRegex(ValueError, '^Bad match', parse_matches, matches_str)
+
+    def test_read_fixtures(self):
+        # Unlike --matches, team names can have hyphens in them.
+        expected = [('Arsenal', 'Everton'), ('Hull City', 'Chelsea'), ('Brighton-and-Hove', 'Burnley')]
+        self.assertEqual(expected, list(read_fixtures(io.StringIO(
+            'home_team,away_team\nArsenal,Everton\n Hull City , Chelsea\n\nBrighton-and-Hove,Burnley\n'))))
+        self.assertEqual(expected, list(read_fixtures(io.StringIO(
+            '{"home_team": "Arsenal", "away_team": "Everton"}\n["Hull City", "Chelsea"]\n\n'
+            '{"away_team": "Burnley", "home_team": "Brighton-and-Hove"}\n'), fixtures_format='jsonl')))
+        self.assertRaises(ValueError, list, read_fixtures(io.StringIO(''), fixtures_format='xml'))
+
+    def test_read_fixtures_bad_lines(self):
+        for (fixtures_format, fixtures_str) in [
+                ('csv', 'Arsenal,Everton\nChelsea\n'),
+                ('csv', 'Arsenal,Everton\nChelsea,Burnley,Hull City\n'),
+                ('csv', 'Arsenal,Everton\nChelsea, \n'),
+                ('jsonl', '["Arsenal", "Everton"]\n{"home_team": "Chels\n'),
+                ('jsonl', '["Arsenal", "Everton"]\n{"home_team": "Chelsea"}\n'),
+                ('jsonl', '["Arsenal", "Everton"]\n["Chelsea"]\n'),
+                ('jsonl', '["Arsenal", "Everton"]\n7\n')]:
+            with self.subTest(fixtures_format=fixtures_format, fixtures_str=fixtures_str):
+                self.assertRaisesRegex(ValueError, '^Bad fixture on line 2', list,
+                                       read_fixtures(io.StringIO(fixtures_str), fixtures_format=fixtures_format))
+
+    def test_batches(self):
+        self.assertEqual([[0, 1, 2], [3, 4, 5], [6]], list(batches(iter(range(7)), 3)))
+        self.assertEqual([], list(batches([], 3)))
+
+    def test_predict_stream(self):
+        fixtures = FIXTURES * 5
+        predictions = list(warm_models.predict_stream(iter(fixtures), batch_size=4))
+        self.assertEqual([4, 4, 4, 3], [len(batch) for batch in predictions])
+        self.assertEqual(self.one_shot_predictions(fixtures), [prediction for batch in predictions
+                                                               for prediction in batch])
+
+    def test_prediction_writer(self):
+        predictions = warm_models.predict(FIXTURES[:2])
+        for (output_format, expected_lines) in [
+                ('text', ['Predicted results for Arsenal vs Everton is a home_win with distance  1.356618',
+                          'Predicted results for Hull City vs Chelsea is a away_win with distance  -0.529412']),
+                ('csv', ['home_team,away_team,predicted_result,distance,bad_data_explanation',
+                         'Arsenal,Everton,home_win,%r,' % predictions[0]['distance'],
+                         'Hull City,Chelsea,away_win,%r,' % predictions[1]['distance']]),
+                ('jsonl', [json.dumps(prediction) for prediction in predictions])]:
+            with self.subTest(output_format=output_format):
+                out_file = io.StringIO(newline='')
+                PredictionWriter(out_file, output_format=output_format).write(predictions)
+                self.assertEqual(expected_lines, out_file.getvalue().splitlines())
+
+    def test_same_as_one_shot(self):
+        self.assertEqual(self.one_shot_predictions(FIXTURES), warm_models.predict(FIXTURES))
+
+    def test_refresh_if_changed(self):
+        self.assertFalse(warm_models.refresh_if_changed())
+        fixtures = [('Everton', 'Arsenal')]
+        before = warm_models.predict(fixtures)
+
+        with sqlite3.connect(db_file) as db_connection:
+            db_connection.execute("INSERT INTO results(date, home_team, home_score, away_team, away_score) "
+                                  "VALUES ('2017-04-29', 'Everton', 9, 'Arsenal', 0)")
+
+        self.assertTrue(warm_models.refresh_if_changed())
+        self.assertFalse(warm_models.refresh_if_changed())
+        self.assertNotEqual(before, warm_models.predict(fixtures))
+        self.assertEqual(self.one_shot_predictions(fixtures), warm_models.predict(fixtures))
+
+    def test_refresh_if_changed_db_missing(self):
+        fixtures = [('Everton', 'Arsenal')]
+        before = warm_models.predict(fixtures)
+
+        # e.g. part way through a fresh scrape replacing the DB.
+        os.rename(db_file, db_file + '.old')
+        with self.assertLogs(level='WARNING'):
+            self.assertFalse(warm_models.refresh_if_changed())
+            self.assertEqual(before, warm_models.predict(fixtures))
+
+        os.rename(db_file + '.old', db_file)
+        self.assertEqual(before, warm_models.predict(fixtures))
+
+    def test_unknown_team(self):
+        self.assertRaises(KeyError, warm_models.predict, [('Arsenal', 'Nowhere Town')])
+        # As predictOmatic.py --matches makes its models, the same team is just as unknown.
+        with sqlite3.connect(db_file) as db_connection:
+            with self.assertRaisesRegex(KeyError, 'Nowhere Town'):
+                create_goal_diff_models(db_cursor=db_connection.cursor(), teams=['Arsenal', 'Nowhere Town'],
+                                        use_data_upto_date=datetime.datetime.today().date())
+
+    def test_http(self):
+        server = make_server(warm_models, port=0)
+        server_thread = threading.Thread(target=server.serve_forever)
+        server_thread.start()
+        base_url = 'http://%s:%i' % server.server_address
+        try:
+            with urlopen(base_url + '/predict?matches=' + quote('Arsenal-Everton, Hull City - Chelsea')) as response:
+                self.assertEqual({'predictions': self.one_shot_predictions(FIXTURES[:2])}, json.load(response))
+
+            request = Request(base_url + '/predict', data=json.dumps({'fixtures': FIXTURES}).encode('utf-8'),
+                              headers={'Content-Type': 'application/json'})
+            with urlopen(request) as response:
+                self.assertEqual({'predictions': self.one_shot_predictions(FIXTURES)}, json.load(response))
+
+            with self.assertRaises(HTTPError) as context:
+                urlopen(base_url + '/predict?matches=' + quote('Arsenal-Nowhere Town'))
+            self.assertEqual(400, context.exception.code)
+            context.exception.close()
+
+            with self.assertRaises(HTTPError) as context:
+                urlopen(base_url + '/predict?matches=Arsenal')
+            self.assertEqual(400, context.exception.code)
+            self.assertEqual({'error': "Bad match 'Arsenal', expected home team-away team"},
+                             json.load(context.exception))
+            context.exception.close()
+
+            with urlopen(base_url + '/health') as response:
+                self.assertEqual(len(warm_models.models), json.load(response)['teams'])
+        finally:
+            server.shutdown()
+            server.server_close()
+            server_thread.join()
+
+
+if __name__ == '__main__':
+    unittest.main()
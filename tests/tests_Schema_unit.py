@@ -0,0 +1,53 @@
+import os
+import sqlite3
+import unittest
+from datetime import date
+
+from SchemaLib import ensure_indexes, check_query_plans
+from StatsLib import Stats
+
+RESULTS_FIXTURE_DATA = os.path.join(os.path.dirname(__file__), 'fixture', 'results_2017_04_28.db')
+
+
+class SchemaTests(unittest.TestCase):
+
+    def setUp(self):
+        # Work on an in memory copy so that the fixture itself is left untouched.
+        global db_connection
+        db_connection = sqlite3.connect(':memory:')
+        with sqlite3.connect(RESULTS_FIXTURE_DATA) as fixture_connection:
+            db_connection.executescript('\n'.join(fixture_connection.iterdump()))
+        db_connection.row_factory = sqlite3.Row
+        global db_cursor
+        db_cursor = db_connection.cursor()
+
+    def tearDown(self):
+        db_connection.close()
+
+    def test_full_scans_without_indexes(self):
+        self.assertGreater(len(check_query_plans(db_cursor)), 0)
+
+    def test_no_full_scans_with_indexes(self):
+        ensure_indexes(db_cursor)
+        self.assertEqual([], check_query_plans(db_cursor))
+
+    def test_ensure_indexes_idempotent(self):
+        ensure_indexes(db_cursor)
+        ensure_indexes(db_cursor)
+        sql = "SELECT name FROM sqlite_master WHERE type='index' AND tbl_name='results' ORDER BY name"
+        self.assertEqual(['results_away_team_date', 'results_date', 'results_home_team_date'],
+                         [row[0] for row in db_cursor.execute(sql).fetchall()])
+
+    def test_same_stats_with_indexes(self):
+        team = 'Arsenal'
+        stats = Stats.n_sample_stats_for_team(cursor=db_cursor, team=team, n_samples=2,
+                                              last_sample_date=date(2016, 9, 23), home_only=False)
+        ensure_indexes(db_cursor)
+        indexed_stats = Stats.n_sample_stats_for_team(cursor=db_cursor, team=team, n_samples=2,
+                                                      last_sample_date=date(2016, 9, 23), home_only=False)
+        self.assertEqual(list(stats), list(indexed_stats))
+        self.assertEqual(stats.cover_from, indexed_stats.cover_from)
+
+
+if __name__ == '__main__':
+    unittest.main()
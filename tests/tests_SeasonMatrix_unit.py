@@ -0,0 +1,169 @@
+import os
+import sqlite3
+import unittest
+from datetime import date
+
+from ActualResultsLib import ActualResults
+from SeasonMatrixLib import SeasonMatrix, CumulativeStatsIndex
+from StatsLib import Stats, create_league_using_windowed_stats
+
+RESULTS_FIXTURE_DATA = os.path.join(os.path.dirname(__file__), 'fixture', 'results_2017_04_28.db')
+
+
+class SeasonMatrixTests(unittest.TestCase):
+
+    def setUp(self):
+        global db_connection
+        db_connection = sqlite3.connect(RESULTS_FIXTURE_DATA)
+        db_connection.row_factory = sqlite3.Row
+        global db_cursor
+        db_cursor = db_connection.cursor()
+        global season_matrix
+        season_matrix = SeasonMatrix(db_cursor)
+
+    def tearDown(self):
+        db_connection.close()
+
+    def test_teams(self):
+        self.assertEqual(ActualResults.get_teams(db_cursor), season_matrix.teams)
+
+    def test_n_samples_away_last_two(self):
+        team = 'Arsenal'
+        stats = season_matrix.n_sample_stats_for_team(team=team, n_samples=2, last_sample_date=date(2016, 9, 23),
+                                                      home_only=False)
+        self.assertEqual([team, 2, 2, 0, 0, 7, 2, 5, 6], list(stats))
+        self.assertEqual(date(2016, 8, 27), stats.cover_from)
+        self.assertEqual(date(2016, 9, 23), stats.cover_to)
+
+    def test_n_samples_no_results(self):
+        team = 'Arsenal'  # Didn't play until date(2016, 8, 14)
+        stats = season_matrix.n_sample_stats_for_team(team=team, n_samples=10, last_sample_date=date(2016, 8, 13))
+        self.assertEqual([team, 0, 0, 0, 0, 0, 0, 0, 0], list(stats))
+        self.assertIsNone(stats.cover_from)
+
+    def test_n_samples_before_first_match(self):
+        stats = season_matrix.n_sample_stats_for_teams(teams=['Arsenal', 'Burnley'], n_samples=2,
+                                                       last_sample_date=date(2016, 8, 1))
+        self.assertEqual([['Arsenal', 0, 0, 0, 0, 0, 0, 0, 0], ['Burnley', 0, 0, 0, 0, 0, 0, 0, 0]],
+                         [list(team_stats) for team_stats in stats])
+
+    def test_n_samples_before_season_starts(self):
+        # Regression test, a date before the first match leaves nothing to take the argmax of.
+        teams = season_matrix.teams
+        for home_only in (None, True, False):
+            for n_samples in (1, 38, -1):
+                with self.subTest(home_only=home_only, n_samples=n_samples):
+                    stats = season_matrix.n_sample_stats_for_teams(teams=teams, n_samples=n_samples,
+                                                                   last_sample_date=date(2016, 7, 1),
+                                                                   home_only=home_only)
+                    self.assertEqual([[team, 0, 0, 0, 0, 0, 0, 0, 0] for team in teams],
+                                     [list(team_stats) for team_stats in stats])
+                    self.assertEqual([None] * len(teams), [team_stats.cover_from for team_stats in stats])
+                    self.assertEqual([date(2016, 7, 1)] * len(teams), [team_stats.cover_to for team_stats in stats])
+
+        # Including from the drop in single team version.
+        stats = season_matrix.n_sample_stats_for_team(team='Arsenal', n_samples=10, last_sample_date=date(2016, 7, 1))
+        self.assertEqual(['Arsenal', 0, 0, 0, 0, 0, 0, 0, 0], list(stats))
+
+    def test_n_samples_unknown_team(self):
+        stats = season_matrix.n_sample_stats_for_teams(teams=['Arsenal', 'Nowhere Town'], n_samples=2,
+                                                       last_sample_date=date(2016, 8, 20))
+        self.assertEqual(['Arsenal', 2, 0, 1, 1, 3, 4, -1, 1], list(stats[0]))
+        self.assertEqual(['Nowhere Town', 0, 0, 0, 0, 0, 0, 0, 0], list(stats[1]))
+
+    def test_matches_sql_for_all_teams(self):
+        teams = ActualResults.get_teams(db_cursor)
+        for last_sample_date in [date(2016, 8, 14), date(2016, 9, 23), date(2016, 12, 31), date(2017, 4, 28)]:
+            for n_samples in [1, 2, 5, 38]:
+                for home_only in [None, True, False]:
+                    with self.subTest(last_sample_date=last_sample_date, n_samples=n_samples, home_only=home_only):
+                        expected = [Stats.n_sample_stats_for_team(cursor=db_cursor, team=team, n_samples=n_samples,
+                                                                  last_sample_date=last_sample_date,
+                                                                  home_only=home_only, normalize_by_matches=True)
+                                    for team in teams]
+                        actual = season_matrix.n_sample_stats_for_teams(teams=teams, n_samples=n_samples,
+                                                                        last_sample_date=last_sample_date,
+                                                                        home_only=home_only,
+                                                                        normalize_by_matches=True)
+
+                        self.assertEqual([list(stats) for stats in expected], [list(stats) for stats in actual])
+                        self.assertEqual([stats.cover_from for stats in expected],
+                                         [stats.cover_from for stats in actual])
+
+
+class CumulativeStatsIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        global db_connection
+        db_connection = sqlite3.connect(RESULTS_FIXTURE_DATA)
+        db_connection.row_factory = sqlite3.Row
+        global db_cursor
+        db_cursor = db_connection.cursor()
+        global stats_index
+        stats_index = CumulativeStatsIndex.from_cursor(db_cursor)
+
+    def tearDown(self):
+        db_connection.close()
+
+    def test_windowed_two_results(self):
+        team = 'Tottenham Hotspur'
+        stats = stats_index.windowed_stats_for_team(team=team, win_weeks=2, win_end_date=date(2017, 4, 28))
+        self.assertEqual([team, 2, 2, 0, 0, 5, 0, 5, 6], list(stats))
+
+    def test_windowed_no_results(self):
+        team = 'Arsenal'  # Didn't play until date(2016, 8, 14)
+        stats = stats_index.windowed_stats_for_team(team=team, win_weeks=40, win_end_date=date(2016, 8, 13))
+        self.assertEqual([team, 0, 0, 0, 0, 0, 0, 0, 0], list(stats))
+
+    def test_windowed_unknown_team(self):
+        stats = stats_index.windowed_stats_for_teams(teams=['Nowhere Town'], win_weeks=40,
+                                                     win_end_date=date(2017, 4, 28))
+        self.assertEqual(['Nowhere Town', 0, 0, 0, 0, 0, 0, 0, 0], list(stats[0]))
+
+    def test_matches_sql_for_all_teams(self):
+        teams = ActualResults.get_teams(db_cursor)
+        for win_end_date in [date(2016, 8, 14), date(2016, 8, 27), date(2016, 12, 31), date(2017, 4, 28)]:
+            for win_weeks in [1, 2, 6, 40]:
+                for home_only in [None, True, False]:
+                    with self.subTest(win_end_date=win_end_date, win_weeks=win_weeks, home_only=home_only):
+                        expected = Stats.get_windowed_stats_for_teams(cursor=db_cursor, teams=teams,
+                                                                      win_size=win_weeks, win_end_date=win_end_date,
+                                                                      home_only=home_only)
+                        actual = Stats.get_windowed_stats_for_teams(cursor=None, teams=teams, win_size=win_weeks,
+                                                                    win_end_date=win_end_date, home_only=home_only,
+                                                                    stats_index=stats_index)
+
+                        self.assertEqual([list(stats) for stats in expected], [list(stats) for stats in actual])
+                        self.assertEqual([stats.cover_from for stats in expected],
+                                         [stats.cover_from for stats in actual])
+
+    def test_league_matches_sql(self):
+        teams = ActualResults.get_teams(db_cursor)
+        expected = create_league_using_windowed_stats(cursor=db_cursor, teams=teams, win_size=40,
+                                                      win_end_date=date(2017, 4, 28),
+                                                      stats_ranking_function=Stats.premier_league_ranking_fn)
+        actual = create_league_using_windowed_stats(cursor=None, teams=teams, win_size=40,
+                                                    win_end_date=date(2017, 4, 28),
+                                                    stats_ranking_function=Stats.premier_league_ranking_fn,
+                                                    stats_index=stats_index)
+
+        self.assertEqual([[row[0], *list(row[1])] for row in expected], [[row[0], *list(row[1])] for row in actual])
+
+    def test_league_positions(self):
+        teams = ActualResults.get_teams(db_cursor) + ['Nowhere Town']
+        win_end_dates = ActualResults.get_dates(db_cursor)[::5]
+        for home_only in (None, True, False):
+            for win_weeks in (2, 40):
+                positions = stats_index.league_positions(teams=teams, win_weeks=win_weeks, win_end_dates=win_end_dates,
+                                                         home_only=home_only)
+                self.assertEqual((len(win_end_dates), len(teams)), positions.shape)
+                for (win_end_date, date_positions) in zip(win_end_dates, positions):
+                    with self.subTest(home_only=home_only, win_weeks=win_weeks, win_end_date=win_end_date):
+                        league = create_league_using_windowed_stats(
+                            cursor=db_cursor, teams=teams, win_size=win_weeks, win_end_date=win_end_date,
+                            home_only=home_only, stats_ranking_function=Stats.premier_league_ranking_fn)
+                        self.assertEqual([league.id2ranking[team] for team in teams], date_positions.tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import os
+import re
+import subprocess
+import sys
+import unittest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that take the bulk of the import time and aren't needed until there's work to be done.
+HEAVY_MODULES = ['numpy', 'bs4', 'requests', 'lxml']
+
+# -X importtime lines are, e.g. "import time:       188 |        188 |     numpy.version"
+IMPORT_TIME_REGEX = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)$')
+
+
+def import_times(args: [str]) -> {str: (int, int)}:
+    """ Runs one of the programs with -X importtime.
+
+    :return: {module: (self microseconds, cumulative microseconds)} for everything imported.
+    """
+    process = subprocess.run([sys.executable, '-X', 'importtime'] + args, cwd=REPO_DIR, stdout=subprocess.DEVNULL,
+                             stderr=subprocess.PIPE, universal_newlines=True)
+    times = {}
+    for line in process.stderr.splitlines():
+        match = IMPORT_TIME_REGEX.match(line)
+        if match is not None:
+            times[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+    return times
+
+
+class StartupTests(unittest.TestCase):
+
+    def assertNoHeavyImports(self, args: [str]):
+        times = import_times(args)
+        self.assertGreater(len(times), 0, 'No -X importtime output')
+
+        heavy_imports = sorted(module for module in times if module.split('.')[0] in HEAVY_MODULES)
+        self.assertEqual([], heavy_imports)
+
+    def test_predict_o_matic_help(self):
+        self.assertNoHeavyImports(['predictOmatic.py', '--help'])
+
+    def test_predict_o_matic_bad_arguments(self):
+        self.assertNoHeavyImports(['predictOmatic.py', '-r', 'results.db'])
+
+    def test_get_results_from_bbc_help(self):
+        self.assertNoHeavyImports(['get_results_from_bbc.py', '--help'])
+
+    def test_import_times(self):
+        # Checks the checker, importing FeatureLib should bring in NumPy.
+        self.assertIn('numpy', import_times(['-c', 'import sys; sys.path.append("lib"); import FeatureLib']))
+
+
+if __name__ == '__main__':
+    unittest.main()
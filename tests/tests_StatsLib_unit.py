@@ -1,10 +1,14 @@
 import os
 import sqlite3
+import tempfile
 import unittest
 import logging
 from datetime import date, datetime
 
-from StatsLib import Stats
+from ActualResultsLib import ActualResults
+from FeatureStoreLib import FeatureStore
+from SeasonMatrixLib import SeasonMatrix
+from StatsLib import Stats, RollingTeamStats, StatsCache
 
 
 RESULTS_FIXTURE_DATA = os.path.join(os.path.dirname(__file__), 'fixture','results_2017_04_28.db')
@@ -168,5 +172,227 @@ class StatsTests(unittest.TestCase):
         self.subTest(2)
         self.assertEqual(['Sunderland', 2, 0, 1, 1, 2, 3, -1, 1], list(stats))
 
+    def test_stats_windowed_batched_matches_per_team(self):
+        teams = ActualResults.get_teams(db_cursor) + ['Nowhere Town']
+        for win_end_date in [FIRST_MATCHDAY, date(2016, 8, 27), date(2017, 4, 28)]:
+            for win_weeks in [1, 2, 40]:
+                for home_only in [None, True, False]:
+                    with self.subTest(win_end_date=win_end_date, win_weeks=win_weeks, home_only=home_only):
+                        expected = [Stats.windowed_stats_for_team(cursor=db_cursor, team=team, win_weeks=win_weeks,
+                                                                  win_end_date=win_end_date, home_only=home_only)
+                                    for team in teams]
+                        actual = Stats.get_windowed_stats_for_teams(cursor=db_cursor, teams=teams, win_size=win_weeks,
+                                                                    win_end_date=win_end_date, home_only=home_only)
+                        self.assertEqual([list(stats) for stats in expected], [list(stats) for stats in actual])
+
+    def test_stats_n_samples_batched_matches_per_team(self):
+        teams = ActualResults.get_teams(db_cursor) + ['Nowhere Town']
+        for last_sample_date in [FIRST_MATCHDAY, date(2016, 9, 23), date(2017, 4, 28)]:
+            for n_samples in [1, 2, 38, -1]:
+                for home_only in [None, True, False]:
+                    with self.subTest(last_sample_date=last_sample_date, n_samples=n_samples, home_only=home_only):
+                        expected = [Stats.n_sample_stats_for_team(cursor=db_cursor, team=team, n_samples=n_samples,
+                                                                  last_sample_date=last_sample_date,
+                                                                  home_only=home_only, normalize_by_matches=True)
+                                    for team in teams]
+                        actual = Stats.n_sample_stats_for_teams(cursor=db_cursor, teams=teams, n_samples=n_samples,
+                                                                last_sample_date=last_sample_date,
+                                                                home_only=home_only, normalize_by_matches=True)
+                        self.assertEqual([list(stats) for stats in expected], [list(stats) for stats in actual])
+                        self.assertEqual([stats.cover_from for stats in expected],
+                                         [stats.cover_from for stats in actual])
+
+
+class RollingTeamStatsTests(unittest.TestCase):
+
+    def setUp(self):
+        global db_connection
+        db_connection = sqlite3.connect(RESULTS_FIXTURE_DATA)
+        db_connection.row_factory = sqlite3.Row
+        global db_cursor
+        db_cursor = db_connection.cursor()
+
+    def tearDown(self):
+        db_connection.close()
+
+    def test_rolling_matches_n_samples_every_date(self):
+        teams = ActualResults.get_teams(db_cursor)
+        dates = ActualResults.get_dates(db_cursor)
+        for n_samples in [1, 3, 38]:
+            for home_only in [None, True, False]:
+                rolling_stats = RollingTeamStats(cursor=db_cursor, n_samples=n_samples, home_only=home_only,
+                                                 normalize_by_matches=True)
+                for last_sample_date in dates[::7]:
+                    rolling_stats.advance_to(last_sample_date)
+                    with self.subTest(n_samples=n_samples, home_only=home_only, last_sample_date=last_sample_date):
+                        for team in teams:
+                            expected = Stats.n_sample_stats_for_team(cursor=db_cursor, team=team, n_samples=n_samples,
+                                                                     last_sample_date=last_sample_date,
+                                                                     home_only=home_only, normalize_by_matches=True)
+                            actual = rolling_stats.stats_for_team(team)
+                            self.assertEqual(list(expected), list(actual))
+                            self.assertEqual(expected.cover_from, actual.cover_from)
+
+    def test_rolling_no_results(self):
+        team = 'Arsenal'  # Didn't play until date(2016, 8, 14)
+        rolling_stats = RollingTeamStats(cursor=db_cursor, n_samples=10).advance_to(FIRST_MATCHDAY)
+        self.assertEqual([team, 0, 0, 0, 0, 0, 0, 0, 0], list(rolling_stats.stats_for_team(team)))
+
+    def test_rolling_cannot_go_backwards(self):
+        rolling_stats = RollingTeamStats(cursor=db_cursor, n_samples=2).advance_to(date(2016, 9, 23))
+        self.assertRaises(AssertionError, rolling_stats.advance_to, FIRST_MATCHDAY)
+
+
+class StatsCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        global db_connection
+        db_connection = sqlite3.connect(':memory:')
+        with sqlite3.connect(RESULTS_FIXTURE_DATA) as fixture_connection:
+            db_connection.executescript('\n'.join(fixture_connection.iterdump()))
+        db_connection.row_factory = sqlite3.Row
+        global db_cursor
+        db_cursor = db_connection.cursor()
+
+    def tearDown(self):
+        db_connection.close()
+
+    def test_cached_matches_uncached(self):
+        stats_cache = StatsCache(db_cursor)
+        for home_only in [None, True, False]:
+            with self.subTest(home_only=home_only):
+                expected = Stats.n_sample_stats_for_team(cursor=db_cursor, team='Arsenal', n_samples=5,
+                                                         last_sample_date=date(2016, 12, 31), home_only=home_only,
+                                                         normalize_by_matches=True)
+                for _ in range(2):
+                    actual = stats_cache.n_sample_stats_for_team(team='Arsenal', n_samples=5,
+                                                                 last_sample_date=date(2016, 12, 31),
+                                                                 home_only=home_only, normalize_by_matches=True)
+                    self.assertEqual(list(expected), list(actual))
+                    self.assertEqual(expected.cover_from, actual.cover_from)
+
+        expected = Stats.windowed_stats_for_team(cursor=db_cursor, team='Arsenal', win_weeks=6,
+                                                 win_end_date=date(2016, 12, 31))
+        actual = stats_cache.windowed_stats_for_team(team='Arsenal', win_weeks=6, win_end_date=date(2016, 12, 31))
+        self.assertEqual(list(expected), list(actual))
+
+        self.assertEqual(StatsCache.CacheInfo(hits=3, persistent_hits=0, misses=4, maxsize=65536, currsize=4),
+                         stats_cache.cache_info())
+
+    def test_stats_source(self):
+        stats_cache = StatsCache(db_cursor, stats_source=SeasonMatrix(db_cursor))
+        expected = Stats.n_sample_stats_for_team(cursor=db_cursor, team='Chelsea', n_samples=38,
+                                                 last_sample_date=date(2017, 4, 28))
+        actual = stats_cache.n_sample_stats_for_team(team='Chelsea', n_samples=38, last_sample_date=date(2017, 4, 28))
+        self.assertEqual(list(expected), list(actual))
+
+    def test_stats_source_falls_back(self):
+        with tempfile.TemporaryDirectory() as store_dir:
+            stats_cache = StatsCache(db_cursor, stats_source=FeatureStore.build(db_cursor, store_dir, windows=[5]))
+            # The store only holds 5 sample windows, so 3 has to come from the results DB.
+            expected = Stats.n_sample_stats_for_team(cursor=db_cursor, team='Chelsea', n_samples=3,
+                                                     last_sample_date=date(2017, 4, 28))
+            actual = stats_cache.n_sample_stats_for_team(team='Chelsea', n_samples=3,
+                                                         last_sample_date=date(2017, 4, 28))
+            self.assertEqual(list(expected), list(actual))
+
+    def test_rolling_stats_source(self):
+        stats_cache = StatsCache(db_cursor, stats_source=RollingTeamStats(db_cursor, n_samples=5, home_only=True))
+        for (n_samples, home_only, last_sample_date) in [(5, True, date(2016, 12, 31)), (5, True, date(2017, 4, 28)),
+                                                         # Can't be answered by the rolling stats, so fall back.
+                                                         (5, None, date(2017, 4, 28)), (3, True, date(2017, 4, 28)),
+                                                         (5, True, date(2016, 12, 31))]:
+            with self.subTest(n_samples=n_samples, home_only=home_only, last_sample_date=last_sample_date):
+                expected = Stats.n_sample_stats_for_team(cursor=db_cursor, team='Chelsea', n_samples=n_samples,
+                                                         last_sample_date=last_sample_date, home_only=home_only,
+                                                         normalize_by_matches=True)
+                # Cleared so that the repeated date is looked up again.
+                stats_cache.clear()
+                actual = stats_cache.n_sample_stats_for_team(team='Chelsea', n_samples=n_samples,
+                                                             last_sample_date=last_sample_date, home_only=home_only,
+                                                             normalize_by_matches=True)
+                self.assertEqual(list(expected), list(actual))
+                self.assertEqual(expected.cover_from, actual.cover_from)
+        self.assertEqual(date(2017, 4, 28), stats_cache.stats_source.last_sample_date)
+
+    def test_lru_eviction(self):
+        stats_cache = StatsCache(db_cursor, maxsize=2)
+        for team in ['Arsenal', 'Burnley', 'Arsenal', 'Chelsea', 'Burnley']:
+            stats_cache.n_sample_stats_for_team(team=team, n_samples=5, last_sample_date=date(2016, 12, 31))
+
+        # Burnley was the least recently used when Chelsea went in, so has to be looked up again.
+        self.assertEqual((1, 4, 2), (stats_cache.hits, stats_cache.misses, stats_cache.cache_info().currsize))
+
+    def test_fingerprint_changes_with_results(self):
+        stats_cache = StatsCache(db_cursor)
+        before = stats_cache.n_sample_stats_for_team(team='Arsenal', n_samples=5, last_sample_date=date(2017, 5, 1))
+
+        db_cursor.execute("INSERT INTO results(date, home_team, home_score, away_team, away_score) "
+                          "VALUES ('2017-04-30', 'Arsenal', 9, 'Burnley', 0)")
+        stats_cache.rebind(db_cursor)
+        after = stats_cache.n_sample_stats_for_team(team='Arsenal', n_samples=5, last_sample_date=date(2017, 5, 1))
+
+        self.assertNotEqual(list(before), list(after))
+        self.assertEqual(0, stats_cache.hits)
+
+    def test_results_changed_without_rebind(self):
+        stats_cache = StatsCache(db_cursor, stats_source=SeasonMatrix(db_cursor))
+        before = stats_cache.n_sample_stats_for_team(team='Arsenal', n_samples=5, last_sample_date=date(2017, 5, 1))
+
+        db_cursor.execute("INSERT INTO results(date, home_team, home_score, away_team, away_score) "
+                          "VALUES ('2017-04-30', 'Arsenal', 9, 'Burnley', 0)")
+        # Any miss notices the change, hits are only rechecked when asked to.
+        burnley = stats_cache.n_sample_stats_for_team(team='Burnley', n_samples=5, last_sample_date=date(2017, 5, 1))
+        self.assertIsNone(stats_cache.stats_source)
+        self.assertEqual(list(Stats.n_sample_stats_for_team(cursor=db_cursor, team='Burnley', n_samples=5,
+                                                            last_sample_date=date(2017, 5, 1))), list(burnley))
+
+        after = stats_cache.n_sample_stats_for_team(team='Arsenal', n_samples=5, last_sample_date=date(2017, 5, 1))
+        expected = Stats.n_sample_stats_for_team(cursor=db_cursor, team='Arsenal', n_samples=5,
+                                                 last_sample_date=date(2017, 5, 1))
+        self.assertNotEqual(list(before), list(after))
+        self.assertEqual(list(expected), list(after))
+
+    def test_hits_rechecked_when_asked(self):
+        stats_cache = StatsCache(db_cursor)
+        before = stats_cache.n_sample_stats_for_team(team='Arsenal', n_samples=5, last_sample_date=date(2017, 5, 1))
+
+        db_cursor.execute("INSERT INTO results(date, home_team, home_score, away_team, away_score) "
+                          "VALUES ('2017-04-30', 'Arsenal', 9, 'Burnley', 0)")
+        self.assertEqual(list(before), list(stats_cache.n_sample_stats_for_team(team='Arsenal', n_samples=5,
+                                                                                last_sample_date=date(2017, 5, 1))))
+        stats_cache.refingerprint_if_changed()
+        self.assertNotEqual(list(before), list(stats_cache.n_sample_stats_for_team(team='Arsenal', n_samples=5,
+                                                                                   last_sample_date=date(2017, 5, 1))))
+
+    def test_persistent_tier(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            cache_file = os.path.join(cache_dir, 'stats_cache.db')
+
+            stats_cache = StatsCache(db_cursor, persistent_file=cache_file)
+            expected = stats_cache.n_sample_stats_for_team(team='Arsenal', n_samples=5,
+                                                           last_sample_date=date(2016, 12, 31))
+            stats_cache.close()
+
+            stats_cache = StatsCache(db_cursor, persistent_file=cache_file)
+            actual = stats_cache.n_sample_stats_for_team(team='Arsenal', n_samples=5,
+                                                         last_sample_date=date(2016, 12, 31))
+            stats_cache.close()
+
+            self.assertEqual(list(expected), list(actual))
+            self.assertEqual(expected.cover_from, actual.cover_from)
+            self.assertEqual((0, 1, 0), (stats_cache.hits, stats_cache.persistent_hits, stats_cache.misses))
+
+    def test_persistent_tier_pending(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            stats_cache = StatsCache(db_cursor, maxsize=1, persistent_file=os.path.join(cache_dir, 'stats_cache.db'))
+            # Arsenal is evicted from memory before it has been written, it still mustn't be computed again.
+            for team in ['Arsenal', 'Burnley', 'Arsenal']:
+                stats_cache.n_sample_stats_for_team(team=team, n_samples=5, last_sample_date=date(2016, 12, 31))
+            self.assertEqual((0, 1, 2), (stats_cache.hits, stats_cache.persistent_hits, stats_cache.misses))
+            stats_cache.close()
+            self.assertEqual(2, stats_cache.persistent_writer.rows_written)
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,130 @@
+import unittest
+
+import numpy as np
+
+from FeatureLib import FootballMatchPredictor, ModelTable
+from SweepLib import BoostSweep, ThresholdSweep, results_from_distances, RESULTS
+
+
+class ThresholdSweepTests(unittest.TestCase):
+
+    def setUp(self):
+        global random_state
+        random_state = np.random.RandomState(42)
+
+    @staticmethod
+    def brute_force_num_correct(distances, actual_results, lower, upper) -> int:
+        num_correct = 0
+        for (distance, actual_result) in zip(distances, actual_results):
+            predicted_result = 'draw'
+            if distance > 0:
+                predicted_result = 'home_win'
+            elif distance < 0:
+                predicted_result = 'away_win'
+            if lower <= distance <= upper:
+                predicted_result = 'draw'
+            num_correct += predicted_result == actual_result
+        return num_correct
+
+    def test_results_from_distances(self):
+        self.assertEqual(['away_win', 'draw', 'home_win'], list(results_from_distances([-1.0, 0.0, 0.5])))
+        self.assertEqual(['draw', 'away_win'], list(results_from_distances([0.5, -0.75], threshold=0.5)))
+
+    def test_results_from_distances_matches_predict(self):
+        models = ModelTable(ids=['A', 'B', 'C'], features=[[1.5, 1.0], [0.5, 0.0], [0.0, 0.0]])
+        fixtures = [(home_team, away_team) for home_team in models.ids for away_team in models.ids]
+        for threshold in [-1.0, -0.5, 0.0, 0.5, 1.0]:
+            with self.subTest(threshold=threshold):
+                predictor = FootballMatchPredictor(models=models, decision_threshold=threshold)
+                expected = [str(predictor.predict(*fixture)[0]) for fixture in fixtures]
+                distances = predictor.predict_many(fixtures)['distance']
+                self.assertEqual(expected, list(results_from_distances(distances, threshold=threshold)))
+
+    def test_matches_brute_force(self):
+        # Distances rounded so that there are plenty of ties, including with the thresholds.
+        distances = np.round(random_state.normal(0.5, 1.0, 200), 1)
+        actual_results = random_state.choice(RESULTS, 200)
+        lowers = np.round(np.arange(-2.0, 1.0, 0.1), 1)
+        uppers = np.round(np.arange(-0.5, 3.0, 0.1), 1)
+
+        counts = ThresholdSweep(distances, actual_results).correct_counts(lowers, uppers)
+
+        self.assertEqual((len(lowers), len(uppers)), counts.shape)
+        for (i, lower) in enumerate(lowers):
+            for (j, upper) in enumerate(uppers):
+                self.assertEqual(self.brute_force_num_correct(distances, actual_results, lower, upper), counts[i, j],
+                                 'lower=%s, upper=%s' % (lower, upper))
+
+    def test_predicted_results(self):
+        sweep = ThresholdSweep([-1.0, 0.0, 0.3, 2.0], ['away_win', 'draw', 'draw', 'home_win'])
+        self.assertEqual(['away_win', 'draw', 'draw', 'home_win'], list(sweep.predicted_results(0.3, 0.9)))
+        self.assertEqual(['draw', 'draw', 'draw', 'home_win'], list(sweep.predicted_results(-1.0, 0.9)))
+        self.assertEqual(4, sweep.correct_counts([0.3], [0.9])[0, 0])
+
+    def test_accuracy_surface_and_best(self):
+        sweep = ThresholdSweep([-1.0, 0.0, 0.3, 2.0], ['away_win', 'draw', 'draw', 'home_win'])
+        surface = sweep.accuracy_surface(lowers=[-2.0, 0.3], uppers=[0.0, 0.3, 3.0])
+        np.testing.assert_array_equal([[0.5, 0.75, 0.5], [0.75, 1.0, 0.75]], surface)
+        self.assertEqual((0.3, 0.3, 1.0), sweep.best(lowers=[-2.0, 0.3], uppers=[0.0, 0.3, 3.0]))
+
+    def test_from_predictions(self):
+        models = ModelTable(ids=['A', 'B', 'C'], features=[[1.5, 1.0], [0.5, 0.0], [0.0, 0.0]])
+        predictor = FootballMatchPredictor(models=models)
+        day_1 = predictor.predict_many([('A', 'B'), ('C', 'C')])
+        day_2 = predictor.predict_many([('C', 'A')])
+
+        sweep = ThresholdSweep.from_predictions(predictions=[day_1, day_2],
+                                                actual_results=[['home_win', 'draw'], ['away_win']])
+
+        self.assertEqual([1.5, 0.0, -1.0], list(sweep.distances))
+        self.assertEqual(3, sweep.base_num_correct)
+        self.assertEqual(2, sweep.correct_counts([1.0], [2.0])[0, 0])
+
+    def test_no_fixtures(self):
+        sweep = ThresholdSweep.from_predictions(predictions=[], actual_results=[])
+        np.testing.assert_array_equal([[0.0]], sweep.accuracy_surface([0.3], [0.9]))
+
+
+class BoostSweepTests(unittest.TestCase):
+
+    def setUp(self):
+        global random_state
+        random_state = np.random.RandomState(42)
+
+    def test_matches_repredicting(self):
+        teams = ['Team %i' % i for i in range(20)]
+        goal_diffs = np.round(random_state.normal(0.0, 1.0, len(teams)), 3)
+        fixtures = [(home_team, away_team) for home_team in teams for away_team in teams if home_team != away_team]
+        actual_results = list(random_state.choice(RESULTS, len(fixtures)))
+        boosts = [i / 100 for i in range(0, 201)]
+
+        sweep = BoostSweep.from_models(
+            models_by_day=[ModelTable(ids=teams, features=np.stack([goal_diffs, goal_diffs], axis=1))],
+            fixtures_by_day=[fixtures], actual_results_by_day=[actual_results])
+        predictions = sweep.predictions(boosts)
+        counts = sweep.correct_counts(boosts)
+
+        for (i, boost) in enumerate(boosts):
+            # As the experiments do it, boost the home part of the models and predict again.
+            models = ModelTable(ids=teams, features=np.stack([boost + goal_diffs, goal_diffs], axis=1))
+            expected = FootballMatchPredictor(models=models).predict_many(fixtures)
+
+            np.testing.assert_array_equal(expected['distance'], predictions[i]['distance'])
+            np.testing.assert_array_equal(expected['predicted_result'], predictions[i]['predicted_result'])
+            self.assertEqual(int((expected['predicted_result'] == np.array(actual_results)).sum()), counts[i])
+
+    def test_threshold(self):
+        sweep = BoostSweep(home_metrics=[0.0, 0.0], away_metrics=[0.5, -0.5], actual_results=['draw', 'home_win'],
+                           threshold=0.5)
+        self.assertEqual([['draw', 'draw'], ['draw', 'home_win']], sweep.predictions([0.0, 0.25])['predicted_result']
+                         .tolist())
+
+    def test_accuracy(self):
+        sweep = BoostSweep(home_metrics=[1.0, 0.0, -1.0], away_metrics=[0.0, 0.0, 0.0],
+                           actual_results=['home_win', 'home_win', 'away_win'])
+        np.testing.assert_array_equal([2, 3, 2], sweep.correct_counts([0.0, 0.5, 2.0]))
+        np.testing.assert_array_equal([2 / 3, 1.0, 2 / 3], sweep.accuracy([0.0, 0.5, 2.0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import sqlite3
+import unittest
+from collections import Counter
+from datetime import date, timedelta
+
+from ActualResultsLib import ActualResults
+from SeasonMatrixLib import SeasonMatrix
+from StatsLib import Stats
+from SyntheticLeagueLib import SyntheticLeague, double_round_robin, season_start
+
+
+class SyntheticLeagueTests(unittest.TestCase):
+
+    def setUp(self):
+        global db_connection
+        db_connection = sqlite3.connect(':memory:')
+        db_connection.row_factory = sqlite3.Row
+        global db_cursor
+        db_cursor = db_connection.cursor()
+
+    def tearDown(self):
+        db_connection.close()
+
+    def test_double_round_robin(self):
+        for num_teams in [2, 5, 20]:
+            with self.subTest(num_teams=num_teams):
+                teams = list(range(num_teams))
+                rounds = double_round_robin(teams)
+                self.assertEqual(2 * (num_teams - 1 + num_teams % 2), len(rounds))
+
+                # Every pairing once each way round.
+                fixtures = [fixture for fixtures in rounds for fixture in fixtures]
+                self.assertEqual(sorted((home, away) for home in teams for away in teams if home != away),
+                                 sorted(fixtures))
+
+                # Nobody plays twice in a round.
+                for fixtures in rounds:
+                    playing = [team for fixture in fixtures for team in fixture]
+                    self.assertEqual(len(set(playing)), len(playing))
+
+                # Home and away are spread, not all of a team's home matches in one half.
+                first_half_home = Counter(home for fixtures in rounds[:len(rounds) // 2] for (home, _) in fixtures)
+                self.assertLessEqual(max(first_half_home.values()), num_teams // 2 + 1)
+
+    def test_season_start(self):
+        self.assertEqual(date(2016, 8, 6), season_start(2016))
+        self.assertEqual(date(2020, 8, 1), season_start(2020))
+
+    def test_reproducible(self):
+        league = SyntheticLeague(num_teams=6, num_seasons=2, num_divisions=2, seed=7)
+        results = list(league.results())
+        self.assertEqual(results, list(SyntheticLeague(num_teams=6, num_seasons=2, num_divisions=2, seed=7).results()))
+        self.assertNotEqual(results, list(SyntheticLeague(num_teams=6, num_seasons=2, num_divisions=2,
+                                                          seed=8).results()))
+        self.assertEqual(len(league), len(results))
+        self.assertEqual(sorted(result[0] for result in results), [result[0] for result in results])
+
+    def test_write(self):
+        league = SyntheticLeague(num_teams=20, num_seasons=3, num_divisions=2)
+        league.write(db_connection)
+
+        self.assertEqual(len(league), db_cursor.execute('SELECT COUNT(*) FROM results').fetchone()[0])
+        self.assertEqual(sorted(league.teams[0] + league.teams[1]), ActualResults.get_teams(db_cursor))
+
+        # Roughly like the real thing, a little over a goal a side and an edge for the home team.
+        (home_goals, away_goals) = db_cursor.execute('SELECT AVG(home_score), AVG(away_score) FROM results').fetchone()
+        self.assertTrue(1.0 < away_goals < home_goals < 2.0, (home_goals, away_goals))
+
+        # Each team plays a full season's worth of matches in each season.
+        end_of_first_season = season_start(2001) - timedelta(days=1)
+        stats = Stats.n_sample_stats_for_team(cursor=db_cursor, team='Division 2 Team 05', n_samples=1000,
+                                              last_sample_date=end_of_first_season)
+        self.assertEqual(38, stats.played)
+
+        season_matrix = SeasonMatrix(db_cursor)
+        self.assertEqual(stats.goal_diff,
+                         season_matrix.n_sample_stats_for_team(team='Division 2 Team 05', n_samples=1000,
+                                                               last_sample_date=end_of_first_season).goal_diff)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,25 @@
+import unittest
+
+from TeamIdsLib import TeamIds
+
+
+class TeamIdsTests(unittest.TestCase):
+
+    def test_interning(self):
+        team_ids = TeamIds(['Arsenal', 'Burnley'])
+        self.assertEqual(0, team_ids.intern('Arsenal'))
+        self.assertEqual(2, team_ids.intern('Chelsea'))
+        self.assertEqual(2, team_ids.intern('Chelsea'))
+        self.assertEqual(3, len(team_ids))
+        self.assertEqual('Burnley', team_ids.name(1))
+
+    def test_bulk_ids_and_names(self):
+        team_ids = TeamIds(['Arsenal', 'Burnley', 'Chelsea'])
+        self.assertEqual([2, -1, 0], list(team_ids.ids(['Chelsea', 'Nowhere Town', 'Arsenal'])))
+        self.assertEqual(['Chelsea', 'Arsenal'], team_ids.names([2, 0]))
+        self.assertIsNone(team_ids.id('Nowhere Town'))
+        self.assertNotIn('Nowhere Town', team_ids)
+
+
+if __name__ == '__main__':
+    unittest.main()